@@ -0,0 +1,350 @@
+# app/almacen_reportes.py
+import os
+import gzip
+import uuid
+import shutil
+import hashlib
+import logging
+from time import time
+from flask import current_app
+from sqlalchemy import select, update
+from app.extensions import db
+from app.models import HistorialReporte
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Almacenamiento de reportes generados
+# ======================================================
+# Los PDF viven en static/archivos y HistorialReporte.ruta_archivo los nombra
+# como 'archivos/<nombre>.pdf'. Un mismo nombre puede estar en disco como
+# .pdf o, tras REPORTES_COMPRIMIR_DIAS sin usarse, como .pdf.gz; quien lo lee
+# pasa por abrir(). Un reporte comprimido que se vuelve a usar se descomprime,
+# así se sirve desde disco con su tamaño y con rangos. Dos salidas idénticas comparten el archivo (enlace duro) gracias
+# al hash del contenido guardado en el historial. La limpieza borra por edad
+# y por tamaño total (primero lo menos usado) y marca el historial como
+# 'expirado'.
+
+COMPRIMIDO = '.gz'
+EDAD_TEMPORALES = 3600   # Segundos tras los que un .tmp se da por abandonado
+BLOQUE = 1024 * 1024     # Bytes por lectura al calcular hashes y comprimir
+CONSULTA_RUTAS = 500     # Rutas por cada IN al marcar historial expirado
+
+DISPONIBLE, EXPIRADO = 'disponible', 'expirado'
+
+
+def carpeta_archivos():
+    """ Carpeta donde se guardan los reportes generados (static/archivos). """
+    carpeta = os.path.join(current_app.root_path, 'static', 'archivos')
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def buscar(nombre):
+    """ Devuelve (ruta, comprimido) del reporte `nombre`, o None si ya no está. """
+    ruta = os.path.join(carpeta_archivos(), os.path.basename(nombre))
+    if os.path.exists(ruta):
+        return ruta, False
+    if os.path.exists(ruta + COMPRIMIDO):
+        return ruta + COMPRIMIDO, True
+    return None
+
+
+def _quitar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass  # Otra petición ya lo quitó
+
+
+def _enlazar(origen, destino):
+    """ Enlace duro que reemplaza `destino` de forma atómica. """
+    temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+    os.link(origen, temporal)
+    os.replace(temporal, destino)
+
+
+def descomprimir(nombre):
+    """
+    Devuelve a .pdf un reporte guardado con gzip, con todos sus nombres
+    (enlaces duros). La limpieza lo vuelve a comprimir si deja de usarse.
+    Devuelve la ruta del .pdf, o None si no existe o no se pudo descomprimir.
+    """
+    carpeta = carpeta_archivos()
+    destino = os.path.join(carpeta, os.path.basename(nombre))
+    origen = destino + COMPRIMIDO
+    try:
+        datos = os.stat(origen)
+    except FileNotFoundError:
+        return destino if os.path.exists(destino) else None
+
+    temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+    try:
+        with gzip.open(origen, 'rb') as entrada, open(temporal, 'wb') as salida:
+            shutil.copyfileobj(entrada, salida, BLOQUE)
+        os.replace(temporal, destino)
+        otros = []
+        if datos.st_nlink > 1:
+            with os.scandir(carpeta) as entradas:
+                otros = [entrada.path for entrada in entradas
+                         if entrada.name.endswith('.pdf' + COMPRIMIDO) and entrada.path != origen
+                         and os.path.samestat(entrada.stat(), datos)]
+        for otro in otros:
+            _enlazar(destino, otro[:-len(COMPRIMIDO)])
+            _quitar(otro)
+        _quitar(origen)
+    except OSError as e:
+        _quitar(temporal)
+        if os.path.exists(destino):
+            return destino  # Otra petición lo descomprimió a la vez
+        logger.error(f"[Reportes] No se pudo descomprimir {nombre}: {e}")
+        return None
+    logger.info(f"[Reportes] {os.path.basename(nombre)} se volvió a usar: se guarda descomprimido")
+    return destino
+
+
+def abrir(nombre):
+    """
+    Lo que send_file necesita para enviar el PDF: la ruta (descomprimiéndolo
+    antes si estaba con gzip), o el archivo descomprimiéndose al vuelo si no
+    se pudo. None si no existe.
+    """
+    encontrado = buscar(nombre)
+    if encontrado is None:
+        return None
+    ruta, comprimido = encontrado
+    if not comprimido:
+        return ruta
+    return descomprimir(nombre) or gzip.open(ruta, 'rb')
+
+
+def tocar(nombre):
+    """
+    Marca el reporte como recién usado (la limpieza borra y comprime primero
+    lo más viejo) y lo descomprime si estaba con gzip.
+    """
+    encontrado = buscar(nombre)
+    if encontrado is None:
+        return
+    ruta, comprimido = encontrado
+    if comprimido and descomprimir(nombre):
+        return
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+
+
+def hash_archivo(nombre):
+    """ sha256 del PDF (descomprimido si hace falta), o None si no existe. """
+    encontrado = buscar(nombre)
+    if encontrado is None:
+        return None
+    ruta, comprimido = encontrado
+    resumen = hashlib.sha256()
+    with (gzip.open(ruta, 'rb') if comprimido else open(ruta, 'rb')) as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def hash_registrado(nombre):
+    """
+    Hash del contenido guardado en el historial para ese archivo, sin leerlo.
+    Solo si el archivo no tiene ninguno registrado se calcula desde el disco.
+    """
+    contenido = db.session.scalar(
+        select(HistorialReporte.hash_contenido).where(
+            HistorialReporte.ruta_archivo == f'archivos/{os.path.basename(nombre)}',
+            HistorialReporte.hash_contenido.is_not(None)
+        ).limit(1)
+    )
+    return contenido or hash_archivo(nombre)
+
+
+def deduplicar(nombre):
+    """
+    Calcula el hash del PDF recién generado y, si otro reporte vigente tiene
+    el mismo contenido, reemplaza el archivo nuevo por un enlace duro a ese.
+    Devuelve el hash para guardarlo en el historial.
+    """
+    contenido = hash_archivo(nombre)
+    ruta_nueva = os.path.join(carpeta_archivos(), os.path.basename(nombre))
+    otros = db.session.scalars(
+        select(HistorialReporte.ruta_archivo).where(
+            HistorialReporte.hash_contenido == contenido,
+            HistorialReporte.estado == DISPONIBLE,
+            HistorialReporte.ruta_archivo != f'archivos/{os.path.basename(nombre)}'
+        ).distinct().limit(5)
+    ).all()
+    for ruta_archivo in otros:
+        encontrado = buscar(ruta_archivo)
+        if encontrado is None:
+            continue
+        ruta, comprimido = encontrado
+        destino = ruta_nueva + COMPRIMIDO if comprimido else ruta_nueva
+        temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(ruta, temporal)
+            os.replace(temporal, destino)
+        except OSError as e:
+            # Sistema de archivos sin enlaces duros: se conserva la copia
+            logger.info(f"[Reportes] No se pudo enlazar {nombre} con {ruta_archivo}: {e}")
+            return contenido
+        if destino != ruta_nueva:
+            os.remove(ruta_nueva)
+        logger.info(f"[Reportes] {nombre} tiene el mismo contenido que {ruta_archivo}: se comparte el archivo")
+        break
+    return contenido
+
+
+# ======================================================
+# Retención
+# ======================================================
+
+def _inventario(carpeta, ahora):
+    """
+    Recorre la carpeta una sola vez. Agrupa los nombres por inodo (los
+    enlaces duros ocupan el espacio una sola vez) y borra los .tmp abandonados.
+    """
+    archivos, temporales = {}, 0
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if not entrada.is_file():
+                continue
+            datos = entrada.stat()
+            if entrada.name.endswith('.tmp'):
+                if ahora - datos.st_mtime > EDAD_TEMPORALES:
+                    os.remove(entrada.path)
+                    temporales += 1
+                continue
+            if not entrada.name.endswith(('.pdf', '.pdf' + COMPRIMIDO)):
+                continue
+            clave = (datos.st_dev, datos.st_ino) if datos.st_ino else entrada.name
+            archivo = archivos.setdefault(clave, {'nombres': [], 'tamano': datos.st_size, 'modificado': datos.st_mtime})
+            archivo['nombres'].append(entrada.name)
+    return list(archivos.values()), temporales
+
+
+def _comprimir(carpeta, archivo):
+    """ Guarda con gzip un PDF (y sus otros nombres) conservando la fecha de uso. """
+    origen = os.path.join(carpeta, archivo['nombres'][0])
+    destino = origen + COMPRIMIDO
+    temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+    with open(origen, 'rb') as entrada, gzip.open(temporal, 'wb') as salida:
+        shutil.copyfileobj(entrada, salida, BLOQUE)
+    os.utime(temporal, (archivo['modificado'], archivo['modificado']))
+    os.replace(temporal, destino)
+    for otro in archivo['nombres'][1:]:
+        os.link(destino, os.path.join(carpeta, otro + COMPRIMIDO))
+    for nombre in archivo['nombres']:
+        _quitar(os.path.join(carpeta, nombre))
+    archivo['nombres'] = [nombre + COMPRIMIDO for nombre in archivo['nombres']]
+    archivo['tamano'] = os.path.getsize(destino)
+
+
+def _marcar_expirados(vivos):
+    """ Marca como expirado el historial cuyo archivo ya no está en disco. """
+    rutas = db.session.scalars(
+        select(HistorialReporte.ruta_archivo).where(HistorialReporte.estado == DISPONIBLE).distinct()
+    ).all()
+    faltantes = [ruta for ruta in rutas if os.path.basename(ruta) not in vivos]
+    expirados = 0
+    for inicio in range(0, len(faltantes), CONSULTA_RUTAS):
+        expirados += db.session.execute(
+            update(HistorialReporte)
+            .where(HistorialReporte.ruta_archivo.in_(faltantes[inicio:inicio + CONSULTA_RUTAS]),
+                   HistorialReporte.estado == DISPONIBLE)
+            .values(estado=EXPIRADO)
+        ).rowcount
+    db.session.commit()
+    return expirados
+
+
+def limpiar_reportes(dias=None, max_mb=None, comprimir_dias=None):
+    """
+    Aplica la retención a static/archivos:
+      - borra los reportes sin usar hace más de `dias`;
+      - comprime con gzip los que llevan más de `comprimir_dias` sin usarse;
+      - si el total supera `max_mb`, borra desde el menos usado hasta entrar;
+      - marca como 'expirado' el historial que apunta a archivos borrados.
+    Por defecto usa REPORTES_RETENCION_DIAS, REPORTES_MAX_MB y
+    REPORTES_COMPRIMIR_DIAS (0 desactiva cada regla).
+    """
+    config = current_app.config
+    dias = config['REPORTES_RETENCION_DIAS'] if dias is None else dias
+    max_mb = config['REPORTES_MAX_MB'] if max_mb is None else max_mb
+    comprimir_dias = config['REPORTES_COMPRIMIR_DIAS'] if comprimir_dias is None else comprimir_dias
+
+    carpeta = carpeta_archivos()
+    ahora = time()
+    archivos, temporales = _inventario(carpeta, ahora)
+    resultado = {'eliminados': 0, 'comprimidos': 0, 'temporales': temporales, 'expirados': 0, 'bytes': 0}
+
+    # Entre el inventario y el borrado un reporte puede reutilizarse (tocar),
+    # reemplazarse o descomprimirse: se vuelve a mirar cada nombre, en sus dos
+    # formas, antes de tocarlo.
+    def usado_despues(nombre, archivo):
+        base = nombre[:-len(COMPRIMIDO)] if nombre.endswith(COMPRIMIDO) else nombre
+        for ruta in (base, base + COMPRIMIDO):
+            try:
+                if os.stat(os.path.join(carpeta, ruta)).st_mtime > archivo['modificado']:
+                    return True
+            except FileNotFoundError:
+                pass
+        return False
+
+    def eliminar(archivo):
+        """ Borra los nombres del archivo; devuelve False si alguno se usó después del inventario. """
+        usados = [nombre for nombre in archivo['nombres'] if usado_despues(nombre, archivo)]
+        for nombre in archivo['nombres']:
+            if nombre not in usados:
+                _quitar(os.path.join(carpeta, nombre))
+        archivo['nombres'] = usados
+        if usados:
+            return False
+        resultado['eliminados'] += 1
+        return True
+
+    conservados = []
+    for archivo in sorted(archivos, key=lambda a: a['modificado']):
+        if dias and ahora - archivo['modificado'] > dias * 86400:
+            if eliminar(archivo):
+                continue
+        if (comprimir_dias and ahora - archivo['modificado'] > comprimir_dias * 86400
+                and archivo['nombres'] and not archivo['nombres'][0].endswith(COMPRIMIDO)
+                and not usado_despues(archivo['nombres'][0], archivo)):
+            try:
+                _comprimir(carpeta, archivo)
+                resultado['comprimidos'] += 1
+            except OSError as e:
+                logger.error(f"[Reportes] No se pudo comprimir {archivo['nombres'][0]}: {e}")
+        conservados.append(archivo)
+
+    total = sum(archivo['tamano'] for archivo in conservados)
+    if max_mb:
+        limite = max_mb * 1024 * 1024
+        usados = []
+        while conservados and total > limite:
+            archivo = conservados.pop(0)
+            if eliminar(archivo):
+                total -= archivo['tamano']
+            else:
+                usados.append(archivo)
+        conservados += usados
+    resultado['bytes'] = total
+
+    vivos = {nombre[:-len(COMPRIMIDO)] if nombre.endswith(COMPRIMIDO) else nombre
+             for archivo in conservados for nombre in archivo['nombres']}
+    try:
+        resultado['expirados'] = _marcar_expirados(vivos)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if resultado['eliminados'] or resultado['comprimidos'] or resultado['expirados']:
+        logger.info(f"[Reportes] Limpieza: {resultado['eliminados']} eliminados, {resultado['comprimidos']} "
+                    f"comprimidos, {resultado['expirados']} en historial expirados, "
+                    f"{total / 2**20:.1f} MB en uso.")
+    return resultado
@@ -0,0 +1,435 @@
+# app/busqueda.py
+import re
+import math
+import uuid
+import bisect
+import heapq
+import logging
+import threading
+import unicodedata
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from flask import current_app
+from app.extensions import db
+from app.models import Libro
+from app.cache import cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Motor de búsqueda del catálogo
+# ======================================================
+# En MySQL se usa el índice FULLTEXT `ft_libros_busqueda` (migración 3).
+# En SQLite (desarrollo y pruebas) se usa un índice invertido en memoria
+# que se construye en la primera búsqueda y se actualiza al confirmar
+# cambios en libros. Cada worker tiene sus propios índices en memoria: un
+# commit que cambia libros publica una versión nueva en la caché compartida
+# y los demás workers reconstruyen los suyos en la siguiente consulta.
+
+CAMPOS = ('titulo', 'autor', 'editorial', 'isbn', 'descripcion')
+
+# Peso de cada campo en la relevancia
+PESOS = {
+    'titulo': 3.0,
+    'isbn': 3.0,
+    'autor': 2.0,
+    'editorial': 1.0,
+    'descripcion': 0.5,
+}
+
+POR_PAGINA = 12
+MAX_POR_PAGINA = 50
+MAX_RESULTADOS = 1000       # Límite duro de resultados por consulta
+MIN_PREFIJO = 2              # Los términos más cortos solo coinciden exactos
+MAX_EXPANSION_PREFIJO = 64   # Términos máximos que expande un prefijo
+FACTOR_PREFIJO = 0.5         # Una coincidencia por prefijo vale menos que una exacta
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+CLAVE_VERSION = 'busqueda:version_libros'
+TTL_VERSION = 30 * 24 * 3600  # Si la marca vence, cada worker reconstruye una vez
+
+# Palabras vacías por defecto de InnoDB (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD).
+# En modo booleano un '+termino*' vacío o más corto que innodb_ft_min_token_size
+# no está en el índice y deja la búsqueda entera sin resultados.
+PALABRAS_VACIAS_INNODB = frozenset((
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how',
+    'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what',
+    'when', 'where', 'who', 'will', 'with', 'und', 'www',
+))
+
+
+def normalizar(texto):
+    """ Pasa a minúsculas y quita tildes y diéresis ('Canción' -> 'cancion'). """
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return _PATRON_TOKEN.findall(normalizar(texto))
+
+
+class ResultadoBusqueda:
+    """ Página de resultados con la misma interfaz básica que `Pagination`. """
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+# ======================================================
+# Índice invertido en memoria
+# ======================================================
+
+class IndiceInvertido:
+    """
+    Índice invertido término -> {libro_id: peso}.
+    Los términos se mantienen además en una lista ordenada para
+    resolver prefijos con bisect.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._documentos = {}
+        self._terminos = []
+        self._terminos_sucios = False
+        self._candado = threading.RLock()
+        self.construido = False
+
+    def __len__(self):
+        return len(self._documentos)
+
+    def construir(self, filas):
+        """ Reconstruye el índice desde filas (id, titulo, autor, editorial, isbn, descripcion). """
+        with self._candado:
+            self._postings = {}
+            self._documentos = {}
+            for fila in filas:
+                self._agregar(fila[0], dict(zip(CAMPOS, fila[1:])))
+            self._terminos = sorted(self._postings)
+            self._terminos_sucios = False
+            self.construido = True
+
+    def agregar(self, libro_id, campos):
+        with self._candado:
+            self._eliminar(libro_id)
+            self._agregar(libro_id, campos)
+
+    def eliminar(self, libro_id):
+        with self._candado:
+            self._eliminar(libro_id)
+
+    def _agregar(self, libro_id, campos):
+        pesos = {}
+        for campo in CAMPOS:
+            for token in tokenizar(campos.get(campo)):
+                pesos[token] = pesos.get(token, 0.0) + PESOS[campo]
+        for token, peso in pesos.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                self._terminos_sucios = True
+            posting[libro_id] = peso
+        self._documentos[libro_id] = tuple(pesos)
+
+    def _eliminar(self, libro_id):
+        for token in self._documentos.pop(libro_id, ()):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(libro_id, None)
+            if not posting:
+                del self._postings[token]
+                self._terminos_sucios = True
+
+    def _expandir(self, prefijo):
+        if len(prefijo) < MIN_PREFIJO:
+            return [prefijo] if prefijo in self._postings else []
+        if self._terminos_sucios:
+            self._terminos = sorted(self._postings)
+            self._terminos_sucios = False
+        inicio = bisect.bisect_left(self._terminos, prefijo)
+        fin = bisect.bisect_left(self._terminos, prefijo + '\uffff', inicio)
+        return self._terminos[inicio:min(fin, inicio + MAX_EXPANSION_PREFIJO)]
+
+    def buscar(self, consulta, desde=0, cantidad=MAX_RESULTADOS):
+        """
+        Devuelve ([(libro_id, relevancia)], total) con la porción pedida del
+        ranking y el total de coincidencias (acotado a MAX_RESULTADOS).
+        Cada término de la consulta debe coincidir (exacto o por prefijo).
+        """
+        # Los términos más largos suelen ser más selectivos: se procesan primero
+        # y los siguientes solo puntúan a los candidatos que ya coinciden.
+        tokens = sorted(set(tokenizar(consulta)), key=len, reverse=True)
+        if not tokens:
+            return [], 0
+
+        with self._candado:
+            total_documentos = max(len(self._documentos), 1)
+            puntajes = None
+            for token in tokens:
+                parcial = {}
+                for termino in self._expandir(token):
+                    posting = self._postings[termino]
+                    idf = math.log(1 + total_documentos / len(posting))
+                    factor = idf if termino == token else idf * FACTOR_PREFIJO
+                    if puntajes is not None and len(puntajes) < len(posting):
+                        pares = ((i, posting[i]) for i in puntajes if i in posting)
+                    else:
+                        pares = posting.items()
+                    for libro_id, peso in pares:
+                        valor = peso * factor
+                        if valor > parcial.get(libro_id, 0.0):
+                            parcial[libro_id] = valor
+                if puntajes is None:
+                    puntajes = parcial
+                else:
+                    puntajes = {i: p + parcial[i] for i, p in puntajes.items() if i in parcial}
+                if not puntajes:
+                    return [], 0
+
+        fin = min(desde + cantidad, MAX_RESULTADOS)
+        mejores = heapq.nsmallest(fin, puntajes.items(), key=lambda par: (-par[1], par[0]))
+        return mejores[desde:], min(len(puntajes), MAX_RESULTADOS)
+
+
+indice = IndiceInvertido()
+
+# Índices en memoria que se actualizan al confirmar cambios en libros.
+# Cada uno implementa `construido`, `agregar(libro_id, campos)` y `eliminar(libro_id)`.
+INDICES_LIBROS = [indice]
+
+
+_version_local = None        # Versión de los libros que reflejan los índices de este worker
+_candado_version = threading.Lock()
+
+
+def registrar_indice(otro):
+    if otro not in INDICES_LIBROS:
+        INDICES_LIBROS.append(otro)
+
+
+def _invalidar_indices():
+    for destino in INDICES_LIBROS:
+        destino.construido = False
+
+
+def sincronizar_indices():
+    """
+    Si otro worker cambió libros desde la última consulta, marca los índices
+    en memoria de este worker para reconstruirlos. Cuesta una lectura de la
+    caché compartida; se llama antes de usar cualquier índice.
+    """
+    global _version_local
+    compartida = cache.obtener(CLAVE_VERSION)
+    with _candado_version:
+        if compartida != _version_local:
+            _invalidar_indices()
+            _version_local = compartida
+
+
+def _publicar_cambio_libros():
+    """
+    Publica una versión nueva tras aplicar los cambios de este worker. Si la
+    versión compartida no era la que este worker conocía, otro también cambió
+    libros y los índices locales se reconstruyen.
+    """
+    global _version_local
+    nueva = uuid.uuid4().hex
+    with _candado_version:
+        if _version_local is None:
+            publicada = cache.agregar(CLAVE_VERSION, nueva, TTL_VERSION)
+        else:
+            publicada = cache.reemplazar(CLAVE_VERSION, _version_local, nueva, TTL_VERSION)
+        if not publicada:
+            cache.guardar(CLAVE_VERSION, nueva, TTL_VERSION)
+            _invalidar_indices()
+        _version_local = nueva
+
+
+def _asegurar_indice():
+    sincronizar_indices()
+    if indice.construido:
+        return
+    filas = db.session.query(
+        Libro.id, *(getattr(Libro, campo) for campo in CAMPOS)
+    ).filter(Libro.estado != 'eliminado').yield_per(5000)
+    indice.construir(filas)
+    logger.info(f"[Búsqueda] Índice en memoria construido con {len(indice)} libros.")
+
+
+def _cambio_indexado(libro):
+    """
+    True si el flush cambió algo que ven los índices: un campo de CAMPOS o la
+    baja lógica (estado hacia o desde 'eliminado'). Un préstamo o devolución
+    que solo toca cantidad_disponible o estado no cuenta.
+    """
+    atributos = inspect(libro).attrs
+    if any(atributos[campo].history.has_changes() for campo in CAMPOS):
+        return True
+    historial = atributos.estado.history
+    if not historial.has_changes():
+        return False
+    # Sin el valor anterior cargado no se sabe si salía de 'eliminado'
+    return not historial.deleted or 'eliminado' in (*historial.added, *historial.deleted)
+
+
+# Mantiene los índices en memoria al día con los libros confirmados.
+# Los valores se copian en after_flush (el historial de los atributos sigue
+# disponible) porque después del commit los objetos quedan expirados.
+@event.listens_for(Session, 'after_flush')
+def _registrar_libros_modificados(session, flush_context):
+    cambios = session.info.setdefault('libros_modificados', {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Libro) and (obj in session.new or _cambio_indexado(obj)):
+            cambios[obj.id] = None if obj.estado == 'eliminado' else {
+                campo: getattr(obj, campo) for campo in CAMPOS
+            }
+    for obj in session.deleted:
+        if isinstance(obj, Libro):
+            cambios[obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_libros_modificados(session):
+    cambios = session.info.pop('libros_modificados', None)
+    if not cambios:
+        return
+    for destino in INDICES_LIBROS:
+        if not destino.construido:
+            continue
+        for libro_id, campos in cambios.items():
+            if campos is None:
+                destino.eliminar(libro_id)
+            else:
+                destino.agregar(libro_id, campos)
+    _publicar_cambio_libros()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_libros_modificados(session):
+    session.info.pop('libros_modificados', None)
+
+
+def indexar_libros(isbns):
+    """
+    Agrega a los índices construidos libros ya confirmados que se insertaron
+    sin pasar por el ORM (importación masiva), así que no dispararon after_flush.
+    """
+    if not isbns:
+        return
+    destinos = [destino for destino in INDICES_LIBROS if destino.construido]
+    if destinos:
+        filas = db.session.query(
+            Libro.id, *(getattr(Libro, campo) for campo in CAMPOS)
+        ).filter(Libro.isbn.in_(isbns))
+        for fila in filas:
+            campos = dict(zip(CAMPOS, fila[1:]))
+            for destino in destinos:
+                destino.agregar(fila[0], campos)
+    _publicar_cambio_libros()
+
+
+# ======================================================
+# Consulta
+# ======================================================
+
+def _usar_fulltext():
+    motor = current_app.config.get('BUSQUEDA_MOTOR', 'auto')
+    if motor == 'auto':
+        return db.engine.dialect.name == 'mysql'
+    return motor == 'fulltext'
+
+
+_largo_minimo_fulltext = None
+
+
+def _terminos_fulltext(tokens):
+    """ Quita los términos que InnoDB no indexa (vacíos o más cortos que innodb_ft_min_token_size). """
+    global _largo_minimo_fulltext
+    if _largo_minimo_fulltext is None:
+        _largo_minimo_fulltext = int(db.session.execute(text('SELECT @@innodb_ft_min_token_size')).scalar())
+    return [t for t in tokens if len(t) >= _largo_minimo_fulltext and t not in PALABRAS_VACIAS_INNODB]
+
+
+def _buscar_fulltext(tokens, desde, cantidad):
+    tokens = _terminos_fulltext(tokens)
+    if not tokens:
+        return [], 0
+    columnas = ', '.join(CAMPOS)
+    booleana = ' '.join(f'+{t}*' for t in tokens)
+    natural = ' '.join(tokens)
+    filtro = (f"MATCH({columnas}) AGAINST(:booleana IN BOOLEAN MODE) "
+              f"AND estado != 'eliminado'")
+    parametros = {'booleana': booleana, 'natural': natural}
+
+    total = db.session.execute(text(
+        f"SELECT COUNT(*) FROM (SELECT id FROM libros WHERE {filtro} LIMIT {MAX_RESULTADOS}) AS t"
+    ), parametros).scalar()
+    ids = db.session.execute(text(
+        f"SELECT id, MATCH({columnas}) AGAINST(:natural) AS relevancia FROM libros "
+        f"WHERE {filtro} ORDER BY relevancia DESC, id LIMIT :cantidad OFFSET :desde"
+    ), dict(parametros, cantidad=cantidad, desde=desde)).scalars().all()
+    return ids, total
+
+
+def _buscar_memoria(consulta, desde, cantidad):
+    _asegurar_indice()
+    ranking, total = indice.buscar(consulta, desde, cantidad)
+    return [libro_id for libro_id, _ in ranking], total
+
+
+def buscar_libros(consulta, pagina=1, por_pagina=POR_PAGINA):
+    """
+    Busca libros no eliminados por título, autor, editorial, ISBN y descripción.
+    Ignora mayúsculas y tildes, acepta prefijos ('quij' encuentra 'Quijote')
+    y devuelve una página de resultados ordenada por relevancia.
+    """
+    por_pagina = max(1, min(por_pagina, MAX_POR_PAGINA))
+    pagina = max(1, pagina)
+    desde = (pagina - 1) * por_pagina
+    tokens = tokenizar(consulta)
+
+    if not tokens or desde >= MAX_RESULTADOS:
+        return ResultadoBusqueda([], pagina, por_pagina, 0)
+    cantidad = min(por_pagina, MAX_RESULTADOS - desde)
+
+    if _usar_fulltext():
+        ids, total = _buscar_fulltext(tokens, desde, cantidad)
+    else:
+        ids, total = _buscar_memoria(consulta, desde, cantidad)
+
+    if not ids:
+        return ResultadoBusqueda([], pagina, por_pagina, total)
+
+    libros = {
+        libro.id: libro for libro in
+        Libro.query.filter(Libro.id.in_(ids), Libro.estado != 'eliminado')
+    }
+    items = [libros[i] for i in ids if i in libros]
+    return ResultadoBusqueda(items, pagina, por_pagina, total)
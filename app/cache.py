@@ -0,0 +1,189 @@
+# app/cache.py
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Caché con expiración (TTL) y backend intercambiable
+# ======================================================
+# 'memoria': diccionario del proceso (cada worker tiene el suyo).
+# 'sqlite':  archivo local compartido por todos los workers de la máquina.
+# Los valores deben poder serializarse a JSON.
+
+
+class BackendMemoria:
+
+    def __init__(self):
+        self._datos = {}
+        self._candado = threading.Lock()
+
+    def obtener(self, clave):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira < time.time():
+                del self._datos[clave]
+                return None
+            return valor
+
+    def guardar(self, clave, valor, ttl):
+        with self._candado:
+            self._datos[clave] = (valor, time.time() + ttl)
+
+    def agregar(self, clave, valor, ttl):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[1] >= time.time():
+                return False
+            self._datos[clave] = (valor, time.time() + ttl)
+            return True
+
+    def reemplazar(self, clave, anterior, valor, ttl):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[1] < time.time() or entrada[0] != anterior:
+                return False
+            self._datos[clave] = (valor, time.time() + ttl)
+            return True
+
+    def eliminar(self, *claves):
+        with self._candado:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._candado:
+            self._datos.clear()
+
+
+class BackendSQLite:
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._preparada = False
+
+    def _conectar(self):
+        # Una conexión por operación: seguro entre hilos y procesos.
+        # El archivo se prepara en el primer uso, no al arrancar.
+        conexion = sqlite3.connect(self.ruta, timeout=5)
+        if not self._preparada:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)'
+            )
+            self._preparada = True
+        return conexion
+
+    def obtener(self, clave):
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                'SELECT valor FROM cache WHERE clave = ? AND expira >= ?', (clave, time.time())
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def guardar(self, clave, valor, ttl):
+        with self._conectar() as conexion:
+            conexion.execute(
+                'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+                (clave, json.dumps(valor), time.time() + ttl)
+            )
+
+    def agregar(self, clave, valor, ttl):
+        # Una sola transacción de escritura: entre procesos solo una la gana
+        ahora = time.time()
+        with self._conectar() as conexion:
+            conexion.execute('DELETE FROM cache WHERE clave = ? AND expira < ?', (clave, ahora))
+            cursor = conexion.execute(
+                'INSERT OR IGNORE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+                (clave, json.dumps(valor), ahora + ttl)
+            )
+        return cursor.rowcount == 1
+
+    def reemplazar(self, clave, anterior, valor, ttl):
+        ahora = time.time()
+        with self._conectar() as conexion:
+            cursor = conexion.execute(
+                'UPDATE cache SET valor = ?, expira = ? WHERE clave = ? AND valor = ? AND expira >= ?',
+                (json.dumps(valor), ahora + ttl, clave, json.dumps(anterior), ahora)
+            )
+        return cursor.rowcount == 1
+
+    def eliminar(self, *claves):
+        with self._conectar() as conexion:
+            conexion.executemany('DELETE FROM cache WHERE clave = ?', [(c,) for c in claves])
+
+    def limpiar(self):
+        with self._conectar() as conexion:
+            conexion.execute('DELETE FROM cache')
+
+
+class Cache:
+    """ Fachada sobre el backend configurado. Un fallo del backend nunca rompe la petición. """
+
+    def __init__(self, backend=None):
+        self.backend = backend or BackendMemoria()
+
+    def obtener(self, clave):
+        try:
+            return self.backend.obtener(clave)
+        except Exception as e:
+            logger.error(f"[Cache] Error leyendo '{clave}': {e}")
+            return None
+
+    def guardar(self, clave, valor, ttl):
+        try:
+            self.backend.guardar(clave, valor, ttl)
+        except Exception as e:
+            logger.error(f"[Cache] Error guardando '{clave}': {e}")
+
+    def agregar(self, clave, valor, ttl):
+        """
+        Guarda `valor` solo si la clave no existe (o venció), de forma atómica
+        entre hilos y procesos. Devuelve True si lo guardó. Si el backend falla
+        devuelve None: quien llama decide cómo seguir.
+        """
+        try:
+            return self.backend.agregar(clave, valor, ttl)
+        except Exception as e:
+            logger.error(f"[Cache] Error agregando '{clave}': {e}")
+            return None
+
+    def reemplazar(self, clave, anterior, valor, ttl):
+        """ Cambia el valor de la clave solo si todavía es `anterior` (atómico). Igual que agregar. """
+        try:
+            return self.backend.reemplazar(clave, anterior, valor, ttl)
+        except Exception as e:
+            logger.error(f"[Cache] Error reemplazando '{clave}': {e}")
+            return None
+
+    def eliminar(self, *claves):
+        try:
+            self.backend.eliminar(*claves)
+        except Exception as e:
+            logger.error(f"[Cache] Error eliminando {claves}: {e}")
+
+    def obtener_o_calcular(self, clave, funcion, ttl):
+        valor = self.obtener(clave)
+        if valor is None:
+            valor = funcion()
+            self.guardar(clave, valor, ttl)
+        return valor
+
+
+cache = Cache()
+
+
+def init_app(app):
+    """ Configura el backend según CACHE_BACKEND ('memoria' o 'sqlite'). """
+    if app.config.get('CACHE_BACKEND') == 'sqlite':
+        cache.backend = BackendSQLite(app.config['CACHE_RUTA'])
+    else:
+        cache.backend = BackendMemoria()
@@ -0,0 +1,94 @@
+# app/categorias.py
+import re
+import unicodedata
+from functools import lru_cache
+
+# ======================================================
+# Taxonomía de categorías
+# ======================================================
+# Tabla única de subjects de OpenLibrary -> categoría interna. La usan el
+# cliente de OpenLibrary (clasificar) y las plantillas (CATEGORIAS).
+# Si un subject contiene alguna de estas frases, se usa la categoría interna;
+# así "Fiction, general" o "Science fiction, American" ya no caen en "otros".
+
+MAPEO_CATEGORIAS = {
+    "fiction": "novela",
+    "novel": "novela",
+    "detective and mystery stories": "novela",
+    "police procedural": "thriller",
+    "science fiction": "ciencia_ficcion",
+    "fantasy": "fantasía",
+    "thrillers": "thriller",
+    "horror": "terror",
+    "romance": "romance",
+    "historical fiction": "novela_historica",
+    "history": "historia",
+    "biography": "biografia",
+    "short stories": "cuento",
+    "poetry": "poesia",
+    "drama": "teatro",
+    "comedies": "comedia",
+    "juvenile fiction": "juvenil",
+    "young adult fiction": "juvenil",
+    "graphic novels": "historieta",
+    "comics": "historieta",
+    "philosophy": "filosofia",
+    "essays": "ensayo",
+    "true crime": "ficcion_criminal",
+    "crime fiction": "ficcion_criminal",
+    "political satire": "sátira",
+    "satire": "sátira",
+    "classic fiction": "clasico",
+    "classic literature": "clasico",
+    "magical realism": "realismo_magico"
+}
+
+CATEGORIA_DEFECTO = "otros"
+
+# Lista ordenada para las plantillas; se calcula una sola vez al importar
+CATEGORIAS = tuple(sorted(set(MAPEO_CATEGORIAS.values())))
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def _tokens(texto):
+    """
+    Minúsculas, sin tildes y con el plural simple recortado
+    ('Thrillers' -> 'thriller'), para que frase y subject coincidan.
+    """
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return tuple(
+        t[:-1] if len(t) > 3 and t.endswith('s') and not t.endswith('ss') else t
+        for t in _PATRON_TOKEN.findall(texto)
+    )
+
+
+# Frase tokenizada -> categoría, y la frase más larga para acotar la búsqueda
+_FRASES = {_tokens(frase): categoria for frase, categoria in MAPEO_CATEGORIAS.items()}
+_MAX_TOKENS = max(len(frase) for frase in _FRASES)
+
+
+@lru_cache(maxsize=4096)
+def categoria_de_subject(subject):
+    """
+    Devuelve la categoría de un subject o None. Si contiene varias frases
+    gana la más larga ('Science fiction' -> ciencia_ficcion, no novela).
+    """
+    tokens = _tokens(subject)
+    for largo in range(min(_MAX_TOKENS, len(tokens)), 0, -1):
+        for inicio in range(len(tokens) - largo + 1):
+            categoria = _FRASES.get(tokens[inicio:inicio + largo])
+            if categoria:
+                return categoria
+    return None
+
+
+def clasificar(subjects, defecto=CATEGORIA_DEFECTO):
+    """ Categoría del primer subject que coincide con la taxonomía, o `defecto`. """
+    for subject in subjects or ():
+        if isinstance(subject, str):
+            categoria = categoria_de_subject(subject)
+            if categoria:
+                return categoria
+    return defecto
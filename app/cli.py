@@ -0,0 +1,157 @@
+# app/cli.py
+import os
+import time
+import secrets
+import logging
+import click
+from datetime import datetime
+from flask import current_app
+from app import mantenimiento, correo, recordatorios, importacion, almacen_reportes
+from app.extensions import db
+from app.models import Usuario
+from app.migraciones import aplicar_migraciones
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def crear_administrador():
+    """
+    Crea el usuario administrador inicial si todavía no hay ninguno.
+    Devuelve True si lo creó.
+    """
+    if Usuario.query.filter_by(rol='administrador').first():
+        return False
+
+    admin_password = os.environ.get('ADMIN_PASSWORD')
+    if not admin_password:
+        # Sin ADMIN_PASSWORD se genera una temporal y se muestra una sola vez (no va al log)
+        admin_password = secrets.token_urlsafe(12)
+        logger.warning("ADMIN_PASSWORD no definida en variables de entorno. Se generó una contraseña temporal.")
+        click.echo(f"Contraseña temporal del administrador (admin@biblioteca.com): {admin_password}\n"
+                   "Cámbiela después de iniciar sesión.")
+
+    admin = Usuario(
+        nombre='admin',
+        apellido='admin',
+        correo='admin@biblioteca.com',
+        documento='1000000000',
+        direccion='Oficina principal',
+        telefono='0000000000',
+        fecha_nacimiento=datetime(1990, 1, 1),
+        rol='administrador',
+        activo=True
+    )
+    admin.set_password(admin_password)
+    admin.generar_llave_prestamo()
+
+    try:
+        db.session.add(admin)
+        db.session.commit()
+        logger.info("Usuario administrador creado correctamente.")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creando usuario admin: {e}")
+        raise
+    return True
+
+
+def registrar_comandos(app):
+    """
+    Registra los comandos de administración disponibles con `flask --app wsgi <comando>`.
+    """
+
+    @app.cli.command('mantenimiento')
+    def comando_mantenimiento():
+        """Marca préstamos atrasados y vence reservas expiradas."""
+        resultado = mantenimiento.ejecutar_mantenimiento()
+        click.echo(
+            f"{resultado['prestamos_atrasados']} préstamos atrasados, "
+            f"{resultado['reservas_vencidas']} reservas vencidas."
+        )
+
+    @app.cli.command('recordatorios')
+    @click.option('--fecha', help='Fecha de devolución a avisar (AAAA-MM-DD). Por defecto, mañana.')
+    def comando_recordatorios(fecha):
+        """Envía los recordatorios de devolución pendientes de hoy."""
+        if fecha:
+            fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
+        resultado = recordatorios.enviar_recordatorios(fecha)
+        click.echo(
+            f"{resultado['mensajes']} recordatorios enviados ({resultado['libros']} préstamos), "
+            f"{resultado['fallidos']} con error."
+        )
+
+    @app.cli.command('init-db')
+    def comando_init_db():
+        """Prepara la base de datos: aplica migraciones y crea el administrador inicial."""
+        nuevas = aplicar_migraciones()
+        click.echo(f"Versiones aplicadas: {', '.join(map(str, nuevas))}" if nuevas else "El esquema ya está actualizado.")
+        click.echo("Administrador creado." if crear_administrador() else "Ya existe un administrador.")
+
+    @app.cli.command('bootstrap-admin')
+    def comando_bootstrap_admin():
+        """Crea el administrador inicial (usa ADMIN_PASSWORD) si no existe."""
+        click.echo("Administrador creado." if crear_administrador() else "Ya existe un administrador.")
+
+    @app.cli.command('migrar')
+    def comando_migrar():
+        """Aplica las migraciones pendientes del esquema."""
+        nuevas = aplicar_migraciones()
+        if nuevas:
+            click.echo(f"Versiones aplicadas: {', '.join(map(str, nuevas))}")
+        else:
+            click.echo("El esquema ya está actualizado.")
+
+    @app.cli.command('enviar-correos')
+    @click.option('--continuo', is_flag=True, help='Sigue atendiendo la bandeja de salida hasta interrumpirlo.')
+    def comando_enviar_correos(continuo):
+        """Entrega los correos pendientes de la bandeja de salida."""
+        if continuo:
+            correo.trabajador.iniciar(current_app._get_current_object())
+            correo.trabajador.avisar()
+            click.echo("Atendiendo la bandeja de salida (Ctrl+C para salir)...")
+            try:
+                while correo.trabajador.activo:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                correo.trabajador.detener()
+            return
+        resultado = correo.entregar_todo(current_app.config)
+        click.echo(f"{resultado['enviados']} correos enviados, {resultado['fallidos']} con error.")
+
+    @app.cli.command('importar-isbn')
+    @click.argument('archivo', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--cantidad', default=1, show_default=True, help='Ejemplares por cada libro nuevo.')
+    @click.option('--hilos', type=int, help='Consultas simultáneas a OpenLibrary (por defecto IMPORTACION_HILOS).')
+    def comando_importar_isbn(archivo, cantidad, hilos):
+        """Importa libros desde un CSV o lista de ISBN ('-' lee de la entrada estándar)."""
+        isbns, invalidos, repetidos = importacion.leer_isbns(archivo)
+        click.echo(f"{len(isbns)} ISBN a importar ({repetidos} repetidos, {len(invalidos)} inválidos).")
+        for linea in invalidos:
+            click.echo(f"  inválido: {linea}", err=True)
+
+        with click.progressbar(length=len(isbns), label='Consultando OpenLibrary') as barra:
+            def avanzar(procesados, total):
+                barra.update(procesados - barra.pos)
+            resultado = importacion.importar_isbns(isbns, cantidad, hilos=hilos, progreso=avanzar)
+
+        for fallo in resultado['fallidos']:
+            click.echo(f"  {fallo['isbn']}: {fallo['error']}", err=True)
+        click.echo(
+            f"{resultado['importados']} libros importados, {len(resultado['existentes'])} ya existían, "
+            f"{len(resultado['fallidos'])} con error en {resultado['segundos']} s."
+        )
+
+    @app.cli.command('limpiar-reportes')
+    @click.option('--dias', type=int, help='Días sin uso antes de borrar (por defecto REPORTES_RETENCION_DIAS).')
+    @click.option('--max-mb', type=int, help='Tope total en MB (por defecto REPORTES_MAX_MB).')
+    @click.option('--comprimir-dias', type=int, help='Días sin uso antes de comprimir (por defecto REPORTES_COMPRIMIR_DIAS).')
+    def comando_limpiar_reportes(dias, max_mb, comprimir_dias):
+        """Aplica la retención a los reportes PDF generados y marca el historial expirado."""
+        resultado = almacen_reportes.limpiar_reportes(dias, max_mb, comprimir_dias)
+        click.echo(
+            f"{resultado['eliminados']} reportes eliminados, {resultado['comprimidos']} comprimidos, "
+            f"{resultado['temporales']} temporales borrados, {resultado['expirados']} registros expirados; "
+            f"{resultado['bytes'] / 2**20:.1f} MB en uso."
+        )
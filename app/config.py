@@ -1,4 +1,33 @@
 import os
+import tempfile
+from sqlalchemy.engine import make_url
+from app.pool import PoolMedido, contexto_ssl
+
+
+def opciones_motor(url):
+    """
+    Opciones del pool para `url`. El pool medido, el TLS y connect_timeout son
+    de MySQL/PyMySQL: con otra base (SQLite en local y en pruebas) se usan los
+    valores por defecto de SQLAlchemy.
+    """
+    if not url or make_url(url).get_backend_name() != 'mysql':
+        return {}
+    # La base remota cierra las conexiones inactivas, así que se reciclan antes
+    # de ese plazo y se comprueban (pre-ping) al sacarlas del pool.
+    return {
+        'poolclass': PoolMedido,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # segundos
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # segundos esperando una conexión libre
+        'connect_args': {
+            # Un solo contexto TLS por proceso; DB_SSL_CA activa la verificación del certificado
+            'ssl': contexto_ssl(os.environ.get('DB_SSL_CA')),
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+        }
+    }
+
 
 class Config:
     # Clave secreta para sesiones, CSRF y seguridad general
@@ -7,15 +36,15 @@ class Config:
     # Base de datos remota en Aiven usando PyMySQL
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
 
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'connect_args': {
-            'ssl': {
-                'ssl_verify_cert': False,   # Si no tienes archivo CA
-                'ssl_check_hostname': False
-                # Si tienes ca.pem, sería: 'ca': '/ruta/a/ca.pem'
-            }
-        }
-    }
+    # Réplica de lectura opcional para catálogo, búsqueda, dashboard y reportes (ver app/replicas.py).
+    # Tras una escritura, el usuario lee de la principal durante REPLICA_VENTANA_ESCRITURA segundos.
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': os.environ['DATABASE_REPLICA_URL'], **opciones_motor(os.environ['DATABASE_REPLICA_URL'])}
+    } if os.environ.get('DATABASE_REPLICA_URL') else {}
+    REPLICA_VENTANA_ESCRITURA = int(os.environ.get('REPLICA_VENTANA_ESCRITURA', 5))
+
+    # Pool de conexiones (solo con MySQL, ver opciones_motor)
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(SQLALCHEMY_DATABASE_URI)
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAX_CONTENT_LENGTH = 2 * 1024 * 1024 
@@ -26,3 +55,83 @@ class Config:
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+
+    # Mantenimiento programado (préstamos atrasados y reservas vencidas)
+    MANTENIMIENTO_INTERVALO = int(os.environ.get('MANTENIMIENTO_INTERVALO', 300))  # segundos
+    MANTENIMIENTO_PROGRAMADOR = os.environ.get('MANTENIMIENTO_PROGRAMADOR', '1') == '1'
+    MANTENIMIENTO_LOCK = os.environ.get(
+        'MANTENIMIENTO_LOCK', os.path.join(tempfile.gettempdir(), 'sds_mantenimiento.lock')
+    )
+
+    # Motor de búsqueda: 'auto' (FULLTEXT en MySQL, índice en memoria en otro caso), 'fulltext' o 'memoria'
+    BUSQUEDA_MOTOR = os.environ.get('BUSQUEDA_MOTOR', 'auto')
+
+    # Máximo de sentencias SQL por petición (None = sin límite). En pruebas superarlo es un error.
+    SQL_PRESUPUESTO_CONSULTAS = int(os.environ['SQL_PRESUPUESTO_CONSULTAS']) if os.environ.get('SQL_PRESUPUESTO_CONSULTAS') else None
+
+    # Métricas por endpoint (/metrics) y umbral para registrar peticiones lentas como JSON
+    METRICAS_HABILITADAS = os.environ.get('METRICAS_HABILITADAS', '1') == '1'
+    METRICAS_UMBRAL_LENTO_MS = int(os.environ.get('METRICAS_UMBRAL_LENTO_MS', 1000))
+
+    # Caché compartida: 'memoria' (por proceso) o 'sqlite' (archivo común a todos los workers)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+    CACHE_RUTA = os.environ.get('CACHE_RUTA', os.path.join(tempfile.gettempdir(), 'sds_cache.sqlite'))
+    ESTADISTICAS_TTL = int(os.environ.get('ESTADISTICAS_TTL', 60))  # segundos
+
+    # Dashboard en vivo (/api/dashboard_stream): cada cuánto se recalcula y cada cuánto se envía un latido
+    TABLERO_INTERVALO = int(os.environ.get('TABLERO_INTERVALO', 5))  # segundos
+    TABLERO_LATIDO = int(os.environ.get('TABLERO_LATIDO', 15))  # segundos
+    # Cada conexión ocupa un hilo del worker (ver gunicorn.conf.py): se cierra tras este tiempo y el navegador reconecta
+    TABLERO_DURACION_MAX = int(os.environ.get('TABLERO_DURACION_MAX', 300))  # segundos, 0 = sin límite
+
+    # Bandeja de salida de correos: hilos de envío en cada worker (o `flask enviar-correos --continuo`)
+    CORREO_TRABAJADOR = os.environ.get('CORREO_TRABAJADOR', '1') == '1'
+    CORREO_HILOS = int(os.environ.get('CORREO_HILOS', 2))
+    CORREO_INTERVALO = int(os.environ.get('CORREO_INTERVALO', 30))  # segundos
+    CORREO_LOTE = int(os.environ.get('CORREO_LOTE', 50))
+    CORREO_MAX_INTENTOS = int(os.environ.get('CORREO_MAX_INTENTOS', 6))
+    CORREO_ESPERA_BASE = int(os.environ.get('CORREO_ESPERA_BASE', 30))  # segundos, se duplica en cada intento
+    CORREO_ESPERA_MAX = int(os.environ.get('CORREO_ESPERA_MAX', 3600))
+    CORREO_ARRENDAMIENTO = int(os.environ.get('CORREO_ARRENDAMIENTO', 300))  # segundos
+
+    # Recordatorios de devolución: préstamos leídos por bloque (un bloque = una conexión SMTP)
+    RECORDATORIOS_LOTE = int(os.environ.get('RECORDATORIOS_LOTE', 200))
+    # Hora desde la que el programador de mantenimiento envía los recordatorios del día.
+    # Sin programador, usar `flask recordatorios` desde cron.
+    RECORDATORIOS_HORA = int(os.environ.get('RECORDATORIOS_HORA', 8))
+
+    # OpenLibrary: URLs (reemplazables por un servidor local en pruebas) y caché de consultas
+    OPENLIBRARY_URL = os.environ.get('OPENLIBRARY_URL', 'https://openlibrary.org')
+    OPENLIBRARY_PORTADAS_URL = os.environ.get('OPENLIBRARY_PORTADAS_URL', 'https://covers.openlibrary.org')
+    OPENLIBRARY_TIMEOUT = float(os.environ.get('OPENLIBRARY_TIMEOUT', 5))  # segundos por llamada
+    OPENLIBRARY_REINTENTOS = int(os.environ.get('OPENLIBRARY_REINTENTOS', 2))  # ante 429/5xx y errores de conexión
+    # Conexiones keep-alive e hilos para subconsultas por proceso (máximos, se abren según la demanda).
+    # Cada consulta usa hasta 2 a la vez: para importar conviene 2 × IMPORTACION_HILOS.
+    OPENLIBRARY_CONEXIONES = int(os.environ.get('OPENLIBRARY_CONEXIONES', 64))
+    OPENLIBRARY_CACHE_RUTA = os.environ.get(
+        'OPENLIBRARY_CACHE_RUTA', os.path.join(tempfile.gettempdir(), 'sds_openlibrary.sqlite')
+    )
+    OPENLIBRARY_CACHE_MEMORIA = int(os.environ.get('OPENLIBRARY_CACHE_MEMORIA', 1000))  # entradas por proceso
+    OPENLIBRARY_CACHE_MAX = int(os.environ.get('OPENLIBRARY_CACHE_MAX', 100000))  # entradas en el archivo
+    OPENLIBRARY_TTL = int(os.environ.get('OPENLIBRARY_TTL', 30 * 24 * 3600))  # segundos
+    OPENLIBRARY_TTL_NEGATIVO = int(os.environ.get('OPENLIBRARY_TTL_NEGATIVO', 24 * 3600))
+    OPENLIBRARY_MAX_OBSOLETO = int(os.environ.get('OPENLIBRARY_MAX_OBSOLETO', 365 * 24 * 3600))
+
+    # Importación masiva por ISBN: consultas simultáneas a OpenLibrary y filas por INSERT
+    IMPORTACION_HILOS = int(os.environ.get('IMPORTACION_HILOS', 32))
+    IMPORTACION_LOTE = int(os.environ.get('IMPORTACION_LOTE', 500))
+
+    # Reportes PDF en segundo plano: procesos del pool por worker (0 = un hilo del propio worker)
+    REPORTES_PROCESOS = int(os.environ.get('REPORTES_PROCESOS', 2))
+    # Segundos tras los que un trabajo sin terminar deja de recibir solicitudes del mismo tipo
+    REPORTES_TIEMPO_MAX = int(os.environ.get('REPORTES_TIEMPO_MAX', 900))
+    # Plantilla de fondo: resolución a la que se reescala (0 = la original) y calidad JPEG
+    REPORTES_PLANTILLA_DPI = int(os.environ.get('REPORTES_PLANTILLA_DPI', 150))
+    REPORTES_PLANTILLA_CALIDAD = int(os.environ.get('REPORTES_PLANTILLA_CALIDAD', 85))
+    # Retención de static/archivos (0 desactiva cada regla): días sin uso antes de borrar,
+    # tope total en MB y días sin uso antes de comprimir con gzip. La limpieza la corre el
+    # programador de mantenimiento cada REPORTES_LIMPIEZA_INTERVALO; sin él, `flask limpiar-reportes`.
+    REPORTES_RETENCION_DIAS = int(os.environ.get('REPORTES_RETENCION_DIAS', 90))
+    REPORTES_MAX_MB = int(os.environ.get('REPORTES_MAX_MB', 1024))
+    REPORTES_COMPRIMIR_DIAS = int(os.environ.get('REPORTES_COMPRIMIR_DIAS', 7))
+    REPORTES_LIMPIEZA_INTERVALO = int(os.environ.get('REPORTES_LIMPIEZA_INTERVALO', 3600))  # segundos
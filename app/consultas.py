@@ -0,0 +1,72 @@
+# app/consultas.py
+import logging
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload
+from app.models import Prestamo, Reserva, Favorito, HistorialReporte
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Conjuntos de opciones de carga para listas y reportes
+# ======================================================
+# Las plantillas recorren p.libro.titulo y p.usuario.correo por fila; sin estas
+# opciones cada fila dispara dos SELECT perezosos (N+1). Todas las relaciones
+# son muchos-a-uno con clave foránea obligatoria, así que se cargan con INNER JOIN.
+#
+#     Prestamo.query.options(*PRESTAMO_CON_LIBRO_Y_USUARIO)
+
+PRESTAMO_CON_LIBRO_Y_USUARIO = (
+    joinedload(Prestamo.libro, innerjoin=True),
+    joinedload(Prestamo.usuario, innerjoin=True),
+)
+PRESTAMO_CON_LIBRO = (joinedload(Prestamo.libro, innerjoin=True),)
+
+RESERVA_CON_LIBRO_Y_USUARIO = (
+    joinedload(Reserva.libro, innerjoin=True),
+    joinedload(Reserva.usuario, innerjoin=True),
+)
+RESERVA_CON_LIBRO = (joinedload(Reserva.libro, innerjoin=True),)
+
+FAVORITO_CON_LIBRO = (joinedload(Favorito.libro, innerjoin=True),)
+
+HISTORIAL_CON_ADMIN = (joinedload(HistorialReporte.admin, innerjoin=True),)
+
+
+# ======================================================
+# Presupuesto de consultas por petición
+# ======================================================
+
+class PresupuestoConsultasExcedido(Exception):
+    """ Una petición ejecutó más sentencias SQL que SQL_PRESUPUESTO_CONSULTAS. """
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'consultas_sql' in g:
+        g.consultas_sql += 1
+
+
+def init_app(app):
+    """
+    Cuenta las sentencias SQL de cada petición. Si SQL_PRESUPUESTO_CONSULTAS
+    está definido y se supera, en pruebas (TESTING) la petición falla con
+    PresupuestoConsultasExcedido y en producción solo se registra una advertencia.
+    """
+    @app.before_request
+    def iniciar_conteo_consultas():
+        g.consultas_sql = 0
+
+    @app.after_request
+    def verificar_presupuesto_consultas(response):
+        presupuesto = app.config.get('SQL_PRESUPUESTO_CONSULTAS')
+        total = g.get('consultas_sql', 0)
+        if presupuesto is not None and total > presupuesto:
+            mensaje = (f"{request.endpoint} ejecutó {total} consultas SQL "
+                       f"(presupuesto: {presupuesto}).")
+            if app.testing:
+                raise PresupuestoConsultasExcedido(mensaje)
+            logger.warning(f"[Consultas] {mensaje}")
+        return response
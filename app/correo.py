@@ -0,0 +1,235 @@
+# app/correo.py
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask_mail import Message
+from sqlalchemy import event, or_, update
+from sqlalchemy.orm import Session
+from app.extensions import db, mail
+from app.models import CorreoPendiente
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Bandeja de salida (outbox) de correos
+# ======================================================
+# Las vistas no hablan con el servidor SMTP: `encolar_correo` añade el
+# mensaje a la sesión y se guarda en el mismo commit que el cambio que lo
+# origina. Un grupo de hilos (o `flask enviar-correos`) lo entrega después,
+# con reintentos y espera exponencial. Tras CORREO_MAX_INTENTOS fallos el
+# correo queda como 'fallido' para revisarlo a mano.
+
+REMITENTE = 'noreply@biblioteca.com'
+
+
+def encolar_correo(asunto, destinatarios, cuerpo, remitente=REMITENTE):
+    """
+    Añade un correo a la bandeja de salida. No hace commit: se confirma
+    junto con el resto de la transacción de quien lo llama.
+    """
+    if isinstance(destinatarios, str):
+        destinatarios = [destinatarios]
+    correo = CorreoPendiente(
+        asunto=asunto,
+        remitente=remitente,
+        destinatarios=','.join(destinatarios),
+        cuerpo=cuerpo,
+    )
+    db.session.add(correo)
+    db.session.info['correo_encolado'] = True
+    return correo
+
+
+def _reservar_lote(config, ahora):
+    """
+    Toma hasta CORREO_LOTE correos listos para enviar y los marca como
+    'enviando' durante CORREO_ARRENDAMIENTO segundos. Si el proceso muere
+    a mitad del envío, al vencer ese plazo otro trabajador los retoma.
+    Cada correo se reclama con un UPDATE condicionado: si otro hilo o worker
+    lo tomó después de leerlo, el UPDATE no cambia nada y no se envía dos veces.
+    En MySQL además se saltan las filas bloqueadas por otro trabajador.
+    """
+    listos = (
+        or_(CorreoPendiente.estado == 'pendiente', CorreoPendiente.estado == 'enviando'),
+        CorreoPendiente.proximo_intento <= ahora
+    )
+    consulta = db.session.query(CorreoPendiente.id).filter(*listos) \
+        .order_by(CorreoPendiente.id).limit(config['CORREO_LOTE'])
+
+    if db.session.get_bind().dialect.name == 'mysql':
+        consulta = consulta.with_for_update(skip_locked=True)
+
+    vence = ahora + timedelta(seconds=config['CORREO_ARRENDAMIENTO'])
+    reclamados = []
+    for (correo_id,) in consulta.all():
+        resultado = db.session.execute(
+            update(CorreoPendiente)
+            .where(CorreoPendiente.id == correo_id, *listos)
+            .values(estado='enviando', proximo_intento=vence)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount == 1:
+            reclamados.append(correo_id)
+    db.session.commit()
+
+    if not reclamados:
+        return []
+    return CorreoPendiente.query.filter(CorreoPendiente.id.in_(reclamados)) \
+        .order_by(CorreoPendiente.id).all()
+
+
+def _registrar_fallo(correo, error, config, ahora):
+    correo.intentos += 1
+    correo.ultimo_error = str(error)[:1000]
+    if correo.intentos >= config['CORREO_MAX_INTENTOS']:
+        correo.estado = 'fallido'
+        logger.error(f"[Correo] Correo {correo.id} descartado tras {correo.intentos} intentos: {error}")
+    else:
+        espera = min(config['CORREO_ESPERA_BASE'] * 2 ** (correo.intentos - 1), config['CORREO_ESPERA_MAX'])
+        correo.estado = 'pendiente'
+        correo.proximo_intento = ahora + timedelta(seconds=espera)
+        logger.warning(f"[Correo] Fallo enviando correo {correo.id} (intento {correo.intentos}), "
+                       f"reintento en {espera}s: {error}")
+
+
+def entregar_pendientes(config):
+    """
+    Envía un lote de la bandeja de salida usando una sola conexión SMTP.
+    Devuelve un diccionario con los enviados y los fallidos.
+    """
+    ahora = datetime.utcnow()
+    lote = _reservar_lote(config, ahora)
+    if not lote:
+        return {'enviados': 0, 'fallidos': 0}
+
+    enviados = fallidos = 0
+    try:
+        with mail.connect() as conexion:
+            for correo in lote:
+                msg = Message(
+                    correo.asunto,
+                    sender=correo.remitente,
+                    recipients=correo.destinatarios.split(','),
+                    body=correo.cuerpo
+                )
+                try:
+                    conexion.send(msg)
+                    correo.estado = 'enviado'
+                    correo.fecha_envio = datetime.utcnow()
+                    correo.ultimo_error = None
+                    enviados += 1
+                except Exception as e:
+                    _registrar_fallo(correo, e, config, datetime.utcnow())
+                    fallidos += 1
+    except Exception as e:
+        # No se pudo conectar: todo el lote vuelve a la cola
+        for correo in lote:
+            if correo.estado == 'enviando':
+                _registrar_fallo(correo, e, config, datetime.utcnow())
+                fallidos += 1
+    db.session.commit()
+
+    logger.info(f"[Correo] Lote entregado: {enviados} enviados, {fallidos} fallidos.")
+    return {'enviados': enviados, 'fallidos': fallidos}
+
+
+def entregar_todo(config):
+    """ Vacía la bandeja de salida lote a lote. Útil desde la CLI. """
+    total = {'enviados': 0, 'fallidos': 0}
+    while True:
+        resultado = entregar_pendientes(config)
+        total['enviados'] += resultado['enviados']
+        total['fallidos'] += resultado['fallidos']
+        if not any(resultado.values()):
+            return total
+
+
+# ======================================================
+# Grupo de hilos de envío
+# ======================================================
+
+class TrabajadorCorreo:
+    """
+    Hilos que revisan la bandeja de salida cada CORREO_INTERVALO segundos,
+    o de inmediato cuando un commit acaba de encolar un correo.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._hilos = []
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+        self._candado = threading.Lock()
+
+    @property
+    def activo(self):
+        return any(hilo.is_alive() for hilo in self._hilos)
+
+    def avisar(self):
+        self._aviso.set()
+
+    def iniciar(self, app):
+        with self._candado:
+            if self.activo:
+                return
+            self.app = app
+            self._detener.clear()
+            self._hilos = [
+                threading.Thread(target=self._ciclo, name=f'correo-{i}', daemon=True)
+                for i in range(app.config['CORREO_HILOS'])
+            ]
+            for hilo in self._hilos:
+                hilo.start()
+            logger.info(f"[Correo] {len(self._hilos)} hilos de envío iniciados.")
+
+    def detener(self):
+        self._detener.set()
+        self._aviso.set()
+        for hilo in self._hilos:
+            hilo.join(timeout=5)
+
+    def _ciclo(self):
+        intervalo = self.app.config['CORREO_INTERVALO']
+        while not self._detener.is_set():
+            self._aviso.wait(intervalo)
+            self._aviso.clear()
+            if self._detener.is_set():
+                break
+            with self.app.app_context():
+                try:
+                    while any(entregar_pendientes(self.app.config).values()):
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"[Correo] Error procesando la bandeja de salida: {e}")
+                finally:
+                    db.session.remove()
+
+
+trabajador = TrabajadorCorreo()
+
+
+@event.listens_for(Session, 'after_commit')
+def _avisar_trabajador(session):
+    if session.info.pop('correo_encolado', False):
+        trabajador.avisar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_aviso(session):
+    session.info.pop('correo_encolado', None)
+
+
+def init_app(app):
+    """
+    Arranca los hilos de envío con la primera petición si CORREO_TRABAJADOR
+    está habilitado. Si no, los correos los entrega `flask enviar-correos`.
+    """
+    if not app.config['CORREO_TRABAJADOR']:
+        return
+
+    @app.before_request
+    def iniciar_trabajador_correo():
+        if not trabajador.activo:
+            trabajador.iniciar(app)
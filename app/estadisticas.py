@@ -0,0 +1,73 @@
+# app/estadisticas.py
+import logging
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from flask import current_app
+from app.extensions import db
+from app.models import Usuario, Libro, Prestamo, Reserva, HistorialReporte
+from app.cache import cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Totales del dashboard
+# ======================================================
+# Se calculan con una sola consulta y se guardan en la caché compartida.
+# Cualquier commit que cree, modifique o borre registros de los modelos
+# contados invalida la entrada. Se leen siempre de la base principal, aunque
+# la vista sea @solo_lectura: el recálculo llega justo después de un commit y
+# una réplica atrasada dejaría en caché totales viejos durante ESTADISTICAS_TTL.
+
+CLAVE_TOTALES = 'estadisticas:totales'
+
+MODELOS_CONTADOS = (Usuario, Libro, Prestamo, Reserva, HistorialReporte)
+
+
+def _contar(modelo, *filtros):
+    return select(func.count()).select_from(modelo).where(*filtros).scalar_subquery()
+
+
+def calcular_totales():
+    """ Calcula todos los totales del dashboard en una única consulta (en la base principal). """
+    fila = db.session.execute(select(
+        _contar(Usuario, Usuario.rol == 'administrador').label('total_administradores'),
+        _contar(Usuario, Usuario.rol == 'lector').label('total_lectores'),
+        _contar(Libro).label('total_libros'),
+        _contar(Prestamo).label('total_prestamos'),
+        _contar(Reserva).label('total_reservas'),
+        _contar(HistorialReporte).label('total_reportes'),
+    ), bind_arguments={'bind': db.engine}).one()
+    return dict(fila._mapping)
+
+
+def obtener_totales():
+    """ Devuelve los totales desde la caché, calculándolos si no están. """
+    return cache.obtener_o_calcular(
+        CLAVE_TOTALES, calcular_totales, current_app.config.get('ESTADISTICAS_TTL', 60)
+    )
+
+
+def invalidar_totales():
+    cache.eliminar(CLAVE_TOTALES)
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_cambios_contados(session, flush_context):
+    if session.info.get('estadisticas_modificadas'):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, MODELOS_CONTADOS):
+            session.info['estadisticas_modificadas'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_si_hubo_cambios(session):
+    if session.info.pop('estadisticas_modificadas', False):
+        invalidar_totales()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_cambios_contados(session):
+    session.info.pop('estadisticas_modificadas', None)
@@ -243,6 +243,26 @@ class EditarLibroForm(FlaskForm):
     )
     submit = SubmitField("Guardar cambios")
 
+# Bulk ISBN Import Form
+class ImportarLibrosForm(FlaskForm):
+    # CSV or text file with one ISBN per line (the first ISBN-looking column is used)
+    archivo = FileField(
+        'Archivo de ISBN',
+        validators=[FileAllowed(['csv', 'txt'], 'Solo se permiten archivos CSV o TXT.')]
+    )
+    # ISBNs pasted by hand, optional if a file is uploaded
+    isbns = TextAreaField('ISBN', validators=[Optional()])
+    # Copies registered for each new book
+    cantidad = IntegerField(
+        'Ejemplares por libro',
+        default=1,
+        validators=[
+            DataRequired(message="La cantidad es obligatoria."),
+            NumberRange(min=1, max=1000, message="La cantidad debe estar entre 1 y 1000.")
+        ]
+    )
+    submit = SubmitField('Importar')
+
 # Loan Form
 class PrestamoForm(FlaskForm):
     # Unique loan key, required, must be 7 chars like XXX-XXX
@@ -0,0 +1,252 @@
+# app/importacion.py
+import re
+import csv
+import uuid
+import logging
+import threading
+from time import perf_counter
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models import Libro
+from app.cache import cache
+from app.busqueda import indexar_libros
+from app.estadisticas import invalidar_totales
+from app.openlibrary import cache_openlibrary, normalizar_isbn, obtener_datos_libro
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Importación masiva de libros por ISBN
+# ======================================================
+# Recibe una lista de ISBN (CSV, texto o CLI), descarta los que ya están en el
+# catálogo, pide los metadatos a OpenLibrary con un pool de hilos acotado y
+# registra los libros con INSERT por lotes a medida que llegan los datos.
+# Los INSERT de Core no pasan por after_flush, así que al final se actualizan
+# a mano los índices en memoria y los totales del dashboard.
+
+PORTADA_DEFECTO = '/static/imagenes/portada_default.png'
+CONSULTA_EXISTENTES = 500   # ISBN por cada IN al buscar duplicados
+TTL_ESTADO = 24 * 3600      # Segundos que se conserva el estado de una importación web
+
+_PATRON_ISBN = re.compile(r'^(\d{9}[\dX]|\d{13})$')
+
+
+def isbn_valido(isbn):
+    return bool(_PATRON_ISBN.match(isbn))
+
+
+def leer_isbns(lineas):
+    """
+    Extrae los ISBN de líneas de texto o CSV: en cada línea se usa la primera
+    columna que parezca un ISBN. Las líneas sin dígitos (encabezados, vacías)
+    se ignoran. Devuelve (isbns sin repetir en orden, inválidos, repetidos).
+    """
+    isbns, invalidos, vistos = [], [], set()
+    repetidos = 0
+    for fila in csv.reader(lineas):
+        celdas = [c.strip() for c in fila if c.strip()]
+        if not any(ch.isdigit() for c in celdas for ch in c):
+            continue
+        isbn = next((n for n in map(normalizar_isbn, celdas) if isbn_valido(n)), None)
+        if isbn is None:
+            invalidos.append(','.join(celdas))
+        elif isbn in vistos:
+            repetidos += 1
+        else:
+            vistos.add(isbn)
+            isbns.append(isbn)
+    return isbns, invalidos, repetidos
+
+
+def parsear_fecha_publicacion(texto):
+    """ Convierte la fecha de OpenLibrary ('2001', '2001-05', 'May 2001'...) en date, o None. """
+    texto = (texto or '').strip()
+    if not texto:
+        return None
+    if len(texto) == 4 and texto.isdigit():
+        texto = f"{texto}-01-01"
+    elif len(texto) == 7:
+        texto = f"{texto}-01"
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').date()
+    except ValueError:
+        pass
+    anio = re.search(r'\b(\d{4})\b', texto)
+    return datetime(int(anio.group(1)), 1, 1).date() if anio else None
+
+
+def isbns_existentes(isbns):
+    """ Devuelve los ISBN (normalizados) de la lista que ya están en el catálogo. """
+    existentes = set()
+    # Los ISBN se guardan normalizados (migración 8), así que el IN usa el índice único
+    for i in range(0, len(isbns), CONSULTA_EXISTENTES):
+        lote = isbns[i:i + CONSULTA_EXISTENTES]
+        filas = db.session.query(Libro.isbn).filter(Libro.isbn.in_(lote))
+        existentes.update(isbn for (isbn,) in filas)
+    return existentes
+
+
+def _fila_libro(isbn, datos, cantidad):
+    """ Arma la fila a insertar a partir de los metadatos de OpenLibrary. """
+    return {
+        'isbn': isbn,
+        'titulo': datos['titulo'][:150],
+        'autor': (datos.get('autor') or 'Desconocido')[:100],
+        'editorial': (datos.get('editorial') or '')[:100] or None,
+        'descripcion': datos.get('descripcion') or None,
+        'categoria': datos.get('categoria') or 'otros',
+        'fecha_publicacion': parsear_fecha_publicacion(datos.get('fecha_publicacion')),
+        'portada_url': (datos.get('portada_url') or PORTADA_DEFECTO)[:255],
+        'cantidad_total': cantidad,
+        'cantidad_disponible': cantidad,
+        'estado': 'disponible' if cantidad > 0 else 'prestados',
+    }
+
+
+def _insertar_lote(filas, fallidos):
+    """
+    Inserta el lote con un solo INSERT de varias filas.
+    Si otro usuario registró alguno de esos ISBN mientras tanto, el lote se
+    reintenta fila por fila para no perder el resto.
+    Devuelve los ISBN insertados.
+    """
+    try:
+        db.session.execute(insert(Libro), filas)
+        db.session.commit()
+        return [fila['isbn'] for fila in filas]
+    except IntegrityError:
+        db.session.rollback()
+
+    insertados = []
+    for fila in filas:
+        try:
+            db.session.execute(insert(Libro), [fila])
+            db.session.commit()
+            insertados.append(fila['isbn'])
+        except IntegrityError:
+            db.session.rollback()
+            fallidos.append({'isbn': fila['isbn'], 'error': 'Ya existe un libro con ese ISBN.'})
+    return insertados
+
+
+def importar_isbns(isbns, cantidad=1, hilos=None, lote=None, progreso=None):
+    """
+    Importa los libros de la lista de ISBN normalizados.
+    `progreso(procesados, total)` se llama tras cada consulta a OpenLibrary;
+    los ISBN que ya existían cuentan como procesados desde el inicio.
+    Devuelve un diccionario con importados, existentes, fallidos (ISBN y motivo)
+    y segundos.
+    """
+    config = current_app.config
+    hilos = hilos or config['IMPORTACION_HILOS']
+    lote = lote or config['IMPORTACION_LOTE']
+    inicio = perf_counter()
+
+    existentes = isbns_existentes(isbns)
+    pendientes = [isbn for isbn in isbns if isbn not in existentes]
+    resultado = {
+        'total': len(isbns),
+        'importados': 0,
+        'existentes': sorted(existentes),
+        'fallidos': [],
+    }
+
+    # Los hilos del pool no tienen contexto de aplicación: la caché de
+    # OpenLibrary se configura aquí para que obtener_datos_libro no lo necesite.
+    if not cache_openlibrary.configurada:
+        cache_openlibrary.configurar(config)
+
+    filas, insertados = [], []
+    try:
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='importacion') as ejecutor:
+            futuras = {ejecutor.submit(obtener_datos_libro, isbn): isbn for isbn in pendientes}
+            for procesados, futura in enumerate(as_completed(futuras), 1):
+                isbn = futuras[futura]
+                try:
+                    datos = futura.result()
+                except Exception as e:
+                    datos = {'success': False, 'error': str(e)}
+
+                if datos.get('success') and datos.get('titulo'):
+                    filas.append(_fila_libro(isbn, datos, cantidad))
+                else:
+                    resultado['fallidos'].append({'isbn': isbn, 'error': datos.get('error') or 'Sin título.'})
+
+                if len(filas) >= lote:
+                    insertados.extend(_insertar_lote(filas, resultado['fallidos']))
+                    filas = []
+                if progreso:
+                    progreso(len(existentes) + procesados, len(isbns))
+
+        if filas:
+            insertados.extend(_insertar_lote(filas, resultado['fallidos']))
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if insertados:
+            invalidar_totales()
+            indexar_libros(insertados)
+
+    resultado['importados'] = len(insertados)
+    resultado['segundos'] = round(perf_counter() - inicio, 2)
+    logger.info(f"[Importación] {resultado['importados']} libros importados, "
+                f"{len(existentes)} ya existían, {len(resultado['fallidos'])} con error "
+                f"en {resultado['segundos']} s.")
+    return resultado
+
+
+# ======================================================
+# Importación desde el panel
+# ======================================================
+# La importación corre en un hilo y su estado se guarda en la caché compartida,
+# así que cualquier worker puede responder a la consulta de progreso.
+
+def _clave_estado(trabajo_id):
+    return f'importacion:{trabajo_id}'
+
+
+def estado_importacion(trabajo_id):
+    return cache.obtener(_clave_estado(trabajo_id))
+
+
+def _guardar_estado(trabajo_id, estado):
+    cache.guardar(_clave_estado(trabajo_id), estado, TTL_ESTADO)
+
+
+def iniciar_importacion(app, isbns, invalidos, cantidad):
+    """ Lanza la importación en segundo plano y devuelve el id para consultar su estado. """
+    trabajo_id = uuid.uuid4().hex
+    estado = {
+        'estado': 'en_curso',
+        'procesados': 0,
+        'total': len(isbns),
+        'invalidos': invalidos,
+    }
+    _guardar_estado(trabajo_id, estado)
+
+    def avanzar(procesados, total):
+        # Se guarda cada 20 consultas para no escribir la caché 2.000 veces
+        if procesados % 20 == 0 or procesados == total:
+            _guardar_estado(trabajo_id, {**estado, 'procesados': procesados, 'total': total})
+
+    def ejecutar():
+        with app.app_context():
+            try:
+                resultado = importar_isbns(isbns, cantidad, progreso=avanzar)
+                _guardar_estado(trabajo_id, {**estado, **resultado,
+                                             'estado': 'terminado', 'procesados': len(isbns)})
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"[Importación] Error en la importación {trabajo_id}: {e}")
+                _guardar_estado(trabajo_id, {**estado, 'estado': 'error', 'error': str(e)})
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=ejecutar, name=f'importacion-{trabajo_id[:8]}', daemon=True).start()
+    return trabajo_id
@@ -0,0 +1,198 @@
+# app/mantenimiento.py
+import os
+import threading
+import logging
+from time import monotonic
+from datetime import date, datetime
+from app.extensions import db
+from app.models import Prestamo, Reserva
+from app import recordatorios, almacen_reportes
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin gunicorn, no hace falta elegir líder
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Momento (monotónico) de la última ejecución en este proceso
+_ultima_ejecucion = None
+
+# Último día en que este proceso lanzó los recordatorios de devolución
+_ultimo_dia_recordatorios = None
+
+# Momento (monotónico) de la última limpieza de reportes en este proceso
+_ultima_limpieza_reportes = None
+
+
+def ejecutar_mantenimiento():
+    """
+    Ejecuta todas las transiciones programadas en una sola transacción.
+    Devuelve un diccionario con la cantidad de filas afectadas.
+    """
+    global _ultima_ejecucion
+    hoy = date.today()
+    try:
+        resultado = {'prestamos_atrasados': Prestamo.marcar_atrasados(hoy)}
+        resultado.update(Reserva.vencer_expiradas(hoy))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"[Mantenimiento] Error ejecutando mantenimiento: {e}")
+        raise
+    finally:
+        _ultima_ejecucion = monotonic()
+
+    if any(resultado.values()):
+        logger.info(f"[Mantenimiento] {resultado['prestamos_atrasados']} préstamos atrasados, "
+                    f"{resultado['reservas_vencidas']} reservas vencidas, "
+                    f"{resultado['libros_actualizados']} libros con stock devuelto.")
+    return resultado
+
+
+def ejecutar_recordatorios_diarios(hora):
+    """
+    Envía los recordatorios de devolución una vez al día, a partir de `hora`.
+    Aunque se repita (reinicios, otro líder), los préstamos ya avisados hoy
+    no vuelven a recibir correo.
+    """
+    global _ultimo_dia_recordatorios
+    ahora = datetime.now()
+    if ahora.hour < hora or _ultimo_dia_recordatorios == ahora.date():
+        return None
+    resultado = recordatorios.enviar_recordatorios()
+    _ultimo_dia_recordatorios = ahora.date()
+    return resultado
+
+
+def ejecutar_limpieza_reportes(intervalo):
+    """ Aplica la retención de reportes PDF como mucho una vez cada `intervalo` segundos. """
+    global _ultima_limpieza_reportes
+    if _ultima_limpieza_reportes is not None and monotonic() - _ultima_limpieza_reportes < intervalo:
+        return None
+    _ultima_limpieza_reportes = monotonic()
+    return almacen_reportes.limpiar_reportes()
+
+
+# ======================================================
+# Programador en segundo plano
+# ======================================================
+
+class ProgramadorMantenimiento:
+    """
+    Hilo que ejecuta el mantenimiento cada cierto intervalo, los
+    recordatorios de devolución una vez al día y la limpieza de reportes
+    cada REPORTES_LIMPIEZA_INTERVALO.
+    Con varios workers de gunicorn solo el que obtiene el candado
+    de archivo (líder) trabaja; los demás quedan en espera y toman
+    el relevo si el líder muere.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._hilo = None
+        self._detener = threading.Event()
+        self._candado = threading.Lock()
+        self._archivo_lider = None
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    @property
+    def es_lider(self):
+        return self._archivo_lider is not None
+
+    def iniciar(self, app):
+        with self._candado:
+            if self.activo:
+                return
+            self.app = app
+            self._detener.clear()
+            self._hilo = threading.Thread(
+                target=self._ciclo, name='mantenimiento', daemon=True
+            )
+            self._hilo.start()
+            logger.info("[Mantenimiento] Programador iniciado.")
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=5)
+        self._liberar_lider()
+
+    def _tomar_lider(self):
+        if fcntl is None:
+            return True
+        ruta = self.app.config['MANTENIMIENTO_LOCK']
+        try:
+            archivo = open(ruta, 'a')
+        except OSError as e:
+            logger.error(f"[Mantenimiento] No se pudo abrir el candado {ruta}: {e}")
+            return False
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return False
+        self._archivo_lider = archivo
+        logger.info(f"[Mantenimiento] Proceso {os.getpid()} es el líder.")
+        return True
+
+    def _liberar_lider(self):
+        if self._archivo_lider is not None:
+            self._archivo_lider.close()
+            self._archivo_lider = None
+
+    def _ciclo(self):
+        intervalo = self.app.config['MANTENIMIENTO_INTERVALO']
+        espera = 0
+        while not self._detener.wait(espera):
+            espera = intervalo
+            if not self.es_lider and not self._tomar_lider():
+                continue
+            with self.app.app_context():
+                try:
+                    ejecutar_mantenimiento()
+                except Exception:
+                    pass  # Ya registrado; se reintenta en el próximo ciclo
+                try:
+                    ejecutar_recordatorios_diarios(self.app.config['RECORDATORIOS_HORA'])
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"[Mantenimiento] Error enviando recordatorios: {e}")
+                try:
+                    ejecutar_limpieza_reportes(self.app.config['REPORTES_LIMPIEZA_INTERVALO'])
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"[Mantenimiento] Error limpiando reportes: {e}")
+                finally:
+                    db.session.remove()
+
+
+programador = ProgramadorMantenimiento()
+
+
+def init_app(app):
+    """
+    Registra el mantenimiento en la aplicación.
+    El programador arranca con la primera petición, de modo que los
+    comandos CLI y las pruebas no levantan hilos.
+    Si el programador está deshabilitado, cada petición solo compara
+    la hora de la última ejecución y corre el mantenimiento si venció.
+    """
+    @app.before_request
+    def verificar_mantenimiento():
+        if app.config['MANTENIMIENTO_PROGRAMADOR']:
+            if not programador.activo:
+                programador.iniciar(app)
+            return
+
+        intervalo = app.config['MANTENIMIENTO_INTERVALO']
+        if _ultima_ejecucion is not None and monotonic() - _ultima_ejecucion < intervalo:
+            return
+        try:
+            ejecutar_mantenimiento()
+        except Exception:
+            pass
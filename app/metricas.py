@@ -0,0 +1,212 @@
+# app/metricas.py
+import os
+import json
+import logging
+import threading
+from time import perf_counter
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.extensions import db
+from app.pool import estadisticas_pool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Métricas por endpoint (formato de texto de Prometheus)
+# ======================================================
+# Cada worker guarda sus propias métricas en memoria; el endpoint /metrics
+# expone las del worker que atiende la petición (etiqueta `pid`).
+
+# Límites de los buckets del histograma de latencia, en segundos
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+
+    def __init__(self, limites=BUCKETS_LATENCIA):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+        self.suma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    """ Acumula métricas de peticiones por endpoint. """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.latencia = {}     # endpoint -> Histograma
+        self.peticiones = {}   # (endpoint, método, estado) -> cantidad
+        self.sql = {}          # endpoint -> [sentencias, segundos, filas]
+        self.plantillas = {}   # endpoint -> segundos renderizando
+        self.extras = []       # funciones que devuelven líneas adicionales (p. ej. el pool)
+
+    def registrar(self, endpoint, metodo, estado, duracion, sentencias, segundos_sql, filas, segundos_plantillas):
+        with self._candado:
+            self.latencia.setdefault(endpoint, Histograma()).observar(duracion)
+            clave = (endpoint, metodo, estado)
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            acumulado = self.sql.setdefault(endpoint, [0, 0.0, 0])
+            acumulado[0] += sentencias
+            acumulado[1] += segundos_sql
+            acumulado[2] += filas
+            self.plantillas[endpoint] = self.plantillas.get(endpoint, 0.0) + segundos_plantillas
+
+    def exportar(self):
+        """ Devuelve las métricas en el formato de texto de Prometheus. """
+        pid = os.getpid()
+        lineas = []
+        with self._candado:
+            lineas += ['# HELP sds_peticiones_total Peticiones atendidas.',
+                       '# TYPE sds_peticiones_total counter']
+            for (endpoint, metodo, estado), cantidad in sorted(self.peticiones.items()):
+                lineas.append(f'sds_peticiones_total{{pid="{pid}",endpoint="{endpoint}",'
+                              f'metodo="{metodo}",estado="{estado}"}} {cantidad}')
+
+            lineas += ['# HELP sds_peticion_segundos Latencia de las peticiones.',
+                       '# TYPE sds_peticion_segundos histogram']
+            for endpoint, h in sorted(self.latencia.items()):
+                etiqueta = f'pid="{pid}",endpoint="{endpoint}"'
+                acumulado = 0
+                for limite, conteo in zip(h.limites, h.conteos):
+                    acumulado += conteo
+                    lineas.append(f'sds_peticion_segundos_bucket{{{etiqueta},le="{limite}"}} {acumulado}')
+                lineas.append(f'sds_peticion_segundos_bucket{{{etiqueta},le="+Inf"}} {h.total}')
+                lineas.append(f'sds_peticion_segundos_sum{{{etiqueta}}} {h.suma:.6f}')
+                lineas.append(f'sds_peticion_segundos_count{{{etiqueta}}} {h.total}')
+
+            for nombre, indice, ayuda in (
+                ('sds_sql_sentencias_total', 0, 'Sentencias SQL ejecutadas.'),
+                ('sds_sql_segundos_total', 1, 'Tiempo total en SQL.'),
+                ('sds_sql_filas_total', 2, 'Filas devueltas o afectadas según el driver.'),
+            ):
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+                for endpoint, valores in sorted(self.sql.items()):
+                    valor = f'{valores[indice]:.6f}' if indice == 1 else valores[indice]
+                    lineas.append(f'{nombre}{{pid="{pid}",endpoint="{endpoint}"}} {valor}')
+
+            lineas += ['# HELP sds_plantilla_segundos_total Tiempo renderizando plantillas.',
+                       '# TYPE sds_plantilla_segundos_total counter']
+            for endpoint, segundos in sorted(self.plantillas.items()):
+                lineas.append(f'sds_plantilla_segundos_total{{pid="{pid}",endpoint="{endpoint}"}} {segundos:.6f}')
+
+        for extra in self.extras:
+            lineas += extra()
+        return '\n'.join(lineas) + '\n'
+
+
+registro = RegistroMetricas()
+
+
+# Nombre, tipo y ayuda de cada dato de app.pool.estadisticas_pool
+METRICAS_POOL = {
+    'tamano': ('gauge', 'Conexiones permanentes del pool.'),
+    'en_uso': ('gauge', 'Conexiones prestadas en este momento.'),
+    'libres': ('gauge', 'Conexiones abiertas disponibles en el pool.'),
+    'desborde': ('gauge', 'Conexiones abiertas por encima del tamaño del pool.'),
+    'esperas': ('counter', 'Veces que se pidió una conexión al pool.'),
+    'segundos_espera': ('counter', 'Tiempo total esperando una conexión.'),
+    'max_espera': ('gauge', 'Mayor espera observada por una conexión, en segundos.'),
+    'agotados': ('counter', 'Peticiones que no obtuvieron conexión a tiempo.'),
+}
+
+
+def _lineas_pool():
+    pid = os.getpid()
+    lineas = []
+    for nombre, valor in estadisticas_pool(db.engine.pool).items():
+        tipo, ayuda = METRICAS_POOL[nombre]
+        lineas += [f'# HELP sds_pool_{nombre} {ayuda}', f'# TYPE sds_pool_{nombre} {tipo}',
+                   f'sds_pool_{nombre}{{pid="{pid}"}} {valor:.6f}' if isinstance(valor, float)
+                   else f'sds_pool_{nombre}{{pid="{pid}"}} {valor}']
+    return lineas
+
+
+# Tiempo y filas de cada sentencia SQL; el conteo lo lleva app.consultas (g.consultas_sql).
+# El inicio se guarda en el contexto de la ejecución y no en la conexión:
+# after_cursor_execute no llega si la sentencia falla y nada queda colgado
+# de una conexión que el pool reutiliza.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _inicio_sentencia(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metricas_inicio = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _fin_sentencia(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, 'metricas_inicio', None)
+    if inicio is None:
+        return
+    if has_request_context() and 'sql_segundos' in g:
+        g.sql_segundos += perf_counter() - inicio
+        if cursor.rowcount and cursor.rowcount > 0:
+            g.sql_filas += cursor.rowcount
+
+
+def _inicio_plantilla(sender, template, context, **extra):
+    if has_request_context():
+        g.inicio_plantilla = perf_counter()
+
+
+def _fin_plantilla(sender, template, context, **extra):
+    if has_request_context() and 'inicio_plantilla' in g:
+        g.plantillas_segundos += perf_counter() - g.pop('inicio_plantilla')
+
+
+def init_app(app):
+    """
+    Registra la instrumentación de peticiones. Las peticiones más lentas que
+    METRICAS_UMBRAL_LENTO_MS se registran además como una línea JSON.
+    """
+    if not app.config.get('METRICAS_HABILITADAS', True):
+        return
+
+    if _lineas_pool not in registro.extras:
+        registro.extras.append(_lineas_pool)
+    before_render_template.connect(_inicio_plantilla, app)
+    template_rendered.connect(_fin_plantilla, app)
+
+    @app.before_request
+    def iniciar_metricas():
+        g.inicio_peticion = perf_counter()
+        g.sql_segundos = 0.0
+        g.sql_filas = 0
+        g.plantillas_segundos = 0.0
+
+    @app.after_request
+    def registrar_metricas(response):
+        if 'inicio_peticion' not in g:
+            return response
+        duracion = perf_counter() - g.inicio_peticion
+        endpoint = request.endpoint or 'desconocido'
+        sentencias = g.get('consultas_sql', 0)
+        registro.registrar(
+            endpoint, request.method, response.status_code, duracion,
+            sentencias, g.sql_segundos, g.sql_filas, g.plantillas_segundos
+        )
+
+        umbral = app.config.get('METRICAS_UMBRAL_LENTO_MS')
+        if umbral is not None and duracion * 1000 >= umbral:
+            logger.warning(json.dumps({
+                'evento': 'peticion_lenta',
+                'endpoint': endpoint,
+                'metodo': request.method,
+                'ruta': request.path,
+                'estado': response.status_code,
+                'ms': round(duracion * 1000, 2),
+                'sql_sentencias': sentencias,
+                'sql_ms': round(g.sql_segundos * 1000, 2),
+                'sql_filas': g.sql_filas,
+                'plantillas_ms': round(g.plantillas_segundos * 1000, 2),
+            }, ensure_ascii=False))
+        return response
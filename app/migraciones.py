@@ -0,0 +1,154 @@
+# app/migraciones.py
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app.extensions import db
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Migraciones versionadas del esquema
+# ======================================================
+# Cada migración recibe una conexión dentro de una transacción y debe ser
+# idempotente: la versión 1 crea el esquema completo en bases nuevas, así que
+# las siguientes solo completan lo que les falte a las bases existentes.
+# La tabla `version_esquema` guarda qué versiones ya se aplicaron.
+MIGRACIONES = []
+
+
+def migracion(version, descripcion):
+    """ Registra una función como migración con su número de versión. """
+    def decorator(f):
+        MIGRACIONES.append((version, descripcion, f))
+        MIGRACIONES.sort(key=lambda m: m[0])
+        return f
+    return decorator
+
+
+def crear_indices(conexion, tabla, nombres):
+    """ Crea los índices declarados en el modelo que todavía no existen. """
+    existentes = {i['name'] for i in inspect(conexion).get_indexes(tabla)}
+    for indice in db.metadata.tables[tabla].indexes:
+        if indice.name in nombres and indice.name not in existentes:
+            indice.create(bind=conexion)
+            logger.info(f"[Migraciones] Índice {indice.name} creado en {tabla}.")
+
+
+@migracion(1, 'Esquema inicial')
+def _esquema_inicial(conexion):
+    db.metadata.create_all(bind=conexion)
+
+
+@migracion(2, 'Índices compuestos para préstamos, reservas, favoritos y libros')
+def _indices_consultas_frecuentes(conexion):
+    crear_indices(conexion, 'prestamos', {'ix_prestamos_estado_devolucion'})
+    crear_indices(conexion, 'reservas', {'ix_reservas_estado_expiracion', 'ix_reservas_libro_estado_fecha'})
+    crear_indices(conexion, 'favoritos', {'ix_favoritos_usuario_libro'})
+    crear_indices(conexion, 'libros', {'ix_libros_estado', 'ix_libros_categoria'})
+
+
+@migracion(3, 'Índice FULLTEXT para la búsqueda de libros (solo MySQL)')
+def _indice_fulltext_libros(conexion):
+    if conexion.dialect.name != 'mysql':
+        return
+    existentes = {i['name'] for i in inspect(conexion).get_indexes('libros')}
+    if 'ft_libros_busqueda' not in existentes:
+        conexion.execute(text(
+            "ALTER TABLE libros ADD FULLTEXT INDEX ft_libros_busqueda "
+            "(titulo, autor, editorial, isbn, descripcion)"
+        ))
+        logger.info("[Migraciones] Índice FULLTEXT ft_libros_busqueda creado en libros.")
+
+
+@migracion(4, 'Tabla outbox para el envío diferido de correos')
+def _tabla_outbox(conexion):
+    db.metadata.tables['outbox'].create(bind=conexion, checkfirst=True)
+
+
+@migracion(5, 'Marca de recordatorio enviado en préstamos')
+def _marca_recordatorio_prestamos(conexion):
+    columnas = {c['name'] for c in inspect(conexion).get_columns('prestamos')}
+    if 'recordatorio_enviado' not in columnas:
+        conexion.execute(text("ALTER TABLE prestamos ADD COLUMN recordatorio_enviado DATE NULL"))
+        logger.info("[Migraciones] Columna recordatorio_enviado añadida a prestamos.")
+
+
+@migracion(6, 'Estado y hash del contenido en el historial de reportes')
+def _retencion_historial_reportes(conexion):
+    columnas = {c['name'] for c in inspect(conexion).get_columns('historial_reportes')}
+    if 'estado' not in columnas:
+        conexion.execute(text(
+            "ALTER TABLE historial_reportes ADD COLUMN estado VARCHAR(20) NOT NULL DEFAULT 'disponible'"
+        ))
+        logger.info("[Migraciones] Columna estado añadida a historial_reportes.")
+    if 'hash_contenido' not in columnas:
+        conexion.execute(text("ALTER TABLE historial_reportes ADD COLUMN hash_contenido VARCHAR(64) NULL"))
+        logger.info("[Migraciones] Columna hash_contenido añadida a historial_reportes.")
+    crear_indices(conexion, 'historial_reportes', {'ix_historial_reportes_hash'})
+
+
+@migracion(7, 'Índice por archivo en el historial de reportes')
+def _indice_ruta_historial_reportes(conexion):
+    crear_indices(conexion, 'historial_reportes', {'ix_historial_reportes_ruta'})
+
+
+@migracion(8, 'ISBN de libros sin guiones ni espacios')
+def _normalizar_isbn_libros(conexion):
+    from app.openlibrary import normalizar_isbn
+    filas = conexion.execute(text(
+        "SELECT id, isbn FROM libros WHERE isbn LIKE '%-%' OR isbn LIKE '% %' OR isbn LIKE '%x'"
+    )).all()
+    normalizados = 0
+    for libro_id, isbn in filas:
+        normalizado = normalizar_isbn(isbn)
+        if normalizado == isbn:
+            continue
+        duplicado = conexion.execute(
+            text("SELECT id FROM libros WHERE isbn = :isbn"), {'isbn': normalizado}
+        ).first()
+        if duplicado:
+            # Dos libros con el mismo ISBN escrito distinto: se deja para revisarlo a mano
+            logger.warning(f"[Migraciones] ISBN {isbn} (libro {libro_id}) repetido en el libro {duplicado[0]}: sin cambios.")
+            continue
+        conexion.execute(text("UPDATE libros SET isbn = :isbn WHERE id = :id"), {'isbn': normalizado, 'id': libro_id})
+        normalizados += 1
+    if normalizados:
+        logger.info(f"[Migraciones] {normalizados} ISBN de libros normalizados.")
+
+
+def _asegurar_tabla_versiones(conexion):
+    conexion.execute(text(
+        "CREATE TABLE IF NOT EXISTS version_esquema ("
+        " version INTEGER NOT NULL PRIMARY KEY,"
+        " descripcion VARCHAR(200) NOT NULL,"
+        " fecha_aplicacion DATETIME NOT NULL)"
+    ))
+
+
+def versiones_aplicadas():
+    with db.engine.begin() as conexion:
+        _asegurar_tabla_versiones(conexion)
+        return {fila[0] for fila in conexion.execute(text("SELECT version FROM version_esquema"))}
+
+
+def aplicar_migraciones():
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción.
+    Devuelve la lista de versiones aplicadas.
+    """
+    aplicadas = versiones_aplicadas()
+    nuevas = []
+    for version, descripcion, funcion in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        with db.engine.begin() as conexion:
+            funcion(conexion)
+            conexion.execute(
+                text("INSERT INTO version_esquema (version, descripcion, fecha_aplicacion) "
+                     "VALUES (:version, :descripcion, :fecha)"),
+                {'version': version, 'descripcion': descripcion, 'fecha': datetime.utcnow()}
+            )
+        logger.info(f"[Migraciones] Versión {version} aplicada: {descripcion}")
+        nuevas.append(version)
+    return nuevas
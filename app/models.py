@@ -1,9 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import Enum
+from sqlalchemy import Enum, case, func, select, update
 from app.extensions import db
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import secrets
 
 # ------------------ MODELO USUARIO ------------------
@@ -47,12 +47,21 @@ class Usuario(db.Model, UserMixin):
 
 class HistorialReporte(db.Model):
     __tablename__ = 'historial_reportes'
+    __table_args__ = (
+        # Buscar un reporte vigente con el mismo contenido para compartir el archivo
+        db.Index('ix_historial_reportes_hash', 'hash_contenido'),
+        # Hash ya calculado de un archivo reutilizado y marcado de expirados
+        db.Index('ix_historial_reportes_ruta', 'ruta_archivo'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nombre_reporte = db.Column(db.String(100), nullable=False)
     ruta_archivo = db.Column(db.String(200), nullable=False)
     fecha_generacion = db.Column(db.DateTime, default=datetime.utcnow)
     admin_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    # 'disponible' o 'expirado' (la limpieza de reportes borró el archivo)
+    estado = db.Column(db.String(20), nullable=False, default='disponible', server_default='disponible')
+    hash_contenido = db.Column(db.String(64))  # sha256 del PDF
 
     admin = db.relationship("Usuario", backref="reportes_generados")
 
@@ -64,6 +73,10 @@ class HistorialReporte(db.Model):
 
 class Libro(db.Model):
     __tablename__ = 'libros'
+    __table_args__ = (
+        db.Index('ix_libros_estado', 'estado'),
+        db.Index('ix_libros_categoria', 'categoria'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(150), nullable=False)
@@ -100,6 +113,10 @@ class Libro(db.Model):
 
 class Prestamo(db.Model):
     __tablename__ = 'prestamos'
+    __table_args__ = (
+        # Préstamos atrasados: estado = 'activo' AND fecha_devolucion_esperada < hoy
+        db.Index('ix_prestamos_estado_devolucion', 'estado', 'fecha_devolucion_esperada'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     libro_id = db.Column(db.Integer, db.ForeignKey('libros.id'), nullable=False)
@@ -112,6 +129,7 @@ class Prestamo(db.Model):
         nullable=False,
         default='activo'
     )
+    recordatorio_enviado = db.Column(db.Date)  # Día en que se envió el recordatorio de devolución
 
     libro = db.relationship("Libro", back_populates="prestamos")
     usuario = db.relationship("Usuario", back_populates="prestamos")
@@ -119,11 +137,32 @@ class Prestamo(db.Model):
     def __repr__(self):
         return f"<Prestamo(id={self.id}, libro_id={self.libro_id}, usuario_id={self.usuario_id})>"
 
+    @classmethod
+    def marcar_atrasados(cls, hoy=None):
+        """
+        Marca en bloque como 'atrasado' los préstamos activos con la
+        fecha de devolución vencida. Devuelve la cantidad de filas afectadas.
+        """
+        hoy = hoy or date.today()
+        resultado = db.session.execute(
+            update(cls)
+            .where(cls.estado == 'activo', cls.fecha_devolucion_esperada < hoy)
+            .values(estado='atrasado')
+            .execution_options(synchronize_session=False)
+        )
+        return resultado.rowcount
+
 
 # ------------------ MODELO RESERVA ------------------
 
 class Reserva(db.Model):
     __tablename__ = 'reservas'
+    __table_args__ = (
+        # Reservas vencidas: estado = 'activa' AND fecha_expiracion < hoy
+        db.Index('ix_reservas_estado_expiracion', 'estado', 'fecha_expiracion'),
+        # Cola de reservas de un libro ordenada por fecha
+        db.Index('ix_reservas_libro_estado_fecha', 'libro_id', 'estado', 'fecha_reserva'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     libro_id = db.Column(db.Integer, db.ForeignKey('libros.id'), nullable=False)
@@ -169,11 +208,72 @@ class Reserva(db.Model):
         self.estado = 'confirmada'
         self.posicion = None
 
+    LOTE_VENCIMIENTO = 500  # Ids por cada IN al vencer reservas en bloque
+
+    @classmethod
+    def vencer_expiradas(cls, hoy=None):
+        """
+        Vence en bloque las reservas activas expiradas y devuelve al stock
+        los ejemplares apartados, sin cargar objetos en la sesión:
+
+        1. SELECT ... FOR UPDATE toma los ids de las reservas a vencer.
+        2. UPDATE reservas ... WHERE id IN (...) las marca como vencidas.
+        3. UPDATE libros JOIN (SELECT libro_id, COUNT(*) ... WHERE id IN (...)) suma el stock.
+        4. UPDATE libros recalcula el estado de los libros afectados.
+
+        Todo ocurre en la transacción de quien llama, por bloques de
+        LOTE_VENCIMIENTO ids. Devuelve un diccionario con las reservas
+        vencidas y los libros actualizados.
+        """
+        hoy = hoy or date.today()
+        ids = db.session.scalars(
+            select(cls.id)
+            .where(cls.estado == 'activa', cls.fecha_expiracion < hoy)
+            .order_by(cls.id)
+            .with_for_update()
+        ).all()
+
+        reservas = libros = 0
+        for inicio in range(0, len(ids), cls.LOTE_VENCIMIENTO):
+            bloque = ids[inicio:inicio + cls.LOTE_VENCIMIENTO]
+            reservas += db.session.execute(
+                update(cls)
+                .where(cls.id.in_(bloque), cls.estado == 'activa')
+                .values(estado='vencida')
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+            vencidas = (
+                select(cls.libro_id, func.count(cls.id).label('cantidad'))
+                .where(cls.id.in_(bloque), cls.estado == 'vencida')
+                .group_by(cls.libro_id)
+                .subquery()
+            )
+            libros += db.session.execute(
+                update(Libro)
+                .where(Libro.id == vencidas.c.libro_id)
+                .values(cantidad_disponible=Libro.cantidad_disponible + vencidas.c.cantidad)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+            # Equivalente en bloque de Libro.actualizar_estado()
+            db.session.execute(
+                update(Libro)
+                .where(Libro.id.in_(select(vencidas.c.libro_id)), Libro.estado != 'eliminado')
+                .values(estado=case((Libro.cantidad_disponible == 0, 'prestados'), else_='disponible'))
+                .execution_options(synchronize_session=False)
+            )
+
+        return {'reservas_vencidas': reservas, 'libros_actualizados': libros}
+
 
 # ------------------ MODELO FAVORITO ------------------
 
 class Favorito(db.Model):
     __tablename__ = 'favoritos'
+    __table_args__ = (
+        db.Index('ix_favoritos_usuario_libro', 'usuario_id', 'libro_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -185,3 +285,35 @@ class Favorito(db.Model):
 
     def __repr__(self):
         return f"<Favorito(id={self.id}, usuario_id={self.usuario_id}, libro_id={self.libro_id})>"
+
+
+# ------------------ MODELO CORREO PENDIENTE (OUTBOX) ------------------
+
+class CorreoPendiente(db.Model):
+    """
+    Correo saliente guardado en la misma transacción que el cambio que lo
+    origina. Lo entrega app.correo en segundo plano.
+    Estados: pendiente -> enviando -> enviado, o fallido tras agotar reintentos.
+    """
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        db.Index('ix_outbox_estado_intento', 'estado', 'proximo_intento'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    asunto = db.Column(db.String(200), nullable=False)
+    remitente = db.Column(db.String(100), nullable=False)
+    destinatarios = db.Column(db.Text, nullable=False)  # Separados por coma
+    cuerpo = db.Column(db.Text, nullable=False)
+    estado = db.Column(
+        Enum('pendiente', 'enviando', 'enviado', 'fallido', name='estado_correo'),
+        nullable=False, default='pendiente'
+    )
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    proximo_intento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_error = db.Column(db.Text)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_envio = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<CorreoPendiente(id={self.id}, asunto='{self.asunto}', estado='{self.estado}')>"
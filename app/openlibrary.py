@@ -1,60 +1,273 @@
 # app/openlibrary.py
-import requests
+import re
+import json
+import sqlite3
 import logging
+import threading
+from time import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+from app.categorias import clasificar
 
 # Configura logger para registrar mensajes en lugar de usar print()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NO_ENCONTRADO = "Libro no encontrado"
+
+
+def normalizar_isbn(isbn: str) -> str:
+    """ Quita guiones y espacios; la X final del ISBN-10 va en mayúscula. """
+    return re.sub(r'[^0-9Xx]', '', isbn or '').upper()
+
+
 # ======================================================
-# Tabla de mapeo de categorías de OpenLibrary a internas
+# Caché de consultas a OpenLibrary
 # ======================================================
-# Si OpenLibrary devuelve un subject que coincida con una key aquí,
-# se usará la categoría interna como valor de nuestro sistema.
-MAPEO_CATEGORIAS = {
-    "fiction": "novela",
-    "novel": "novela",
-    "detective and mystery stories": "novela",
-    "police procedural": "thriller",
-    "science fiction": "ciencia_ficcion",
-    "fantasy": "fantasía",
-    "thrillers": "thriller",
-    "horror": "terror",
-    "romance": "romance",
-    "historical fiction": "novela_historica",
-    "history": "historia",
-    "biography": "biografia",
-    "short stories": "cuento",
-    "poetry": "poesia",
-    "drama": "teatro",
-    "comedies": "comedia",
-    "juvenile fiction": "juvenil",
-    "young adult fiction": "juvenil",
-    "graphic novels": "historieta",
-    "comics": "historieta",
-    "philosophy": "filosofia",
-    "essays": "ensayo",
-    "true crime": "ficcion_criminal",
-    "crime fiction": "ficcion_criminal",
-    "political satire": "sátira",
-    "satire": "sátira",
-    "classic fiction": "clasico",
-    "classic literature": "clasico",
-    "magical realism": "realismo_magico"
-}
+# Dos niveles: un LRU en memoria por proceso y un archivo SQLite compartido
+# entre workers y reinicios. Los "no encontrado" también se guardan, con un
+# TTL más corto. Una entrada vencida se sigue sirviendo al instante mientras
+# se refresca en segundo plano (stale-while-revalidate), así que escanear un
+# libro ya visto no espera nunca a OpenLibrary. Los refrescos usan el pool de
+# hilos del cliente HTTP, pero como mucho una cuarta parte: consultar_openlibrary
+# encola ahí la portada y la edición y espera por ellas, así que el pool nunca
+# debe quedar lleno solo de refrescos. Sin cupo libre el refresco se omite y el
+# dato viejo se refresca en una consulta posterior.
+
+class CacheOpenLibrary:
+
+    def __init__(self):
+        self._memoria = OrderedDict()   # isbn -> (datos, guardado)
+        self._candado = threading.Lock()
+        self._refrescando = set()
+        self._cupos_refresco = None
+        self._config = None
+        self._inserciones = 0
+
+    @property
+    def configurada(self):
+        return self._config is not None
+
+    def configurar(self, config):
+        self._config = {
+            'ruta': config['OPENLIBRARY_CACHE_RUTA'],
+            'max_memoria': config['OPENLIBRARY_CACHE_MEMORIA'],
+            'max_archivo': config['OPENLIBRARY_CACHE_MAX'],
+            'ttl': config['OPENLIBRARY_TTL'],
+            'ttl_negativo': config['OPENLIBRARY_TTL_NEGATIVO'],
+            'max_obsoleto': config['OPENLIBRARY_MAX_OBSOLETO'],
+            'api': config['OPENLIBRARY_URL'],
+            'portadas': config['OPENLIBRARY_PORTADAS_URL'],
+            'timeout': config['OPENLIBRARY_TIMEOUT'],
+        }
+        sesion_http(config['OPENLIBRARY_REINTENTOS'], config['OPENLIBRARY_CONEXIONES'])
+        self._cupos_refresco = threading.BoundedSemaphore(max(1, config['OPENLIBRARY_CONEXIONES'] // 4))
+        with self._conectar() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS openlibrary '
+                '(isbn TEXT PRIMARY KEY, datos TEXT NOT NULL, guardado REAL NOT NULL)'
+            )
+            conexion.execute('CREATE INDEX IF NOT EXISTS ix_openlibrary_guardado ON openlibrary (guardado)')
+
+    def _conectar(self):
+        return sqlite3.connect(self._config['ruta'], timeout=5)
+
+    # ---------- niveles ----------
+
+    def _leer_memoria(self, isbn):
+        with self._candado:
+            entrada = self._memoria.get(isbn)
+            if entrada is not None:
+                self._memoria.move_to_end(isbn)
+            return entrada
+
+    def _guardar_memoria(self, isbn, datos, guardado):
+        with self._candado:
+            self._memoria[isbn] = (datos, guardado)
+            self._memoria.move_to_end(isbn)
+            while len(self._memoria) > self._config['max_memoria']:
+                self._memoria.popitem(last=False)
+
+    def _leer_archivo(self, isbn):
+        try:
+            with self._conectar() as conexion:
+                fila = conexion.execute(
+                    'SELECT datos, guardado FROM openlibrary WHERE isbn = ?', (isbn,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"[OpenLibrary] Error leyendo la caché: {e}")
+            return None
+        return (json.loads(fila[0]), fila[1]) if fila else None
+
+    def _guardar_archivo(self, isbn, datos, guardado):
+        try:
+            with self._conectar() as conexion:
+                conexion.execute(
+                    'INSERT OR REPLACE INTO openlibrary (isbn, datos, guardado) VALUES (?, ?, ?)',
+                    (isbn, json.dumps(datos), guardado)
+                )
+                self._inserciones += 1
+                if self._inserciones % 100 == 0:
+                    # Mantiene el archivo acotado: se descartan las entradas más antiguas
+                    conexion.execute(
+                        'DELETE FROM openlibrary WHERE isbn IN (SELECT isbn FROM openlibrary '
+                        'ORDER BY guardado DESC LIMIT -1 OFFSET ?)', (self._config['max_archivo'],)
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"[OpenLibrary] Error guardando en la caché: {e}")
+
+    # ---------- consulta ----------
+
+    def _ttl(self, datos):
+        return self._config['ttl'] if datos.get('success') else self._config['ttl_negativo']
+
+    def _consultar_y_guardar(self, isbn):
+        c = self._config
+        datos = consultar_openlibrary(isbn, c['api'], c['portadas'], c['timeout'])
+        # Los errores de red no se guardan: solo resultados y "no encontrado"
+        if datos.get('success') or datos.get('error') == NO_ENCONTRADO:
+            guardado = time()
+            self._guardar_memoria(isbn, datos, guardado)
+            self._guardar_archivo(isbn, datos, guardado)
+        return datos
+
+    def _refrescar_en_segundo_plano(self, isbn):
+        with self._candado:
+            if isbn in self._refrescando or not self._cupos_refresco.acquire(blocking=False):
+                return
+            self._refrescando.add(isbn)
+
+        def refrescar():
+            try:
+                self._consultar_y_guardar(isbn)
+            except Exception as e:
+                logger.error(f"[OpenLibrary] Error refrescando {isbn}: {e}")
+            finally:
+                with self._candado:
+                    self._refrescando.discard(isbn)
+                self._cupos_refresco.release()
+
+        _ejecutor.submit(refrescar)
+
+    def obtener(self, isbn):
+        entrada = self._leer_memoria(isbn)
+        if entrada is None:
+            entrada = self._leer_archivo(isbn)
+            if entrada is not None:
+                self._guardar_memoria(isbn, *entrada)
+
+        if entrada is not None:
+            datos, guardado = entrada
+            antiguedad = time() - guardado
+            if antiguedad <= self._ttl(datos):
+                return datos
+            if antiguedad <= self._config['max_obsoleto']:
+                self._refrescar_en_segundo_plano(isbn)
+                return datos
+
+        datos = self._consultar_y_guardar(isbn)
+        if not datos.get('success') and datos.get('error') != NO_ENCONTRADO and entrada is not None:
+            return entrada[0]  # OpenLibrary caído: mejor un dato viejo que ninguno
+        return datos
+
+
+cache_openlibrary = CacheOpenLibrary()
 
 
 def obtener_datos_libro(isbn: str) -> dict | None:
+    """
+    Devuelve los metadatos del libro con ese ISBN usando la caché de
+    OpenLibrary; solo consulta la API si no hay una entrada utilizable.
+    """
+    isbn = normalizar_isbn(isbn)
+    if not isbn:
+        return {"success": False, "error": NO_ENCONTRADO}
+    if not cache_openlibrary.configurada:
+        cache_openlibrary.configurar(current_app.config)
+    return cache_openlibrary.obtener(isbn)
+
+
+# ======================================================
+# Cliente HTTP
+# ======================================================
+# Una sola sesión de requests por proceso: mantiene las conexiones TCP/TLS
+# abiertas (keep-alive) y reintenta los errores transitorios. La portada y
+# la edición se piden a la vez, así que el peor caso es la llamada más lenta
+# y no la suma de todas.
+
+_sesion = None
+_ejecutor = None
+_candado_sesion = threading.Lock()
+
+
+def sesion_http(reintentos=2, conexiones=10):
+    """ Devuelve la sesión compartida, creándola en el primer uso. """
+    global _sesion, _ejecutor
+    with _candado_sesion:
+        if _sesion is None:
+            politica = Retry(
+                total=reintentos,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=('GET', 'HEAD'),
+            )
+            adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=conexiones, max_retries=politica)
+            _sesion = requests.Session()
+            _sesion.mount('https://', adaptador)
+            _sesion.mount('http://', adaptador)
+            _sesion.headers['User-Agent'] = 'SDS-Library/1.0'
+            _ejecutor = ThreadPoolExecutor(max_workers=conexiones, thread_name_prefix='openlibrary')
+        return _sesion
+
+
+def _verificar_portada(url, timeout):
+    """ Comprueba con HEAD que la portada existe, sin descargarla. """
+    try:
+        if sesion_http().head(url, timeout=timeout).ok:
+            return url
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"[OpenLibrary] Fallback cover error: {e}")
+    return None
+
+
+def _obtener_edicion(url, timeout):
+    """ Devuelve (descripción, subjects) de la edición. """
+    try:
+        ed_resp = sesion_http().get(url, timeout=timeout)
+        ed_resp.raise_for_status()
+        ed_data = ed_resp.json()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"[OpenLibrary] Subjects fallback error: {e}")
+        return '', []
+
+    descripcion = ''
+    desc_ed = ed_data.get('description')
+    if isinstance(desc_ed, dict):
+        descripcion = desc_ed.get('value', '')
+    elif isinstance(desc_ed, str):
+        descripcion = desc_ed
+    return descripcion, ed_data.get('subjects', [])
+
+
+def consultar_openlibrary(isbn: str, api: str, portadas: str, timeout: float = 5) -> dict:
     """
     Consulta la API de OpenLibrary usando un ISBN
     y devuelve un diccionario con metadatos mapeados a nuestro sistema.
+    No usa caché: ver obtener_datos_libro.
     """
+    sesion = sesion_http()
+
     # Construir URL base de bibkeys
-    base_url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
+    base_url = f"{api}/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
 
     try:
         # Hacer la petición principal
-        resp = requests.get(base_url, timeout=5)
+        resp = sesion.get(base_url, timeout=timeout)
         resp.raise_for_status()
         data = resp.json()
     except requests.exceptions.RequestException as e:
@@ -64,7 +277,7 @@ def obtener_datos_libro(isbn: str) -> dict | None:
     libro = data.get(f"ISBN:{isbn}")
     if not libro:
         # Si no se encuentra información
-        return {"success": False, "error": "Libro no encontrado"}
+        return {"success": False, "error": NO_ENCONTRADO}
 
     # Extraer campos principales: título, autores, editorial, fecha
     titulo = libro.get('title', '')
@@ -89,55 +302,32 @@ def obtener_datos_libro(isbn: str) -> dict | None:
         descripcion = desc_raw
 
     # Intentar obtener URL de portada
-    # Si no viene, usar covers.openlibrary.org fallback
+    # Si no viene, se verifica el fallback de covers.openlibrary.org
     portada_url = None
     if 'cover' in libro:
         portada_url = libro['cover'].get('large') or libro['cover'].get('medium')
 
+    # La verificación de portada y la edición (subjects) se piden en paralelo
+    futura_portada = futura_edicion = None
     if not portada_url:
-        fallback_url = f"https://covers.openlibrary.org/b/isbn/{isbn}-L.jpg?default=false"
-        try:
-            # Usamos HEAD para verificar si existe sin descargar todo
-            head_resp = requests.head(fallback_url, timeout=5)
-            if head_resp.ok:
-                portada_url = fallback_url
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"[OpenLibrary] Fallback cover error: {e}")
-            portada_url = None
-            
-    # Extraer subject para categorizar con fallback
-    categoria = "otros"
-    edition_key = libro.get('key')
-    subjects = []
+        fallback_url = f"{portadas}/b/isbn/{isbn}-L.jpg?default=false"
+        futura_portada = _ejecutor.submit(_verificar_portada, fallback_url, timeout)
 
+    edition_key = libro.get('key')
     if edition_key:
-        # Si existe edition key, hacemos segunda consulta
         olid = edition_key.split('/')[-1]
-        ed_url = f"https://openlibrary.org/books/{olid}.json"
-        try:
-            ed_resp = requests.get(ed_url, timeout=5)
-            ed_resp.raise_for_status()
-            ed_data = ed_resp.json()
-
-            # Si la descripción no vino en la primera llamada, usar esta
-            if not descripcion:
-                desc_ed = ed_data.get('description')
-                if isinstance(desc_ed, dict):
-                    descripcion = desc_ed.get('value', '')
-                elif isinstance(desc_ed, str):
-                    descripcion = desc_ed
-
-            # Extraer subjects
-            subjects = ed_data.get('subjects', [])
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"[OpenLibrary] Subjects fallback error: {e}")
-
-    # Mapear categoría si encontramos coincidencia
-    for s in subjects:
-        s_lower = s.lower().strip()
-        if s_lower in MAPEO_CATEGORIAS:
-            categoria = MAPEO_CATEGORIAS[s_lower]
-            break
+        futura_edicion = _ejecutor.submit(_obtener_edicion, f"{api}/books/{olid}.json", timeout)
+
+    subjects = []
+    if futura_edicion is not None:
+        desc_ed, subjects = futura_edicion.result()
+        # Si la descripción no vino en la primera llamada, usar esta
+        descripcion = descripcion or desc_ed
+    if futura_portada is not None:
+        portada_url = futura_portada.result()
+
+    # Mapear categoría con la taxonomía compartida (app/categorias.py)
+    categoria = clasificar(subjects)
 
     # Retornar estructura de respuesta
     return {
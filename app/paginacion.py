@@ -0,0 +1,162 @@
+# app/paginacion.py
+import json
+import base64
+import binascii
+from datetime import date, datetime
+from flask import request, url_for
+from sqlalchemy import text, tuple_
+from app.extensions import db
+
+# ======================================================
+# Paginación por cursor (keyset)
+# ======================================================
+# En lugar de OFFSET + COUNT(*), cada página continúa desde la clave de
+# ordenación del último elemento visto: WHERE (orden, id) > (:orden, :id).
+# Con un índice sobre esas columnas la página 5.000 cuesta lo mismo que la 1.
+# El cursor es opaco para el cliente: JSON en base64 con la dirección, los valores
+# y, en las tablas administrativas, el total contado en la primera página.
+
+POR_PAGINA = 12
+POR_PAGINA_ADMIN = 50
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    return valor
+
+
+def _deserializar(valor):
+    """ Solo escalares o fechas: cualquier otra cosa no puede venir de codificar_cursor. """
+    if isinstance(valor, dict):
+        if len(valor) == 1 and isinstance(valor.get('dt'), str):
+            return datetime.fromisoformat(valor['dt'])
+        if len(valor) == 1 and isinstance(valor.get('d'), str):
+            return date.fromisoformat(valor['d'])
+    elif isinstance(valor, (str, int, float)):
+        return valor
+    raise ValueError(valor)
+
+
+def codificar_cursor(direccion, valores, total=None):
+    datos = [direccion, [_serializar(v) for v in valores]]
+    if total is not None:
+        datos.append(total)
+    datos = json.dumps(datos, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve (direccion, valores, total); un cursor ausente o inválido
+    equivale a la primera página.
+    """
+    if not cursor:
+        return 'sig', None, None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        direccion, valores, *resto = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        total = resto[0] if resto else None
+        if (direccion not in ('sig', 'ant') or not isinstance(valores, list) or len(resto) > 1
+                or not (total is None or (isinstance(total, int) and not isinstance(total, bool)))):
+            raise ValueError(cursor)
+        return direccion, [_deserializar(v) for v in valores], total
+    except (ValueError, TypeError, binascii.Error):
+        return 'sig', None, None
+
+
+class PaginaCursor:
+    """ Página de resultados con cursores hacia la página siguiente y la anterior. """
+
+    def __init__(self, items, siguiente, anterior, per_page, total=None):
+        self.items = items
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self.per_page = per_page
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.siguiente is not None
+
+    @property
+    def has_prev(self):
+        return self.anterior is not None
+
+    def _url(self, cursor):
+        argumentos = request.args.to_dict()
+        argumentos['cursor'] = cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **argumentos)
+
+    def url_siguiente(self):
+        return self._url(self.siguiente) if self.siguiente else None
+
+    def url_anterior(self):
+        return self._url(self.anterior) if self.anterior else None
+
+
+def total_aproximado(query, modelo):
+    """
+    Total de filas de `query`. Si la consulta no tiene filtros y la base es
+    MySQL usa las estadísticas de la tabla (aproximadas, sin recorrerla); con
+    filtros, o en otros motores, hace un COUNT(*) de la consulta.
+    """
+    if query.whereclause is None and db.engine.dialect.name == 'mysql':
+        return db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla"
+        ), {'tabla': modelo.__tablename__}).scalar()
+    return query.order_by(None).count()
+
+
+def paginar_por_cursor(query, *orden, cursor=None, por_pagina=POR_PAGINA,
+                       descendente=False, con_total=False):
+    """
+    Pagina `query` por las columnas de `orden`; la última debe ser única (normalmente el id).
+
+        pagina = paginar_por_cursor(Libro.query, Libro.id, cursor=request.args.get('cursor'))
+    """
+    direccion, valores, total = decodificar_cursor(cursor)
+    if valores is not None and len(valores) != len(orden):
+        direccion, valores, total = 'sig', None, None
+    hacia_atras = direccion == 'ant'
+    ascendente = descendente == hacia_atras
+
+    consulta = query.order_by(None)
+    if valores is not None:
+        clave = tuple_(*orden)
+        consulta = consulta.filter(clave > tuple_(*valores) if ascendente else clave < tuple_(*valores))
+    consulta = consulta.order_by(*(c.asc() if ascendente else c.desc() for c in orden))
+
+    items = consulta.limit(por_pagina + 1).all()
+    hay_mas = len(items) > por_pagina
+    items = items[:por_pagina]
+    if hacia_atras:
+        items.reverse()
+
+    def clave_de(item):
+        return [getattr(item, columna.key) for columna in orden]
+
+    # El total se cuenta al entrar (sin cursor) y viaja en los cursores: las
+    # páginas siguientes no vuelven a hacer COUNT(*)
+    if not con_total:
+        total = None
+    elif total is None:
+        total = total_aproximado(query, orden[-1].class_)
+
+    siguiente = anterior = None
+    if items:
+        if hay_mas or hacia_atras:
+            siguiente = codificar_cursor('sig', clave_de(items[-1]), total)
+        if valores is not None and (hay_mas or not hacia_atras):
+            anterior = codificar_cursor('ant', clave_de(items[0]), total)
+
+    return PaginaCursor(items, siguiente, anterior, por_pagina, total)
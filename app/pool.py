@@ -0,0 +1,77 @@
+# app/pool.py
+import ssl
+import threading
+from time import perf_counter
+from sqlalchemy.pool import QueuePool
+
+# ======================================================
+# Pool de conexiones a MySQL
+# ======================================================
+
+
+def contexto_ssl(ca=None):
+    """
+    Contexto TLS único para todas las conexiones del proceso. PyMySQL crea
+    (y carga los certificados de) un contexto nuevo por conexión si recibe
+    un diccionario; con un SSLContext lo reutiliza.
+    Sin archivo CA se mantiene el comportamiento anterior: sin verificar.
+    """
+    contexto = ssl.create_default_context(cafile=ca)
+    if ca is None:
+        contexto.check_hostname = False
+        contexto.verify_mode = ssl.CERT_NONE
+    return contexto
+
+
+class PoolMedido(QueuePool):
+    """ QueuePool que además mide cuánto esperan las peticiones por una conexión. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._candado_medidas = threading.Lock()
+        self.esperas = 0
+        self.segundos_espera = 0.0
+        self.max_espera = 0.0
+        self.agotados = 0
+
+    def _do_get(self):
+        inicio = perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._candado_medidas:
+                self.agotados += 1
+            raise
+        finally:
+            espera = perf_counter() - inicio
+            with self._candado_medidas:
+                self.esperas += 1
+                self.segundos_espera += espera
+                self.max_espera = max(self.max_espera, espera)
+
+    def recreate(self):
+        # pool_pre_ping/invalidate recrean el pool: se conservan las medidas
+        nuevo = super().recreate()
+        nuevo.esperas, nuevo.segundos_espera = self.esperas, self.segundos_espera
+        nuevo.max_espera, nuevo.agotados = self.max_espera, self.agotados
+        return nuevo
+
+
+def estadisticas_pool(pool):
+    """ Estado actual del pool; las medidas de espera solo si es un PoolMedido. """
+    datos = {}
+    if isinstance(pool, QueuePool):
+        datos.update(
+            tamano=pool.size(),
+            en_uso=pool.checkedout(),
+            libres=pool.checkedin(),
+            desborde=max(pool.overflow(), 0),  # Negativo mientras el pool no está lleno
+        )
+    if isinstance(pool, PoolMedido):
+        datos.update(
+            esperas=pool.esperas,
+            segundos_espera=pool.segundos_espera,
+            max_espera=pool.max_espera,
+            agotados=pool.agotados,
+        )
+    return datos
@@ -0,0 +1,156 @@
+# app/recordatorios.py
+import logging
+from itertools import groupby
+from time import perf_counter
+from datetime import date, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import or_, select, update
+from app.extensions import db, mail
+from app.models import Usuario, Libro, Prestamo
+from app.correo import REMITENTE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Recordatorios de devolución
+# ======================================================
+# Los préstamos que vencen mañana se leen con una consulta (usuario y libro
+# incluidos) por bloque, se agrupan en un único correo por usuario y cada
+# bloque se envía reutilizando una sola conexión SMTP.
+# Cada préstamo avisado guarda el día del envío (recordatorio_enviado), así
+# que repetir la tarea el mismo día no vuelve a enviar nada.
+
+ASUNTO = '⏰ Recordatorio de Devolución'
+
+
+def _consulta_vencen(fecha, hoy):
+    return (
+        select(
+            Prestamo.id.label('prestamo_id'), Usuario.id.label('usuario_id'), Usuario.nombre,
+            Usuario.correo, Libro.titulo, Prestamo.fecha_devolucion_esperada
+        )
+        .join(Prestamo.usuario)
+        .join(Prestamo.libro)
+        .where(
+            Prestamo.estado == 'activo',
+            Prestamo.fecha_devolucion_esperada == fecha,
+            or_(Prestamo.recordatorio_enviado.is_(None), Prestamo.recordatorio_enviado < hoy)
+        )
+        .order_by(Usuario.id, Prestamo.id)
+    )
+
+
+def _redactar(nombre, filas):
+    fecha = filas[0].fecha_devolucion_esperada
+    if len(filas) == 1:
+        detalle = f'Te recordamos que debes devolver el libro "{filas[0].titulo}" mañana.'
+    else:
+        titulos = '\n'.join(f'  • {f.titulo}' for f in filas)
+        detalle = f'Te recordamos que debes devolver mañana estos {len(filas)} libros:\n\n{titulos}'
+    return f"""
+Hola {nombre},
+
+{detalle}
+
+📅 Fecha de devolución esperada: {fecha}
+
+¡Gracias por usar nuestra biblioteca!
+
+Biblioteca SDS library
+"""
+
+
+def _digestos(filas):
+    """ Agrupa las filas (ordenadas por usuario) en un mensaje por usuario. """
+    for _, grupo in groupby(filas, key=lambda f: f.usuario_id):
+        grupo = list(grupo)
+        msg = Message(ASUNTO, sender=REMITENTE, recipients=[grupo[0].correo])
+        msg.body = _redactar(grupo[0].nombre, grupo)
+        yield msg, [f.prestamo_id for f in grupo]
+
+
+def _bloques(fecha, hoy, tamano):
+    """
+    Recorre los préstamos por bloques de unas `tamano` filas usando el id de
+    usuario como cursor (keyset). Un bloque nunca parte los préstamos de un
+    usuario, para que cada uno reciba un único correo. Entre bloque y bloque
+    no queda ningún cursor abierto, así que se puede hacer commit.
+    """
+    ultimo_usuario = 0
+    while True:
+        filas = db.session.execute(
+            _consulta_vencen(fecha, hoy).where(Usuario.id > ultimo_usuario).limit(tamano)
+        ).all()
+        if not filas:
+            return
+        if len(filas) == tamano:
+            ultimo = filas[-1].usuario_id
+            if filas[0].usuario_id == ultimo:
+                # Un solo usuario ocupa todo el bloque: se leen todos sus préstamos
+                filas = db.session.execute(_consulta_vencen(fecha, hoy).where(Usuario.id == ultimo)).all()
+            else:
+                # El último usuario puede estar incompleto: pasa al bloque siguiente
+                filas = [f for f in filas if f.usuario_id != ultimo]
+        ultimo_usuario = filas[-1].usuario_id
+        yield filas
+
+
+def _marcar_enviados(prestamos, hoy):
+    db.session.execute(
+        update(Prestamo)
+        .where(Prestamo.id.in_(prestamos))
+        .values(recordatorio_enviado=hoy)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _enviar_lote(lote, resultado, hoy):
+    """ Envía un lote de mensajes por una sola conexión SMTP y marca los préstamos avisados. """
+    if not lote:
+        return
+    avisados = []
+    try:
+        with mail.connect() as conexion:
+            for msg, prestamos in lote:
+                try:
+                    conexion.send(msg)
+                    avisados += prestamos
+                    resultado['mensajes'] += 1
+                    resultado['libros'] += len(prestamos)
+                except Exception as e:
+                    resultado['fallidos'] += 1
+                    logger.warning(f"[Recordatorios] No se pudo enviar a {msg.recipients[0]}: {e}")
+    except Exception as e:
+        resultado['fallidos'] += len(lote)
+        logger.error(f"[Recordatorios] Error de conexión SMTP, {len(lote)} recordatorios sin enviar: {e}")
+    if avisados:
+        _marcar_enviados(avisados, hoy)
+
+
+def enviar_recordatorios(fecha=None):
+    """
+    Envía un recordatorio por usuario con todos sus préstamos que vencen
+    en `fecha` (por defecto, mañana) y que aún no se avisaron hoy.
+    Devuelve los contadores del envío.
+    """
+    hoy = date.today()
+    fecha = fecha or hoy + timedelta(days=1)
+    tamano_lote = current_app.config['RECORDATORIOS_LOTE']
+    resultado = {'mensajes': 0, 'libros': 0, 'fallidos': 0}
+    inicio = perf_counter()
+
+    for filas in _bloques(fecha, hoy, tamano_lote):
+        _enviar_lote(list(_digestos(filas)), resultado, hoy)
+
+    segundos = perf_counter() - inicio
+    resultado['segundos'] = round(segundos, 3)
+    if resultado['mensajes'] or resultado['fallidos']:
+        logger.info(
+            f"[Recordatorios] {resultado['mensajes']} correos ({resultado['libros']} libros) en "
+            f"{segundos:.2f}s, {resultado['mensajes'] / segundos if segundos else 0:.1f} mensajes/s, "
+            f"{resultado['fallidos']} fallidos."
+        )
+    return resultado
@@ -0,0 +1,67 @@
+# app/replicas.py
+import logging
+from time import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session as sesion_http
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Lecturas en réplica
+# ======================================================
+# Si SQLALCHEMY_BINDS define 'replica', las vistas marcadas con
+# @solo_lectura leen de ella; las escrituras (flush, INSERT/UPDATE/DELETE)
+# siempre van a la base principal. Después de que un usuario confirma
+# una escritura, sus lecturas vuelven a la principal durante
+# REPLICA_VENTANA_ESCRITURA segundos para que vea sus propios cambios
+# aunque la réplica vaya con retraso.
+
+BIND_REPLICA = 'replica'
+CLAVE_VENTANA = 'lectura_principal_hasta'
+
+
+def solo_lectura(f):
+    """ Marca una vista cuyas consultas pueden ir a la réplica. """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.solo_lectura = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _usar_replica(sesion, clause):
+    if sesion._flushing or isinstance(clause, UpdateBase):
+        return False
+    if not has_request_context() or not g.get('solo_lectura'):
+        return False
+    if BIND_REPLICA not in sesion._db.engines:
+        return False
+    return sesion_http.get(CLAVE_VENTANA, 0) < time()
+
+
+class SesionEnrutada(Session):
+    """ Sesión que envía las lecturas de vistas de solo lectura a la réplica. """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _usar_replica(self, clause):
+            return self._db.engines[BIND_REPLICA]
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['escritura_principal'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(SesionEnrutada, 'after_commit')
+def _abrir_ventana_principal(sesion):
+    if sesion.info.pop('escritura_principal', False) and has_request_context():
+        ventana = current_app.config.get('REPLICA_VENTANA_ESCRITURA', 5)
+        if ventana and BIND_REPLICA in sesion._db.engines:
+            sesion_http[CLAVE_VENTANA] = time() + ventana
+
+
+@event.listens_for(SesionEnrutada, 'after_rollback')
+def _descartar_escritura(sesion):
+    sesion.info.pop('escritura_principal', None)
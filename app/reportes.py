@@ -0,0 +1,302 @@
+# app/reportes.py
+import os
+import uuid
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import date
+from flask import current_app
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models import Prestamo, Reserva, Libro, Usuario, HistorialReporte
+from app.cache import cache
+from app.utils import generar_reporte_con_plantilla
+from app import almacen_reportes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Reportes PDF
+# ======================================================
+# Cada reporte se define por sus columnas y un generador de filas que lee la
+# base con yield_per (solo las columnas necesarias, sin objetos ORM). El PDF
+# se arma página a página (TablaContinua en app/utils.py) y se escribe
+# directo al archivo, así que la memoria no crece con la cantidad de filas.
+#
+# El nombre del archivo es la huella de los datos: si nada cambió desde el
+# último reporte del mismo tipo se reutiliza ese PDF en lugar de generarlo.
+# La huella no recorre las filas: usa una versión de los datos guardada en la
+# caché compartida, que cambia con cada commit que toca libros, usuarios,
+# préstamos o reservas (como los totales de app/estadisticas.py). La versión
+# se lee antes de dibujar, así un archivo nunca tiene datos más viejos que los
+# que indica su nombre; la vence TTL_VERSION_DATOS por si algún cambio no pasó
+# por la sesión (SQL crudo, migraciones).
+
+FILAS_POR_LOTE = 2000  # Filas que trae cada viaje a la base
+LARGO_HUELLA = 24      # Caracteres de la huella en el nombre del archivo
+VERSION_FORMATO = 1    # Subir al cambiar el diseño del PDF para no reutilizar archivos viejos
+
+CLAVE_VERSION_DATOS = 'reportes:version_datos'
+TTL_VERSION_DATOS = 24 * 3600  # Segundos; al vencer, cada reporte se genera una vez más
+TTL_FILAS = TTL_VERSION_DATOS  # Filas de cada archivo generado, para informarlas al reutilizarlo
+
+MODELOS_REPORTADOS = (Libro, Usuario, Prestamo, Reserva)
+
+# `contar` devuelve el total de filas (para informar el progreso) o None
+Reporte = namedtuple('Reporte', 'nombre subtitulo prefijo columnas filas contar requiere_datos')
+# Resultado de obtener_reporte; `nombre` es None si el reporte requiere datos y no hay filas
+ArchivoReporte = namedtuple('ArchivoReporte', 'nombre filas reutilizado hash_contenido')
+
+
+def _en_lotes(consulta):
+    return db.session.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE))
+
+
+def _condiciones_atrasados():
+    return (
+        Prestamo.fecha_devolucion_esperada < date.today(),
+        Prestamo.fecha_devolucion.is_(None)
+    )
+
+
+def _contar_atrasados():
+    return db.session.scalar(select(func.count(Prestamo.id)).where(*_condiciones_atrasados()))
+
+
+def _contar_prestados():
+    return db.session.scalar(select(func.count(Prestamo.id)))
+
+
+def _filas_atrasados():
+    consulta = select(
+        Libro.titulo, Usuario.correo, Prestamo.fecha_devolucion_esperada
+    ).select_from(Prestamo).join(Prestamo.libro).join(Prestamo.usuario).where(
+        *_condiciones_atrasados()
+    ).order_by(Prestamo.id)
+    for idx, (titulo, correo, vence) in enumerate(_en_lotes(consulta), start=1):
+        yield [idx, titulo, correo, vence.strftime('%Y-%m-%d')]
+
+
+def _filas_prestados():
+    consulta = select(
+        Libro.titulo, Usuario.correo, Prestamo.fecha_prestamo, Prestamo.fecha_devolucion
+    ).select_from(Prestamo).join(Prestamo.libro).join(Prestamo.usuario).order_by(Prestamo.id)
+    for idx, (titulo, correo, prestado, devuelto) in enumerate(_en_lotes(consulta), start=1):
+        yield [
+            idx,
+            titulo,
+            correo,
+            prestado.strftime('%Y-%m-%d'),
+            devuelto.strftime('%Y-%m-%d') if devuelto else "No devuelto"
+        ]
+
+
+def consulta_populares(limite=5):
+    """ Ranking de libros por préstamos más reservas pendientes. """
+    prestamos_subq = db.session.query(
+        Prestamo.libro_id,
+        func.count(Prestamo.id).label('prestamos')
+    ).group_by(Prestamo.libro_id).subquery()
+
+    reservas_subq = db.session.query(
+        Reserva.libro_id,
+        func.count(Reserva.id).label('reservas')
+    ).filter(Reserva.estado == 'pendiente').group_by(Reserva.libro_id).subquery()
+
+    return db.session.query(
+        Libro.id,
+        Libro.titulo,
+        Libro.autor,
+        func.coalesce(prestamos_subq.c.prestamos, 0).label('prestamos'),
+        func.coalesce(reservas_subq.c.reservas, 0).label('reservas'),
+        (func.coalesce(prestamos_subq.c.prestamos, 0) + func.coalesce(reservas_subq.c.reservas, 0)).label('total')
+    ).outerjoin(prestamos_subq, prestamos_subq.c.libro_id == Libro.id) \
+     .outerjoin(reservas_subq, reservas_subq.c.libro_id == Libro.id) \
+     .order_by(db.desc('total')).limit(limite)
+
+
+def _filas_populares():
+    for idx, p in enumerate(consulta_populares(), start=1):
+        yield [idx, p.titulo, p.autor, p.prestamos, p.reservas, p.total]
+
+
+REPORTES = {
+    'atrasados': Reporte(
+        nombre="Libros Atrasados",
+        subtitulo="Reporte de Libros Atrasados",
+        prefijo="reporte_atrasados",
+        columnas=["#", "Libro", "Correo", "Fecha Vencida"],
+        filas=_filas_atrasados,
+        contar=_contar_atrasados,
+        requiere_datos=False,
+    ),
+    'prestados': Reporte(
+        nombre="Libros Prestados",
+        subtitulo="Reporte de Libros Prestados",
+        prefijo="reporte_prestados",
+        columnas=["#", "Libro", "Correo", "Fecha Préstamo", "Fecha Devolución"],
+        filas=_filas_prestados,
+        contar=_contar_prestados,
+        requiere_datos=False,
+    ),
+    'populares': Reporte(
+        nombre="Libros Populares",
+        subtitulo="Reporte de Libros Populares",
+        prefijo="reporte_populares",
+        columnas=["#", "Libro", "Autor", "Préstamos", "Reservas Pendientes", "Total"],
+        filas=_filas_populares,
+        contar=None,
+        requiere_datos=True,
+    ),
+}
+
+
+def _huella_base(tipo):
+    """ sha256 iniciado con lo que define el aspecto del PDF (columnas, plantilla, formato). """
+    reporte = REPORTES[tipo]
+    plantilla = os.path.join(current_app.root_path, 'static', 'imagenes', 'plantilla.jpg')
+    return hashlib.sha256(repr((
+        tipo, VERSION_FORMATO, reporte.subtitulo, reporte.columnas,
+        os.path.getmtime(plantilla) if os.path.exists(plantilla) else None,
+        current_app.config['REPORTES_PLANTILLA_DPI'], current_app.config['REPORTES_PLANTILLA_CALIDAD'],
+    )).encode())
+
+
+# ======================================================
+# Versión de los datos reportados
+# ======================================================
+
+def version_datos():
+    """
+    Versión actual de los datos de los reportes. Si no hay (primera vez,
+    vencida o caché caída) se crea otra y el reporte se genera de nuevo.
+    """
+    version = cache.obtener(CLAVE_VERSION_DATOS)
+    if version is None:
+        nueva = uuid.uuid4().hex
+        if cache.agregar(CLAVE_VERSION_DATOS, nueva, TTL_VERSION_DATOS) is False:
+            version = cache.obtener(CLAVE_VERSION_DATOS)  # Otro worker se adelantó
+        version = version or nueva
+    return version
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_datos_reportados(session, flush_context):
+    if session.info.get('reportes_modificados'):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, MODELOS_REPORTADOS):
+            session.info['reportes_modificados'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_sentencias_reportadas(estado):
+    # insert()/update()/delete() masivos sobre los modelos no pasan por el flush
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    mapper = estado.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, MODELOS_REPORTADOS):
+        estado.session.info['reportes_modificados'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _nueva_version_si_hubo_cambios(session):
+    if session.info.pop('reportes_modificados', False):
+        cache.guardar(CLAVE_VERSION_DATOS, uuid.uuid4().hex, TTL_VERSION_DATOS)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_datos_reportados(session):
+    session.info.pop('reportes_modificados', None)
+
+
+def huella_datos(tipo):
+    """
+    Huella del reporte sin recorrer sus filas: lo que define su aspecto, la
+    versión de los datos y el día (los atrasados dependen de la fecha).
+    Cuesta una lectura de la caché.
+    """
+    huella = _huella_base(tipo)
+    huella.update(f"{version_datos()}|{date.today().isoformat()}".encode())
+    return huella.hexdigest()
+
+
+def _nombre_archivo(reporte, huella):
+    return f"{reporte.prefijo}_{huella[:LARGO_HUELLA]}.pdf"
+
+
+def _clave_filas(nombre):
+    return f'reportes:filas:{nombre}'
+
+
+def _contar_filas(reporte):
+    return reporte.contar() if reporte.contar else sum(1 for _ in reporte.filas())
+
+
+def obtener_reporte(tipo, progreso=None):
+    """
+    Devuelve el ArchivoReporte del PDF con los datos actuales. Si ya hay un
+    archivo con la misma huella (aunque esté comprimido) se reutiliza sin
+    leer la base; si no, se genera en una sola pasada y se comparte con otro
+    idéntico si lo hay.
+    """
+    reporte = REPORTES[tipo]
+    nombre = _nombre_archivo(reporte, huella_datos(tipo))
+    if almacen_reportes.buscar(nombre):
+        logger.info(f"[Reportes] '{tipo}' sin cambios desde el último reporte: se reutiliza {nombre}")
+        almacen_reportes.tocar(nombre)
+        filas = cache.obtener(_clave_filas(nombre))
+        if filas is None:
+            filas = _contar_filas(reporte)
+        return ArchivoReporte(nombre, filas, True, almacen_reportes.hash_registrado(nombre))
+
+    carpeta = almacen_reportes.carpeta_archivos()
+    temporal = os.path.join(carpeta, f"{reporte.prefijo}.{uuid.uuid4().hex}.tmp")
+    filas = _dibujar(reporte, temporal, progreso)
+    if reporte.requiere_datos and not filas:
+        os.remove(temporal)
+        return ArchivoReporte(None, 0, False, None)
+
+    os.replace(temporal, os.path.join(carpeta, nombre))
+    cache.guardar(_clave_filas(nombre), filas, TTL_FILAS)
+    return ArchivoReporte(nombre, filas, False, almacen_reportes.deduplicar(nombre))
+
+
+def registrar_historial(tipo, archivo, admin_id):
+    """ Añade al historial (sin commit) la descarga del reporte y su archivo. """
+    historial = HistorialReporte(
+        nombre_reporte=REPORTES[tipo].nombre,
+        ruta_archivo=f'archivos/{archivo.nombre}',
+        admin_id=admin_id,
+        hash_contenido=archivo.hash_contenido
+    )
+    db.session.add(historial)
+    return historial
+
+
+def generar_reporte(tipo, ruta, progreso=None):
+    """
+    Genera el reporte `tipo` en `ruta` y devuelve la cantidad de filas.
+    Se escribe en un archivo temporal propio que se renombra al terminar, así
+    nunca queda a la vista un PDF a medias aunque dos procesos generen el
+    mismo. `progreso(filas)` se llama por página.
+    """
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    filas = _dibujar(REPORTES[tipo], temporal, progreso)
+    os.replace(temporal, ruta)
+    return filas
+
+
+def _dibujar(reporte, temporal, progreso=None):
+    """ Dibuja el PDF en `temporal` y devuelve la cantidad de filas. """
+    total = generar_reporte_con_plantilla(
+        reporte.filas(), reporte.columnas, reporte.subtitulo, destino=temporal, progreso=progreso
+    )
+    if total is None:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise RuntimeError(f"No se pudo generar el reporte '{reporte.nombre}'.")
+    return total
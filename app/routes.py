@@ -7,25 +7,41 @@ from flask import (
     make_response, session
 )
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_mail import Message 
 from functools import wraps
 from datetime import datetime, timedelta, date
 from werkzeug.utils import secure_filename
-from sqlalchemy import extract, func, case, or_
+from sqlalchemy import case, or_
 from time import time
 import requests
 # Extensiones y modelos de la aplicación
-from app.extensions import db, login_manager, mail
+from app.extensions import db, login_manager
+from app import metricas
+from app.estadisticas import obtener_totales
+from app.correo import encolar_correo
+from app.replicas import solo_lectura
+from app import tablero
 from app.models import Usuario, Libro, Prestamo, Reserva, Favorito, HistorialReporte
-from app.openlibrary import obtener_datos_libro
+from app.openlibrary import obtener_datos_libro, normalizar_isbn
+from app.reportes import REPORTES, ArchivoReporte, consulta_populares, obtener_reporte, registrar_historial
+from app import almacen_reportes
+from app.categorias import CATEGORIAS
+from app.trabajos import encolar_reporte, estado_trabajo, TERMINADO
+from app.importacion import leer_isbns, iniciar_importacion, estado_importacion, parsear_fecha_publicacion
+from app.busqueda import buscar_libros
+from app.sugerencias import obtener_sugerencias
+from app.paginacion import paginar_por_cursor, POR_PAGINA_ADMIN
+from app.consultas import (
+    PRESTAMO_CON_LIBRO_Y_USUARIO, PRESTAMO_CON_LIBRO, RESERVA_CON_LIBRO_Y_USUARIO,
+    RESERVA_CON_LIBRO, FAVORITO_CON_LIBRO, HISTORIAL_CON_ADMIN
+)
 from app.forms import (
     RegistroForm, LibroForm, EditarLibroForm, EditarReservaForm,
     NuevaReservaForm, PrestamoForm, ReservaLectorForm,
-    AgregarLectorPresencialForm, EditarUsuarioForm, LoginForm
+    AgregarLectorPresencialForm, EditarUsuarioForm, LoginForm,
+    ImportarLibrosForm
 )
 from app.utils import (
-    verificar_token, generar_token, generar_reporte_con_plantilla,
-    activar_siguiente_reserva
+    verificar_token, generar_token, activar_siguiente_reserva
 )
 logging.basicConfig(level=logging.INFO)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
@@ -34,11 +50,20 @@ MAX_CONTENT_LENGTH = 16 * 1024 * 1024
 def allowed_file(nombre_archivo):
     return '.' in nombre_archivo and \
            nombre_archivo.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-# Obtener catalogo para paginacion 
-def obtener_catalogo(page):
-    per_page = 12
-    libros = Libro.query.filter(Libro.estado != 'eliminado').paginate(page=page, per_page=per_page)
-    return libros
+# Obtener catalogo para paginacion por cursor
+def obtener_catalogo(cursor):
+    return paginar_por_cursor(
+        Libro.query.filter(Libro.estado != 'eliminado'), Libro.id, cursor=cursor
+    )
+# Pagina tablas administrativas por id
+def paginar_admin(query, modelo, descendente=False):
+    return paginar_por_cursor(
+        query, modelo.id,
+        cursor=request.args.get('cursor'),
+        por_pagina=POR_PAGINA_ADMIN,
+        descendente=descendente,
+        con_total=True
+    )
 # Inyecta categorías de libros en el contexto de todas las plantillas
 
 # Decorador para evitar cacheo de páginas
@@ -58,41 +83,9 @@ login_manager.login_view = 'main.login'
 @main.context_processor
 def inject_categorias():
     """
-    Mapea categorías externas a internas y devuelve lista única.
+    Lista única y ordenada de categorías internas (precalculada en app/categorias.py).
     """
-    mapeo_categorias = {
-        "fiction": "novela",
-        "novel": "novela",
-        "detective and mystery stories": "novela",
-        "police procedural": "thriller",
-        "science fiction": "ciencia_ficcion",
-        "fantasy": "fantasía",
-        "thrillers": "thriller",
-        "horror": "terror",
-        "romance": "romance",
-        "historical fiction": "novela_historica",
-        "history": "historia",
-        "biography": "biografia",
-        "short stories": "cuento",
-        "poetry": "poesia",
-        "drama": "teatro",
-        "comedies": "comedia",
-        "juvenile fiction": "juvenil",
-        "young adult fiction": "juvenil",
-        "graphic novels": "historieta",
-        "comics": "historieta",
-        "philosophy": "filosofia",
-        "essays": "ensayo",
-        "true crime": "ficcion_criminal",
-        "crime fiction": "ficcion_criminal",
-        "political satire": "sátira",
-        "satire": "sátira",
-        "classic fiction": "clasico",
-        "classic literature": "clasico",
-        "magical realism": "realismo_magico"
-    }
-    categorias = sorted(set(mapeo_categorias.values()))
-    return dict(categorias=categorias)
+    return dict(categorias=CATEGORIAS)
     
 # Decorador para restringir acceso por roles
 def roles_requeridos(*roles):
@@ -110,64 +103,12 @@ def roles_requeridos(*roles):
         return decorated_function
     return decorator
 
-# Acción antes de cada petición para actualizar reservas vencidas
-@main.before_app_request
-def actualizar_reservas_vencidas():
-    """
-    Marca reservas vencidas y libera los libros reservados.
-    Solo aplica para administradores y bibliotecarios.
-    """
-    if not current_user.is_authenticated:
-        return
-    if current_user.rol not in ['administrador', 'bibliotecario']:
-        return
-
-    hoy = date.today()
-    reservas_vencidas = Reserva.query.filter(
-        Reserva.estado == 'activa',
-        Reserva.fecha_expiracion < hoy
-    ).all()
-
-    for reserva in reservas_vencidas:
-        reserva.estado = 'vencida'
-        if reserva.libro:
-            reserva.libro.cantidad_disponible += 1
-            reserva.libro.actualizar_estado()
-
-    if reservas_vencidas:
-        try:
-            db.session.commit()
-            logging.info(f"{len(reservas_vencidas)} reservas vencidas actualizadas.")
-        except Exception as e:
-            db.session.rollback()
-            logging.error(f"Error actualizando reservas vencidas: {e}")
-# Acción antes de cada petición para marcar préstamos atrasados
-@main.before_app_request
-def marcar_prestamos_atrasados():
-    """
-    Cambia el estado de préstamos vencidos a 'atrasado'.
-    """
-    hoy = date.today()
-    prestamos = Prestamo.query.filter(
-        Prestamo.estado == 'activo',
-        Prestamo.fecha_devolucion_esperada < hoy
-    ).all()
-    for prestamo in prestamos:
-        prestamo.estado = 'atrasado'
-
-    if prestamos:
-        try:
-            db.session.commit()
-            logging.info(f"{len(prestamos)} préstamos marcados como atrasados.")
-        except Exception as e:
-            db.session.rollback()
-            logging.error(f"Error marcando préstamos atrasados: {e}")
 # Página principal del catálogo público
 @main.route('/')
 @nocache
+@solo_lectura
 def index():
-    page = request.args.get('page', 1, type=int)
-    libros = obtener_catalogo(page)
+    libros = obtener_catalogo(request.args.get('cursor'))
     rol = current_user.rol if current_user.is_authenticated else None
 
     return render_template('index.html', libros=libros, rol=rol)
@@ -295,8 +236,8 @@ def lista_usuarios():
     """
     Muestra todos los usuarios registrados.
     """
-    usuarios = Usuario.query.all()
-    return render_template('usuarios.html', usuarios=usuarios)
+    pagina = paginar_admin(Usuario.query, Usuario)
+    return render_template('usuarios.html', usuarios=pagina.items, pagina=pagina)
 
 # Activar/desactivar usuario
 @main.route('/usuarios/<int:usuario_id>/toggle', methods=['POST'])
@@ -378,29 +319,35 @@ def admin_inicio():
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def inicio_contenido():
     """
     Devuelve estadísticas generales para mostrar en el dashboard.
     """
     try:
-        total_administradores = Usuario.query.filter_by(rol='administrador').count()
-        total_lectores = Usuario.query.filter_by(rol='lector').count()
-        total_libros = Libro.query.count()
-        total_prestamos = Prestamo.query.count() if 'Prestamo' in globals() else 0
-        total_reservas = Reserva.query.count() if 'Reserva' in globals() else 0
-
+        totales = obtener_totales()
         logging.info("Estadísticas del dashboard generadas.")
     except Exception as e:
         logging.error(f"Error obteniendo estadísticas del dashboard: {e}")
-        total_administradores = total_lectores = total_libros = total_prestamos = total_reservas = 0
+        totales = {}
 
     return render_template(
         'inicio.html',
-        total_administradores=total_administradores,
-        total_lectores=total_lectores,
-        total_libros=total_libros,
-        total_prestamos=total_prestamos,
-        total_reservas=total_reservas,
+        total_administradores=totales.get('total_administradores', 0),
+        total_lectores=totales.get('total_lectores', 0),
+        total_libros=totales.get('total_libros', 0),
+        total_prestamos=totales.get('total_prestamos', 0),
+        total_reservas=totales.get('total_reservas', 0),
+    )
+# Métricas de peticiones en formato Prometheus (solo administradores)
+@main.route('/metrics')
+@login_required
+@roles_requeridos('administrador')
+@nocache
+def metrics():
+    return current_app.response_class(
+        metricas.registro.exportar(),
+        mimetype='text/plain; version=0.0.4'
     )
 # API para obtener metadatos de un libro por ISBN usando OpenLibrary
 @main.route('/api/datos_libro/<isbn>')
@@ -416,24 +363,16 @@ def api_datos_libro(isbn):
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def dashboard_data():
     """
     Devuelve totales para widgets de dashboard.
     """
     try:
-        total_reportes = HistorialReporte.query.count()
+        data = obtener_totales()
     except Exception as e:
-        logging.error(f"Error obteniendo reportes del dashboard: {e}")
-        total_reportes = 0
-
-    data = {
-        'total_administradores': Usuario.query.filter_by(rol='administrador').count(),
-        'total_lectores': Usuario.query.filter_by(rol='lector').count(),
-        'total_libros': Libro.query.count(),
-        'total_prestamos': Prestamo.query.count() if 'Prestamo' in globals() else 0,
-        'total_reservas': Reserva.query.count() if 'Reserva' in globals() else 0,
-        'total_reportes': total_reportes,
-    }
+        logging.error(f"Error obteniendo estadísticas del dashboard: {e}")
+        data = {}
 
     logging.info("Datos del dashboard API generados.")
     return jsonify(data)
@@ -446,9 +385,9 @@ def mostrar_usuarios():
     """
     Lista usuarios activos en el sistema.
     """
-    usuarios = Usuario.query.filter(Usuario.activo != 0).all()
-    logging.info(f"{len(usuarios)} usuarios activos mostrados.")
-    return render_template('usuarios_mostrar.html', usuarios=usuarios)
+    pagina = paginar_admin(Usuario.query.filter(Usuario.activo != 0), Usuario)
+    logging.info(f"{len(pagina.items)} usuarios activos mostrados.")
+    return render_template('usuarios_mostrar.html', usuarios=pagina.items, pagina=pagina)
 # Formulario parcial para editar usuario
 @main.route('/admin/usuarios/editar_formulario/<int:id>')
 @login_required
@@ -595,18 +534,7 @@ def nuevo_libro():
             form.descripcion.data = data.get('descripcion', '')
             form.categoria.data = data.get('categoria', '')
 
-            raw_date = data.get('fecha_publicacion', '')
-            if raw_date:
-                try:
-                    if len(raw_date) == 4 and raw_date.isdigit():
-                        raw_date = f"{raw_date}-01-01"
-                    elif len(raw_date) == 7:
-                        raw_date = f"{raw_date}-01"
-                    form.fecha_publicacion.data = datetime.strptime(raw_date, '%Y-%m-%d').date()
-                except ValueError:
-                    form.fecha_publicacion.data = None
-            else:
-                form.fecha_publicacion.data = None
+            form.fecha_publicacion.data = parsear_fecha_publicacion(data.get('fecha_publicacion'))
 
             form.portada_url.data = data.get('portada_url')
         else:
@@ -614,7 +542,7 @@ def nuevo_libro():
             return redirect(url_for('main.nuevo_libro'))
 
     if form.validate_on_submit():
-        isbn = form.isbn.data
+        isbn = normalizar_isbn(form.isbn.data)  # Se guarda sin guiones: los duplicados se buscan por igualdad
         if Libro.query.filter_by(isbn=isbn).first():
             session['mensaje'] = 'Ya existe un libro con ese ISBN.'
             return redirect(url_for('main.nuevo_libro'))
@@ -673,9 +601,9 @@ def nuevo_libro():
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def mostrar_libros():
-    libros = Libro.query.filter(Libro.estado != 'eliminado').all()
-    logging.info(f"Mostrando {len(libros)} libros.")
-    return render_template('libros_tabla.html', libros=libros)
+    pagina = paginar_admin(Libro.query.filter(Libro.estado != 'eliminado'), Libro)
+    logging.info(f"Mostrando {len(pagina.items)} libros.")
+    return render_template('libros_tabla.html', libros=pagina.items, pagina=pagina)
 # Eliminar libro
 @main.route('/admin/libros/eliminar/<int:libro_id>', methods=['POST'])
 @login_required
@@ -772,6 +700,48 @@ def editar_libro(libro_id):
 @nocache
 def escanear_libro():
     return render_template('escanear_libro.html')
+# Importar libros por lista de ISBN
+@main.route('/admin/libros/importar', methods=['GET', 'POST'])
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+@nocache
+def importar_libros():
+    form = ImportarLibrosForm()
+
+    if form.validate_on_submit():
+        lineas = []
+        if form.archivo.data:
+            lineas = form.archivo.data.read().decode('utf-8-sig', errors='replace').splitlines()
+        if form.isbns.data:
+            lineas += form.isbns.data.splitlines()
+
+        isbns, invalidos, repetidos = leer_isbns(lineas)
+        if not isbns:
+            return jsonify({"success": False, "mensaje": "No se encontraron ISBN válidos.", "invalidos": invalidos})
+
+        trabajo_id = iniciar_importacion(current_app._get_current_object(), isbns, invalidos, form.cantidad.data)
+        logging.info(f"Importación {trabajo_id} iniciada con {len(isbns)} ISBN por {current_user.correo}.")
+        return jsonify({
+            "success": True,
+            "total": len(isbns),
+            "repetidos": repetidos,
+            "estado_url": url_for('main.estado_importacion_libros', trabajo_id=trabajo_id)
+        })
+
+    if request.method == 'POST':
+        return jsonify({"success": False, "mensaje": "Errores de validación.", "errores": form.errors})
+
+    return render_template('importar_libros.html', form=form)
+# Progreso de una importación
+@main.route('/admin/libros/importar/<trabajo_id>')
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+@nocache
+def estado_importacion_libros(trabajo_id):
+    estado = estado_importacion(trabajo_id)
+    if estado is None:
+        return jsonify({"success": False, "mensaje": "Importación no encontrada."}), 404
+    return jsonify({"success": True, **estado})
 # Nueva reserva
 @main.route('/admin/reservas/nuevo', methods=['GET', 'POST'])
 @login_required
@@ -878,15 +848,12 @@ def reservar_libro_lector(libro_id):
 
         try:
             db.session.add(nueva_reserva)
-            db.session.commit()
 
-            # Envía correo de confirmación
-            msg = Message(
+            # Correo de confirmación, guardado en la misma transacción
+            encolar_correo(
                 'Reserva registrada - Biblioteca',
-                sender='noreply@biblioteca.com',
-                recipients=[current_user.correo]
-            )
-            msg.body = f'''
+                current_user.correo,
+                f'''
 Hola {current_user.nombre},
 
 Tu reserva para "{libro.titulo}" ha sido registrada.
@@ -895,7 +862,8 @@ Estado: {nueva_reserva.estado.capitalize()}
 
 Te notificaremos cualquier cambio.
 '''
-            mail.send(msg)
+            )
+            db.session.commit()
 
             logging.info(f"Reserva creada: Libro {libro.id}, Usuario {current_user.id}, Estado {nueva_reserva.estado}")
             flash(mensaje_estado, 'success')
@@ -940,20 +908,18 @@ def cancelar_reserva_lector(reserva_id):
             for idx, r in enumerate(reservas_pendientes, start=1):
                 r.posicion = idx
 
-        db.session.commit()
-        logging.info(f"Reserva {reserva.id} cancelada por Usuario {current_user.id}")
-
-        msg = Message(
+        encolar_correo(
             'Reserva Cancelada',
-            sender='noreply@biblioteca.com',
-            recipients=[current_user.correo]
-        )
-        msg.body = f'''
+            current_user.correo,
+            f'''
 Hola {current_user.nombre},
 
 Tu reserva para "{libro.titulo}" ha sido cancelada correctamente.
 '''
-        mail.send(msg)
+        )
+
+        db.session.commit()
+        logging.info(f"Reserva {reserva.id} cancelada por Usuario {current_user.id}")
 
         flash(f'Reserva para "{libro.titulo}" cancelada.', 'success')
 
@@ -1073,15 +1039,10 @@ def nuevo_prestamo():
 
             try:
                 db.session.add(nuevo_prestamo)
-                db.session.commit()
-                logging.info(f"Préstamo creado: Usuario {usuario.id}, Libro {libro.id}")
-
-                msg = Message(
+                encolar_correo(
                     'Préstamo Registrado',
-                    sender='noreply@biblioteca.com',
-                    recipients=[usuario.correo]
-                )
-                msg.body = f'''
+                    usuario.correo,
+                    f'''
 Hola {usuario.nombre},
 
 Se ha registrado un préstamo para "{libro.titulo}".
@@ -1091,7 +1052,9 @@ Se ha registrado un préstamo para "{libro.titulo}".
 
 Por favor, devuelve el libro a tiempo.
 '''
-                mail.send(msg)
+                )
+                db.session.commit()
+                logging.info(f"Préstamo creado: Usuario {usuario.id}, Libro {libro.id}")
 
                 flash('Préstamo registrado.', 'success')
 
@@ -1143,8 +1106,8 @@ def devolver_prestamo(prestamo_id):
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def mostrar_prestamos():
-    prestamos = Prestamo.query.all()
-    return render_template('prestamos_tabla.html', prestamos=prestamos)
+    pagina = paginar_admin(Prestamo.query.options(*PRESTAMO_CON_LIBRO_Y_USUARIO), Prestamo)
+    return render_template('prestamos_tabla.html', prestamos=pagina.items, pagina=pagina)
 # Prestar reserva activa
 @main.route('/admin/reservas/prestar/<int:reserva_id>', methods=['POST'])
 @login_required
@@ -1201,27 +1164,86 @@ def prestar_reserva(reserva_id):
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def reservas_tabla():
-    reservas = Reserva.query.filter(Reserva.estado != 'eliminada').all()
-    return render_template('reservas_tabla.html', reservas=reservas)
+    pagina = paginar_admin(
+        Reserva.query.options(*RESERVA_CON_LIBRO_Y_USUARIO).filter(Reserva.estado != 'eliminada'),
+        Reserva
+    )
+    return render_template('reservas_tabla.html', reservas=pagina.items, pagina=pagina)
+
+# Generar, registrar y enviar un reporte PDF
+def _descargar_reporte(tipo, vista_origen):
+    """
+    Obtiene el reporte en static/archivos (reutiliza el último si los datos
+    no cambiaron), registra el historial y lo envía desde el archivo (sin
+    copiar el PDF a memoria).
+    """
+    reporte = REPORTES[tipo]
+
+    try:
+        archivo = obtener_reporte(tipo)
+    except Exception as e:
+        logging.error(f"Error generando reporte {tipo}: {e}")
+        flash(f"Error generando PDF de {reporte.nombre.lower()}.", "danger")
+        return redirect(url_for(vista_origen))
+
+    # Validación: si no hay datos, cancela
+    if archivo.nombre is None:
+        flash(f"No hay datos de {reporte.nombre.lower()} para generar el reporte.", "warning")
+        return redirect(url_for(vista_origen))
 
+    try:
+        registrar_historial(tipo, archivo, current_user.id)
+        db.session.commit()
+        logging.info(f"[Historial] Reporte {tipo} guardado: {archivo.nombre}")
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error guardando historial {tipo}: {e}")
+        flash('Error al guardar historial del reporte.', 'danger')
+
+    origen = almacen_reportes.abrir(archivo.nombre)
+    if origen is None:
+        flash(f"Error generando PDF de {reporte.nombre.lower()}.", "danger")
+        return redirect(url_for(vista_origen))
+    return send_file(origen, mimetype='application/pdf', as_attachment=True, download_name=archivo.nombre)
 #  Historial reportes
 @main.route('/admin/reportes/historial')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def historial_reportes():
-    historial = HistorialReporte.query.order_by(
-        HistorialReporte.fecha_generacion.desc()
-    ).all()
-    return render_template('reportes/historial_reportes.html', historial=historial)
+    pagina = paginar_admin(HistorialReporte.query.options(*HISTORIAL_CON_ADMIN), HistorialReporte, descendente=True)
+    return render_template('reportes/historial_reportes.html', historial=pagina.items, pagina=pagina)
+
+# Ver o descargar el archivo de un reporte del historial
+@main.route('/admin/reportes/historial/<int:historial_id>/archivo')
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+@nocache
+def archivo_historial_reporte(historial_id):
+    """
+    Sirve el PDF aunque esté comprimido en disco. Con ?descargar=1 se envía
+    como adjunto; si la limpieza ya lo borró, vuelve al historial.
+    """
+    historial = HistorialReporte.query.get_or_404(historial_id)
+    origen = almacen_reportes.abrir(historial.ruta_archivo) if historial.estado != 'expirado' else None
+    if origen is None:
+        flash('El archivo de este reporte ya no está disponible.', 'warning')
+        return redirect(url_for('main.historial_reportes'))
+    return send_file(
+        origen, mimetype='application/pdf',
+        as_attachment=bool(request.args.get('descargar')),
+        download_name=os.path.basename(historial.ruta_archivo)
+    )
 
 #  Fragmento atrasados
 @main.route('/admin/reportes/atrasados')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def reporte_libros_atrasados():
-    atrasados = Prestamo.query.filter(
+    atrasados = Prestamo.query.options(*PRESTAMO_CON_LIBRO_Y_USUARIO).filter(
         Prestamo.fecha_devolucion_esperada < date.today(),
         Prestamo.fecha_devolucion.is_(None)
     ).all()
@@ -1236,62 +1258,19 @@ def descargar_reporte_atrasados():
     Genera y descarga un PDF de libros atrasados.
     Registra historial solo en descargas reales.
     """
-    atrasados = Prestamo.query.filter(
-        Prestamo.fecha_devolucion_esperada < date.today(),
-        Prestamo.fecha_devolucion.is_(None)
-    ).all()
-
-    datos = []
-    for idx, p in enumerate(atrasados, start=1):
-        datos.append([
-            idx,
-            p.libro.titulo,
-            p.usuario.correo,
-            p.fecha_devolucion_esperada.strftime('%Y-%m-%d')
-        ])
-
-    columnas = ["#", "Libro", "Correo", "Fecha Vencida"]
-
-    pdf = generar_reporte_con_plantilla(datos, columnas, "Reporte de Libros Atrasados")
-    nombre_archivo = f"reporte_atrasados_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.pdf"
-    ruta_carpeta = os.path.join(current_app.root_path, 'static', 'archivos')
-    os.makedirs(ruta_carpeta, exist_ok=True)
-    ruta_archivo = os.path.join(ruta_carpeta, nombre_archivo)
-
-    try:
-        with open(ruta_archivo, 'wb') as f:
-            f.write(pdf)
-
-        historial = HistorialReporte(
-            nombre_reporte="Libros Atrasados",
-            ruta_archivo=f'archivos/{nombre_archivo}',
-            admin_id=current_user.id
-        )
-        db.session.add(historial)
-        db.session.commit()
-        logging.info(f"[Historial] Reporte atrasados guardado: {nombre_archivo}")
-
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"Error guardando historial atrasados: {e}")
-        flash('Error al guardar historial del reporte.', 'danger')
-
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename={nombre_archivo}'
-    return response
-
+    return _descargar_reporte('atrasados', 'main.reporte_libros_atrasados')
 
 #  Reportes prestados
 @main.route('/admin/reportes/prestados')
 @login_required
 @roles_requeridos('administrador','bibliotecario')
 @nocache
+@solo_lectura
 def reporte_libros_prestamos():
     """
     Fragmento de tabla de todos los préstamos (devueltos y activos).
     """
-    prestamos = Prestamo.query.all()
+    prestamos = Prestamo.query.options(*PRESTAMO_CON_LIBRO_Y_USUARIO).all()
     return render_template('reportes/fragmento_prestados.html', prestamos=prestamos)
 
 @main.route('/admin/reportes/descargar_reporte_prestados')
@@ -1303,76 +1282,16 @@ def descargar_reporte_prestados():
     Genera y descarga un PDF de libros prestados.
     Registra historial solo en descargas reales.
     """
-    prestamos = Prestamo.query.all()
-    datos = []
-    for idx, p in enumerate(prestamos, start=1):
-        fecha_dev = p.fecha_devolucion.strftime('%Y-%m-%d') if p.fecha_devolucion else "No devuelto"
-        datos.append([
-            idx,
-            p.libro.titulo,
-            p.usuario.correo,
-            p.fecha_prestamo.strftime('%Y-%m-%d'),
-            fecha_dev
-        ])
-
-    columnas = ["#", "Libro", "Correo", "Fecha Préstamo", "Fecha Devolución"]
-
-    pdf = generar_reporte_con_plantilla(datos, columnas, "Reporte de Libros Prestados")
-    nombre_archivo = f"reporte_prestados_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.pdf"
-    ruta_carpeta = os.path.join(current_app.root_path, 'static', 'archivos')
-    os.makedirs(ruta_carpeta, exist_ok=True)
-    ruta_archivo = os.path.join(ruta_carpeta, nombre_archivo)
-
-    try:
-        with open(ruta_archivo, 'wb') as f:
-            f.write(pdf)
-
-        historial = HistorialReporte(
-            nombre_reporte="Libros Prestados",
-            ruta_archivo=f'archivos/{nombre_archivo}',
-            admin_id=current_user.id
-        )
-        db.session.add(historial)
-        db.session.commit()
-        logging.info(f"[Historial] Reporte prestados guardado: {nombre_archivo}")
-
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"Error guardando historial prestados: {e}")
-        flash('Error al guardar historial del reporte.', 'danger')
-
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename={nombre_archivo}'
-    return response
+    return _descargar_reporte('prestados', 'main.reporte_libros_prestamos')
 
 # Reporte populares
 @main.route('/admin/reportes/populares')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def reporte_libros_populares():
-    prestamos_subq = db.session.query(
-        Prestamo.libro_id,
-        func.count(Prestamo.id).label('prestamos')
-    ).group_by(Prestamo.libro_id).subquery()
-
-    reservas_subq = db.session.query(
-        Reserva.libro_id,
-        func.count(Reserva.id).label('reservas')
-    ).filter(Reserva.estado == 'pendiente').group_by(Reserva.libro_id).subquery()
-
-    populares = db.session.query(
-        Libro.id,
-        Libro.titulo,
-        Libro.autor,
-        func.coalesce(prestamos_subq.c.prestamos, 0).label('prestamos'),
-        func.coalesce(reservas_subq.c.reservas, 0).label('reservas'),
-        (func.coalesce(prestamos_subq.c.prestamos, 0) + func.coalesce(reservas_subq.c.reservas, 0)).label('total')
-    ).outerjoin(prestamos_subq, prestamos_subq.c.libro_id == Libro.id) \
-     .outerjoin(reservas_subq, reservas_subq.c.libro_id == Libro.id) \
-     .order_by(db.desc('total')).limit(5).all()
-
+    populares = consulta_populares().all()
     return render_template('reportes/fragmento_populares.html', populares=populares)
     
 @main.route('/admin/reportes/descargar_reporte_populares')
@@ -1384,80 +1303,66 @@ def descargar_reporte_populares():
     Genera y descarga un PDF del ranking top 5 de libros más populares.
     Registra historial solo en descargas reales.
     """
-
-    prestamos_subq = db.session.query(
-        Prestamo.libro_id,
-        func.count(Prestamo.id).label('prestamos')
-    ).group_by(Prestamo.libro_id).subquery()
-
-    reservas_subq = db.session.query(
-        Reserva.libro_id,
-        func.count(Reserva.id).label('reservas')
-    ).filter(Reserva.estado == 'pendiente').group_by(Reserva.libro_id).subquery()
-
-    populares = db.session.query(
-        Libro.titulo,
-        Libro.autor,
-        func.coalesce(prestamos_subq.c.prestamos, 0).label('prestamos'),
-        func.coalesce(reservas_subq.c.reservas, 0).label('reservas'),
-        (func.coalesce(prestamos_subq.c.prestamos, 0) + func.coalesce(reservas_subq.c.reservas, 0)).label('total')
-    ).outerjoin(prestamos_subq, prestamos_subq.c.libro_id == Libro.id) \
-     .outerjoin(reservas_subq, reservas_subq.c.libro_id == Libro.id) \
-     .order_by(db.desc('total')).limit(5).all()
-
-    # Validación: si no hay datos, cancela
-    if not populares:
-        flash("No hay datos de libros populares para generar el reporte.", "warning")
-        return redirect(url_for('main.reporte_libros_populares'))
-
-    datos = []
-    for idx, p in enumerate(populares, start=1):
-        datos.append([
-            idx,
-            p.titulo,
-            p.autor,
-            p.prestamos,
-            p.reservas,
-            p.total
-        ])
-
-    columnas = ["#", "Libro", "Autor", "Préstamos", "Reservas Pendientes", "Total"]
-
-    pdf = generar_reporte_con_plantilla(datos, columnas, "Reporte de Libros Populares")
-
-    # Validación: PDF generado
-    if not pdf:
-        logging.error("No se pudo generar el PDF de populares.")
-        flash("Error generando PDF de libros populares.", "danger")
-        return redirect(url_for('main.reporte_libros_populares'))
-
-    nombre_archivo = f"reporte_populares_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.pdf"
-    ruta_carpeta = os.path.join(current_app.root_path, 'static', 'archivos')
-    os.makedirs(ruta_carpeta, exist_ok=True)
-    ruta_archivo = os.path.join(ruta_carpeta, nombre_archivo)
-
-    try:
-        with open(ruta_archivo, 'wb') as f:
-            f.write(pdf)
-
-        historial = HistorialReporte(
-            nombre_reporte="Libros Populares",
-            ruta_archivo=f'archivos/{nombre_archivo}',
-            admin_id=current_user.id
-        )
-        db.session.add(historial)
-        db.session.commit()
-        logging.info(f"[Historial] Reporte populares guardado: {nombre_archivo}")
-
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"Error guardando historial populares: {e}")
-        flash('Error al guardar historial del reporte de populares.', 'danger')
-
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename={nombre_archivo}'
-    return response
+    return _descargar_reporte('populares', 'main.reporte_libros_populares')
+# Encolar un reporte en segundo plano
+@main.route('/admin/reportes/jobs', methods=['POST'])
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+@nocache
+def crear_trabajo_reporte():
+    """
+    Encola la generación del PDF y responde enseguida con el id del trabajo.
+    Si ya se está generando el mismo reporte, devuelve ese trabajo.
+    """
+    datos = request.get_json(silent=True) or request.form
+    tipo = datos.get('tipo')
+    if tipo not in REPORTES:
+        return jsonify({"success": False, "mensaje": "Reporte no válido."}), 400
+
+    trabajo_id = encolar_reporte(current_app._get_current_object(), tipo, current_user.id)
+    return jsonify({
+        "success": True,
+        "trabajo": trabajo_id,
+        "estado_url": url_for('main.estado_trabajo_reporte', trabajo_id=trabajo_id)
+    }), 202
+# Estado de un reporte en segundo plano
+@main.route('/admin/reportes/jobs/<trabajo_id>')
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+@nocache
+def estado_trabajo_reporte(trabajo_id):
+    estado = estado_trabajo(trabajo_id)
+    if estado is None:
+        return jsonify({"success": False, "mensaje": "Trabajo no encontrado."}), 404
+    respuesta = {"success": True, "trabajo": trabajo_id, **estado}
+    if estado['estado'] == TERMINADO:
+        respuesta['descarga_url'] = url_for('main.descargar_trabajo_reporte', trabajo_id=trabajo_id)
+    return jsonify(respuesta)
+# Descargar el PDF de un trabajo terminado
+@main.route('/admin/reportes/jobs/<trabajo_id>/descargar')
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+@nocache
+def descargar_trabajo_reporte(trabajo_id):
+    estado = estado_trabajo(trabajo_id)
+    if not estado or estado['estado'] != TERMINADO:
+        abort(404)
+    origen = almacen_reportes.abrir(estado['archivo'])
+    if origen is None:
+        abort(404)
+
+    # Cada descarga queda en el historial a nombre de quien la pide, aunque se
+    # haya unido al trabajo de otro. Las peticiones parciales (Range) no cuentan.
+    if request.range is None:
+        try:
+            archivo = ArchivoReporte(estado['archivo'], estado['filas'], estado.get('reutilizado', False),
+                                     estado.get('hash_contenido'))
+            registrar_historial(estado['tipo'], archivo, current_user.id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error guardando historial {estado['tipo']}: {e}")
+    return send_file(origen, mimetype='application/pdf', as_attachment=True, download_name=estado['archivo'])
 # RUTA: Configuración admin
 @main.route('/admin/configuracion', methods=['GET', 'POST'])
 @login_required
@@ -1515,9 +1420,9 @@ def configuracion():
 @login_required
 @roles_requeridos('lector', 'administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def catalogo():
-    page = request.args.get('page', 1, type=int)
-    libros = obtener_catalogo(page)
+    libros = obtener_catalogo(request.args.get('cursor'))
 
     favoritos_ids = []
     if current_user.is_authenticated and current_user.rol == 'lector':
@@ -1529,6 +1434,7 @@ def catalogo():
 @main.route('/libro/<int:libro_id>')
 @login_required
 @nocache
+@solo_lectura
 def detalle_libro(libro_id):
     libro = Libro.query.get_or_404(libro_id)
     es_favorito = False
@@ -1589,9 +1495,9 @@ def perfil():
 @nocache
 def mis_libros():
     # Obtiene préstamos, reservas y favoritos del lector
-    mis_prestamos = Prestamo.query.filter_by(usuario_id=current_user.id).all()
-    mis_reservas = Reserva.query.filter_by(usuario_id=current_user.id).all()
-    mis_favoritos = Favorito.query.filter_by(usuario_id=current_user.id).all()
+    mis_prestamos = Prestamo.query.options(*PRESTAMO_CON_LIBRO).filter_by(usuario_id=current_user.id).all()
+    mis_reservas = Reserva.query.options(*RESERVA_CON_LIBRO).filter_by(usuario_id=current_user.id).all()
+    mis_favoritos = Favorito.query.options(*FAVORITO_CON_LIBRO).filter_by(usuario_id=current_user.id).all()
 
     return render_template(
         'mis_libros.html',
@@ -1611,19 +1517,18 @@ def recuperar():
             if usuario:
                 token = generar_token(usuario.correo)
                 link = url_for('main.restablecer', token=token, _external=True)
-                msg = Message(
+                encolar_correo(
                     'Recuperar contraseña',
-                    sender='noreply@biblioteca.com',
-                    recipients=[usuario.correo]
-                )
-                msg.body = (
-                    f'Estimado usuario,\n\n'
-                    f'Hemos recibido una solicitud para restablecer la contraseña de su cuenta.\n'
-                    f'Enlace: {link}\n\n'
-                    f'Si no solicitó el cambio, ignore este mensaje.\n'
-                    f'Atentamente,\nBiblioteca.'
+                    usuario.correo,
+                    (
+                        f'Estimado usuario,\n\n'
+                        f'Hemos recibido una solicitud para restablecer la contraseña de su cuenta.\n'
+                        f'Enlace: {link}\n\n'
+                        f'Si no solicitó el cambio, ignore este mensaje.\n'
+                        f'Atentamente,\nBiblioteca.'
+                    )
                 )
-                mail.send(msg)
+                db.session.commit()
                 logging.info(f"Token de recuperación enviado a {usuario.correo}")
                 flash('Te enviamos un correo para recuperar tu contraseña.', 'info')
             else:
@@ -1666,51 +1571,45 @@ def restablecer(token):
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def usuarios_modal():
-    usuarios = Usuario.query.all()
-    return render_template('usuarios_mostrar.html', usuarios=usuarios)
+    pagina = paginar_admin(Usuario.query, Usuario)
+    return render_template('usuarios_mostrar.html', usuarios=pagina.items, pagina=pagina)
 #  RUTA: API préstamos por mes
 @main.route('/api/prestamos_mes')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def prestamos_por_mes():
-    resultados = db.session.query(
-        extract('month', Prestamo.fecha_prestamo).label('mes'),
-        func.count().label('total')
-    ).group_by('mes').order_by('mes').all()
-
-    meses = ["Ene", "Feb", "Mar", "Abr", "May", "Jun",
-             "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
-
-    return jsonify([
-        {'mes': meses[int(r.mes) - 1], 'total': r.total}
-        for r in resultados
-    ])
+    return jsonify(tablero.datos_prestamos_mes())
 #  RUTA: API libros más prestados
 @main.route('/api/libros_populares')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def libros_populares():
-    resultados = db.session.query(
-        Libro.titulo,
-        func.count(Prestamo.id).label('total')
-    ).join(Prestamo).group_by(Libro.id).order_by(func.count(Prestamo.id).desc()).limit(5).all()
-
-    return jsonify([{'titulo': r.titulo, 'total': r.total} for r in resultados])
+    return jsonify(tablero.datos_libros_populares())
 #  RUTA: API libros atrasados
 @main.route('/api/libros_atrasados')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
+@solo_lectura
 def libros_atrasados():
-    resultados = db.session.query(
-        Libro.titulo,
-        func.count(Prestamo.id).label('total')
-    ).join(Prestamo).filter(Prestamo.estado == 'atrasado') \
-     .group_by(Libro.id).order_by(func.count(Prestamo.id).desc()).limit(5).all()
-
-    return jsonify([{'titulo': r.titulo, 'total': r.total} for r in resultados])
+    return jsonify(tablero.datos_libros_atrasados())
+#  RUTA: Stream de cambios del dashboard (Server-Sent Events)
+@main.route('/api/dashboard_stream')
+@login_required
+@roles_requeridos('administrador', 'bibliotecario')
+def dashboard_stream():
+    app = current_app._get_current_object()
+    response = current_app.response_class(
+        tablero.eventos(app, app.config['TABLERO_LATIDO'], app.config['TABLERO_DURACION_MAX']),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 #  RUTA: Buscar usuario por llave (AJAX)
 @main.route('/ajax/buscar_usuario_por_llave')
 @login_required
@@ -1737,56 +1636,67 @@ def mostrar_usuarios_sencillo():
     filtro = request.args.get('filtro')
 
     if filtro == 'administradores':
-        usuarios = Usuario.query.filter(
+        consulta = Usuario.query.filter(
             or_(Usuario.rol == 'administrador', Usuario.rol == 'bibliotecario')
-        ).all()
+        )
     elif filtro == 'lectores':
-        usuarios = Usuario.query.filter_by(rol='lector').all()
+        consulta = Usuario.query.filter_by(rol='lector')
     else:
-        usuarios = Usuario.query.all()
+        consulta = Usuario.query
 
-    return render_template('usuarios_mostrar_sencillo.html', usuarios=usuarios)
+    pagina = paginar_admin(consulta, Usuario)
+    return render_template('usuarios_mostrar_sencillo.html', usuarios=pagina.items, pagina=pagina)
 
 @main.route('/admin/libros/solo_mostrar')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def mostrar_libros_sencillo():
-    libros = Libro.query.filter(Libro.estado != 'eliminado').all()
-    return render_template('libros_tabla_sencillo.html', libros=libros)
+    pagina = paginar_admin(Libro.query.filter(Libro.estado != 'eliminado'), Libro)
+    return render_template('libros_tabla_sencillo.html', libros=pagina.items, pagina=pagina)
 
 @main.route('/admin/prestamos/solo_mostrar')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def mostrar_prestamos_sencillo():
-    prestamos = Prestamo.query.all()
-    return render_template('prestamos_tabla_sencillo.html', prestamos=prestamos)
+    pagina = paginar_admin(Prestamo.query.options(*PRESTAMO_CON_LIBRO_Y_USUARIO), Prestamo)
+    return render_template('prestamos_tabla_sencillo.html', prestamos=pagina.items, pagina=pagina)
 
 @main.route('/admin/reservas/solo_mostrar')
 @login_required
 @roles_requeridos('administrador', 'bibliotecario')
 @nocache
 def mostrar_reservas_sencillo():
-    reservas = Reserva.query.all()
-    return render_template('reservas_tabla_sencillo.html', reservas=reservas)
+    pagina = paginar_admin(Reserva.query.options(*RESERVA_CON_LIBRO_Y_USUARIO), Reserva)
+    return render_template('reservas_tabla_sencillo.html', reservas=pagina.items, pagina=pagina)
 #  RUTA: Buscador global
 @main.route('/buscar', methods=['GET'])
+@solo_lectura
 def buscar():
     consulta = request.args.get('q', '').strip()
-    resultados = []
-
-    if consulta:
-        resultados = Libro.query.filter(
-            Libro.titulo.ilike(f'%{consulta}%')
-        ).all()
+    page = request.args.get('page', 1, type=int)
+    resultados = buscar_libros(consulta, pagina=page)
 
     return render_template('resultado_busqueda.html', resultados=resultados, consulta=consulta)
+#  RUTA: API sugerencias de búsqueda (autocompletado)
+@main.route('/api/sugerencias')
+@solo_lectura
+def api_sugerencias():
+    consulta = request.args.get('q', '').strip()
+    limite = request.args.get('n', 8, type=int)
+    if not consulta:
+        return jsonify([])
+    return jsonify(obtener_sugerencias(consulta, limite))
 #  RUTA: Filtrar por categoría
 @main.route('/categoria/<categoria>')
+@solo_lectura
 def categoria(categoria):
-    libros = Libro.query.filter_by(categoria=categoria).all()
-    return render_template('categoria.html', libros=libros, categoria=categoria)
+    pagina = paginar_por_cursor(
+        Libro.query.filter_by(categoria=categoria), Libro.id,
+        cursor=request.args.get('cursor')
+    )
+    return render_template('categoria.html', libros=pagina.items, pagina=pagina, categoria=categoria)
 
 @main.route('/favoritos/toggle/<int:libro_id>', methods=['POST'])
 @login_required
@@ -0,0 +1,153 @@
+# app/sugerencias.py
+import bisect
+import logging
+import threading
+from array import array
+from app.extensions import db
+from app.models import Libro
+from app.busqueda import tokenizar, registrar_indice, sincronizar_indices
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Sugerencias de búsqueda (autocompletado)
+# ======================================================
+# Índice de prefijos sobre arreglos paralelos ordenados:
+#   _claves  -> texto normalizado ('cien anos de soledad', 'garcia marquez', ...)
+#   _ids     -> libro al que pertenece cada clave
+#   _tipos   -> qué campo originó la clave
+# Un prefijo se resuelve con dos bisect sobre _claves, sin nodos por letra.
+# Se mantiene con los hooks de app.busqueda: un préstamo o devolución (solo
+# stock y estado) no lo toca ni obliga a los demás workers a reordenarlo.
+
+TITULO, AUTOR, ISBN = 0, 1, 2
+NOMBRES_TIPO = {TITULO: 'titulo', AUTOR: 'autor', ISBN: 'isbn'}
+
+MAX_SUGERENCIAS = 20
+PALABRAS_TITULO = 6  # También se sugiere desde las primeras palabras internas del título
+
+
+def _claves_libro(campos):
+    """ Devuelve las claves (tipo, texto) con que se indexa un libro. """
+    claves = []
+    palabras = tokenizar(campos.get('titulo'))
+    for i in range(min(len(palabras), PALABRAS_TITULO)):
+        claves.append((TITULO, ' '.join(palabras[i:])))
+    for autor in (campos.get('autor') or '').split(','):
+        autor = ' '.join(tokenizar(autor))
+        if autor:
+            claves.append((AUTOR, autor))
+    isbn = ''.join(tokenizar(campos.get('isbn')))
+    if isbn:
+        claves.append((ISBN, isbn))
+    return claves
+
+
+class IndicePrefijos:
+
+    def __init__(self):
+        self._claves = []
+        self._ids = array('l')
+        self._tipos = bytearray()
+        self._etiquetas = {}  # libro_id -> (titulo, autor, isbn)
+        self._candado = threading.RLock()
+        self.construido = False
+
+    def __len__(self):
+        return len(self._etiquetas)
+
+    def construir(self, filas):
+        """ Reconstruye el índice desde filas (id, titulo, autor, isbn). """
+        entradas = []
+        etiquetas = {}
+        for libro_id, titulo, autor, isbn in filas:
+            campos = {'titulo': titulo, 'autor': autor, 'isbn': isbn}
+            etiquetas[libro_id] = (titulo, autor, isbn)
+            entradas.extend((clave, libro_id, tipo) for tipo, clave in _claves_libro(campos))
+        entradas.sort()
+        with self._candado:
+            self._claves = [e[0] for e in entradas]
+            self._ids = array('l', (e[1] for e in entradas))
+            self._tipos = bytearray(e[2] for e in entradas)
+            self._etiquetas = etiquetas
+            self.construido = True
+
+    def agregar(self, libro_id, campos):
+        with self._candado:
+            self._eliminar(libro_id)
+            for tipo, clave in _claves_libro(campos):
+                pos = bisect.bisect_right(self._claves, clave)
+                self._claves.insert(pos, clave)
+                self._ids.insert(pos, libro_id)
+                self._tipos.insert(pos, tipo)
+            self._etiquetas[libro_id] = (campos.get('titulo'), campos.get('autor'), campos.get('isbn'))
+
+    def eliminar(self, libro_id):
+        with self._candado:
+            self._eliminar(libro_id)
+
+    def _eliminar(self, libro_id):
+        etiqueta = self._etiquetas.pop(libro_id, None)
+        if etiqueta is None:
+            return
+        campos = dict(zip(('titulo', 'autor', 'isbn'), etiqueta))
+        for clave in {c for _, c in _claves_libro(campos)}:
+            pos = bisect.bisect_left(self._claves, clave)
+            while pos < len(self._claves) and self._claves[pos] == clave:
+                if self._ids[pos] == libro_id:
+                    self._quitar(pos)
+                else:
+                    pos += 1
+
+    def _quitar(self, pos):
+        del self._claves[pos]
+        del self._ids[pos]
+        del self._tipos[pos]
+
+    def sugerir(self, prefijo, limite=8):
+        """ Devuelve hasta `limite` sugerencias cuya clave empieza por `prefijo`. """
+        prefijo = ' '.join(tokenizar(prefijo)) if prefijo.strip() else ''
+        if not prefijo:
+            return []
+        with self._candado:
+            inicio = bisect.bisect_left(self._claves, prefijo)
+            fin = bisect.bisect_left(self._claves, prefijo + '\uffff', inicio)
+            vistos = set()
+            sugerencias = []
+            for pos in range(inicio, fin):
+                libro_id = self._ids[pos]
+                if libro_id in vistos:
+                    continue
+                vistos.add(libro_id)
+                titulo, autor, _ = self._etiquetas[libro_id]
+                sugerencias.append({
+                    'id': libro_id,
+                    'titulo': titulo,
+                    'autor': autor,
+                    'coincidencia': NOMBRES_TIPO[self._tipos[pos]],
+                })
+                if len(sugerencias) >= limite:
+                    break
+        return sugerencias
+
+
+indice = IndicePrefijos()
+registrar_indice(indice)
+
+
+def _asegurar_indice():
+    sincronizar_indices()
+    if indice.construido:
+        return
+    filas = db.session.query(
+        Libro.id, Libro.titulo, Libro.autor, Libro.isbn
+    ).filter(Libro.estado != 'eliminado').yield_per(5000)
+    indice.construir(filas)
+    logger.info(f"[Sugerencias] Índice de prefijos construido con {len(indice)} libros.")
+
+
+def obtener_sugerencias(consulta, limite=8):
+    limite = max(1, min(limite, MAX_SUGERENCIAS))
+    _asegurar_indice()
+    return indice.sugerir(consulta, limite)
@@ -0,0 +1,202 @@
+# app/tablero.py
+import json
+import queue
+import logging
+import threading
+from time import monotonic
+from sqlalchemy import extract, func
+from app.extensions import db
+from app.models import Libro, Prestamo
+from app.estadisticas import obtener_totales
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MESES = ["Ene", "Feb", "Mar", "Abr", "May", "Jun",
+         "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+
+# Eventos pendientes por suscriptor; si un cliente no los consume se le desconecta
+MAX_PENDIENTES = 20
+# Marca en la cola de un cliente desconectado: su stream termina y el navegador reconecta
+FIN = None
+
+
+# ======================================================
+# Datos de los gráficos del dashboard
+# ======================================================
+
+def datos_prestamos_mes():
+    resultados = db.session.query(
+        extract('month', Prestamo.fecha_prestamo).label('mes'),
+        func.count().label('total')
+    ).group_by('mes').order_by('mes').all()
+    return [{'mes': MESES[int(r.mes) - 1], 'total': r.total} for r in resultados]
+
+
+def datos_libros_populares():
+    resultados = db.session.query(
+        Libro.titulo,
+        func.count(Prestamo.id).label('total')
+    ).join(Prestamo).group_by(Libro.id).order_by(func.count(Prestamo.id).desc()).limit(5).all()
+    return [{'titulo': r.titulo, 'total': r.total} for r in resultados]
+
+
+def datos_libros_atrasados():
+    resultados = db.session.query(
+        Libro.titulo,
+        func.count(Prestamo.id).label('total')
+    ).join(Prestamo).filter(Prestamo.estado == 'atrasado') \
+     .group_by(Libro.id).order_by(func.count(Prestamo.id).desc()).limit(5).all()
+    return [{'titulo': r.titulo, 'total': r.total} for r in resultados]
+
+
+def calcular_tablero():
+    """ Estado completo del dashboard: totales y datos de los tres gráficos. """
+    return {
+        'totales': obtener_totales(),
+        'libros_populares': datos_libros_populares(),
+        'libros_atrasados': datos_libros_atrasados(),
+        'prestamos_mes': datos_prestamos_mes(),
+    }
+
+
+def calcular_cambios(anterior, actual):
+    """
+    Devuelve solo lo que cambió entre dos estados del tablero.
+    De los totales se envían únicamente los contadores modificados.
+    """
+    cambios = {}
+    for seccion, valor in actual.items():
+        previo = anterior.get(seccion)
+        if seccion == 'totales':
+            previo = previo or {}
+            totales = {k: v for k, v in valor.items() if previo.get(k) != v}
+            if totales:
+                cambios['totales'] = totales
+        elif previo != valor:
+            cambios[seccion] = valor
+    return cambios
+
+
+# ======================================================
+# Publicador de eventos (uno por worker)
+# ======================================================
+
+class PublicadorTablero:
+    """
+    Hilo que recalcula el tablero cada cierto intervalo mientras haya
+    clientes conectados y reparte solo los cambios entre todos ellos.
+    N dashboards abiertos en un worker cuestan un único cálculo.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._hilo = None
+        self._candado = threading.Lock()
+        self._hay_suscriptores = threading.Event()
+        self._detener = threading.Event()
+        self._suscriptores = set()
+        self.estado = None
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def suscribir(self, app):
+        """ Registra un cliente y devuelve su cola con el estado completo como primer evento. """
+        cola = queue.Queue(maxsize=MAX_PENDIENTES)
+        with self._candado:
+            if not self.activo:
+                self.app = app
+                self._detener.clear()
+                self._hilo = threading.Thread(
+                    target=self._ciclo, name='tablero', daemon=True
+                )
+                self._hilo.start()
+                logger.info("[Tablero] Publicador iniciado.")
+            if self.estado is not None:
+                cola.put_nowait(self.estado)
+            self._suscriptores.add(cola)
+            self._hay_suscriptores.set()
+        return cola
+
+    def desuscribir(self, cola):
+        with self._candado:
+            self._suscriptores.discard(cola)
+            if not self._suscriptores:
+                self._hay_suscriptores.clear()
+
+    def _publicar(self, cambios):
+        with self._candado:
+            for cola in list(self._suscriptores):
+                try:
+                    cola.put_nowait(cambios)
+                except queue.Full:
+                    self._suscriptores.discard(cola)
+                    self._cerrar(cola)
+                    logger.warning("[Tablero] Cliente lento desconectado.")
+
+    @staticmethod
+    def _cerrar(cola):
+        """ Descarta lo pendiente (el cliente recibirá el estado completo al reconectar) y deja FIN. """
+        try:
+            while True:
+                cola.get_nowait()
+        except queue.Empty:
+            pass
+        cola.put_nowait(FIN)
+
+    def _ciclo(self):
+        intervalo = self.app.config['TABLERO_INTERVALO']
+        while not self._detener.is_set():
+            self._hay_suscriptores.wait()
+            with self.app.app_context():
+                try:
+                    actual = calcular_tablero()
+                except Exception as e:
+                    logger.error(f"[Tablero] Error calculando el tablero: {e}")
+                    actual = None
+                finally:
+                    db.session.remove()
+
+            if actual is not None:
+                cambios = calcular_cambios(self.estado or {}, actual)
+                self.estado = actual
+                if cambios:
+                    self._publicar(cambios)
+            self._detener.wait(intervalo)
+
+    def detener(self):
+        self._detener.set()
+        self._hay_suscriptores.set()
+        if self._hilo:
+            self._hilo.join(timeout=5)
+
+
+publicador = PublicadorTablero()
+
+
+def eventos(app, latido, duracion_max=None):
+    """
+    Generador de Server-Sent Events para un cliente. Envía un comentario
+    cada `latido` segundos sin cambios para mantener viva la conexión.
+    Termina si el publicador desconecta al cliente o tras `duracion_max`
+    segundos; en ambos casos EventSource reconecta solo y recibe el estado
+    completo, y el hilo del worker queda libre mientras tanto.
+    """
+    cola = publicador.suscribir(app)
+    limite = monotonic() + duracion_max if duracion_max else None
+    try:
+        yield f"retry: {app.config['TABLERO_INTERVALO'] * 1000}\n\n"
+        while limite is None or monotonic() < limite:
+            espera = latido if limite is None else max(min(latido, limite - monotonic()), 0)
+            try:
+                cambios = cola.get(timeout=espera)
+            except queue.Empty:
+                yield ": latido\n\n"
+                continue
+            if cambios is FIN:
+                return
+            yield f"event: tablero\ndata: {json.dumps(cambios, ensure_ascii=False)}\n\n"
+    finally:
+        publicador.desuscribir(cola)
@@ -0,0 +1,222 @@
+# app/trabajos.py
+import uuid
+import atexit
+import pickle
+import logging
+import threading
+import multiprocessing
+from time import monotonic
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.extensions import db
+from app.cache import cache
+from app.reportes import REPORTES, obtener_reporte
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Trabajos de reportes en segundo plano
+# ======================================================
+# La vista solo encola el reporte y devuelve un id; el PDF se arma en un pool
+# de procesos (reportlab es CPU pura y no suelta el GIL), así el worker que
+# atendió la petición queda libre. El estado y el progreso se guardan en la
+# caché compartida para que cualquier worker responda la consulta.
+# Mientras un reporte de un tipo está pendiente o en curso, las nuevas
+# solicitudes del mismo tipo reciben ese mismo trabajo en lugar de otro.
+# La marca 'reportes:activo:<tipo>' se toma con una escritura atómica de la
+# caché, así que dos workers que reciben la misma solicitud a la vez no
+# arrancan dos trabajos. El historial no se escribe aquí sino en cada
+# descarga del PDF, a nombre de quien lo descarga: quien se une a un trabajo
+# ajeno también queda registrado.
+
+PENDIENTE, EN_CURSO, TERMINADO, ERROR = 'pendiente', 'en_curso', 'terminado', 'error'
+TTL_ESTADO = 24 * 3600      # Segundos que se conserva el estado de un trabajo
+INTERVALO_PROGRESO = 1      # Segundos mínimos entre dos escrituras del progreso
+
+INTENTOS_MARCA = 3          # Veces que se intenta tomar la marca del tipo antes de encolar sin ella
+
+_app = None                 # Aplicación con la que se ejecutan los trabajos en este proceso
+_ejecutor = None
+_candado = threading.Lock()
+
+
+def _clave_estado(trabajo_id):
+    return f'reportes:trabajo:{trabajo_id}'
+
+
+def _clave_activo(tipo):
+    return f'reportes:activo:{tipo}'
+
+
+def estado_trabajo(trabajo_id):
+    return cache.obtener(_clave_estado(trabajo_id))
+
+
+def _guardar_estado(trabajo_id, estado):
+    cache.guardar(_clave_estado(trabajo_id), estado, TTL_ESTADO)
+
+
+# ======================================================
+# Ejecución (dentro del pool)
+# ======================================================
+
+def _iniciar_proceso(ajustes):
+    """
+    Arranca cada proceso del pool con la misma configuración que el worker
+    que lo creó. create_app no toca la base, así que es barato.
+    """
+    global _app
+    from app.config import Config
+    for clave, valor in ajustes.items():
+        setattr(Config, clave, valor)
+    from myapp import create_app
+    _app = create_app()
+
+
+def _ejecutar(trabajo_id, tipo, estado):
+    """ Genera el PDF y devuelve el estado final. """
+    reporte = REPORTES[tipo]
+    ultimo = [0.0]
+
+    def avanzar(filas):
+        if monotonic() - ultimo[0] >= INTERVALO_PROGRESO:
+            ultimo[0] = monotonic()
+            _guardar_estado(trabajo_id, {**estado, 'filas': filas})
+
+    with _app.app_context():
+        try:
+            estado = {**estado, 'estado': EN_CURSO, 'inicio': datetime.utcnow().isoformat()}
+            if reporte.contar:
+                estado['total'] = reporte.contar()
+            _guardar_estado(trabajo_id, estado)
+
+            archivo = obtener_reporte(tipo, progreso=avanzar)
+            if archivo.nombre is None:
+                return {**estado, 'estado': ERROR, 'filas': 0,
+                        'error': f"No hay datos de {reporte.nombre.lower()} para generar el reporte."}
+
+            logger.info(f"[Reportes] Trabajo {trabajo_id} terminado: {archivo.nombre} ({archivo.filas} filas)")
+            return {**estado, 'estado': TERMINADO, 'filas': archivo.filas, 'archivo': archivo.nombre,
+                    'reutilizado': archivo.reutilizado, 'hash_contenido': archivo.hash_contenido,
+                    'fin': datetime.utcnow().isoformat()}
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[Reportes] Error en el trabajo {trabajo_id} ({tipo}): {e}")
+            return {**estado, 'estado': ERROR, 'error': str(e)}
+        finally:
+            db.session.remove()
+
+
+# ======================================================
+# Encolado (en el worker web)
+# ======================================================
+
+def _ajustes(app):
+    """ Configuración que se copia a los procesos del pool (lo que se pueda serializar). """
+    ajustes = {}
+    for clave, valor in app.config.items():
+        try:
+            pickle.dumps(valor)
+        except Exception:
+            continue
+        ajustes[clave] = valor
+    return ajustes
+
+
+def _cerrar_ejecutor(esperar=True):
+    """ Cierra el pool (al salir del proceso o cuando un proceso hijo murió). """
+    global _ejecutor
+    if _ejecutor is not None:
+        ejecutor, _ejecutor = _ejecutor, None
+        ejecutor.shutdown(wait=esperar, cancel_futures=True)
+
+
+atexit.register(_cerrar_ejecutor)
+
+
+def _obtener_ejecutor(app):
+    """
+    Crea el pool la primera vez. Con REPORTES_PROCESOS=0, o con la caché en
+    memoria (el progreso no cruzaría procesos), se usa un hilo del worker.
+    """
+    global _ejecutor, _app
+    if _ejecutor is None:
+        procesos = app.config['REPORTES_PROCESOS']
+        if procesos > 0 and app.config.get('CACHE_BACKEND') == 'sqlite':
+            _ejecutor = ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_iniciar_proceso,
+                initargs=(_ajustes(app),)
+            )
+        else:
+            _app = app
+            _ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reportes')
+    return _ejecutor
+
+
+def _al_terminar(trabajo_id, estado, futuro):
+    """ Guarda el estado final; si el proceso murió, el trabajo queda en error. """
+    try:
+        _guardar_estado(trabajo_id, futuro.result())
+    except Exception as e:
+        logger.error(f"[Reportes] El trabajo {trabajo_id} no terminó: {e}")
+        _guardar_estado(trabajo_id, {**estado, 'estado': ERROR, 'error': str(e) or 'El proceso terminó de forma inesperada.'})
+
+
+def _trabajo_activo(tipo, trabajo_id, ttl):
+    """
+    Intenta que `trabajo_id` sea el trabajo activo de `tipo`. Devuelve None si
+    lo consiguió, o el id del trabajo pendiente o en curso al que hay que unirse.
+    """
+    clave = _clave_activo(tipo)
+    for _ in range(INTENTOS_MARCA):
+        # Si un proceso muere sin avisar, la marca vence y se puede volver a pedir
+        tomada = cache.agregar(clave, trabajo_id, ttl)
+        if tomada is not False:
+            return None  # Tomada, o la caché falló: se encola sin unir solicitudes
+        activo = cache.obtener(clave)
+        actual = estado_trabajo(activo) if activo else None
+        if actual and actual['estado'] in (PENDIENTE, EN_CURSO):
+            return activo
+        # La marca es de un trabajo que ya terminó: se toma solo si nadie se adelantó
+        if activo and cache.reemplazar(clave, activo, trabajo_id, ttl) is not False:
+            return None
+    return None
+
+
+def encolar_reporte(app, tipo, admin_id):
+    """
+    Encola el reporte `tipo` y devuelve el id del trabajo. Si ya hay uno del
+    mismo tipo pendiente o en curso (en cualquier worker), devuelve ese.
+    """
+    trabajo_id = uuid.uuid4().hex
+    estado = {
+        'estado': PENDIENTE,
+        'tipo': tipo,
+        'nombre': REPORTES[tipo].nombre,
+        'filas': 0,
+        'total': None,
+        'creado': datetime.utcnow().isoformat(),
+    }
+    # El estado se guarda antes de tomar la marca: quien se una ya lo encuentra
+    _guardar_estado(trabajo_id, estado)
+    activo = _trabajo_activo(tipo, trabajo_id, app.config['REPORTES_TIEMPO_MAX'])
+    if activo:
+        cache.eliminar(_clave_estado(trabajo_id))
+        logger.info(f"[Reportes] Solicitud de '{tipo}' (usuario {admin_id}) unida al trabajo {activo}")
+        return activo
+
+    with _candado:
+        try:
+            futuro = _obtener_ejecutor(app).submit(_ejecutar, trabajo_id, tipo, estado)
+        except BrokenProcessPool:
+            # Un proceso del pool murió: se cierra el pool roto y se crea otro
+            _cerrar_ejecutor(esperar=False)
+            futuro = _obtener_ejecutor(app).submit(_ejecutar, trabajo_id, tipo, estado)
+    futuro.add_done_callback(lambda f: _al_terminar(trabajo_id, estado, f))
+
+    logger.info(f"[Reportes] Trabajo {trabajo_id} encolado ({tipo}, usuario {admin_id})")
+    return trabajo_id
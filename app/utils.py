@@ -10,34 +10,101 @@ from reportlab.lib import colors
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.enums import  TA_LEFT
 from reportlab.lib.units import inch
-from app.extensions import mail, db
-from flask_mail import Message
+from app.extensions import db
+from app.correo import encolar_correo
 from datetime import date, timedelta
 import os
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph,Indenter, Table, TableStyle, Spacer
+    SimpleDocTemplate, Paragraph,Indenter, Table, TableStyle, Spacer, Flowable
 )
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.pdfdoc import PDFStream, PDFDictionary, PDFArray, PDFName, PDFZCompress
+from reportlab.lib.utils import ImageReader
+from PIL import Image
+from functools import lru_cache
+import threading
+from itertools import islice
 import logging
 logging.basicConfig(level=logging.INFO)
 
-def generar_reporte_con_plantilla(datos, columnas, subtitulo):
+FORMA_PLANTILLA = 'plantilla_fondo'  # Nombre del Form XObject con el fondo de cada reporte
+_lectores = threading.local()  # ImageReader de la plantilla por hilo
+
+
+@lru_cache(maxsize=4)
+def _plantilla_jpeg(ruta, modificado, dpi, calidad):
+    """
+    Lee la plantilla, la reescala a la página carta a `dpi` y la recomprime.
+    Queda en memoria por proceso; `modificado` invalida la entrada si se
+    reemplaza el archivo.
+    """
+    imagen = Image.open(ruta).convert('RGB')
+    if dpi:
+        imagen = imagen.resize((round(LETTER[0] / 72 * dpi), round(LETTER[1] / 72 * dpi)), Image.LANCZOS)
+    buffer = BytesIO()
+    imagen.save(buffer, 'JPEG', quality=calidad, optimize=True)
+    logging.info(f"[Reportes] Plantilla preparada: {imagen.size[0]}x{imagen.size[1]}, {len(buffer.getvalue()) // 1024} KB")
+    return buffer.getvalue()
+
+
+def plantilla_reporte(ruta):
+    """
+    ImageReader de la plantilla ya procesada. Los bytes se comparten en el
+    proceso y el lector (que guarda los píxeles decodificados) se reutiliza
+    dentro de cada hilo, porque ImageReader no es seguro entre hilos.
+    """
+    jpeg = _plantilla_jpeg(
+        ruta, os.path.getmtime(ruta),
+        current_app.config['REPORTES_PLANTILLA_DPI'], current_app.config['REPORTES_PLANTILLA_CALIDAD']
+    )
+    if getattr(_lectores, 'jpeg', None) is not jpeg:
+        _lectores.jpeg = jpeg
+        _lectores.lector = ImageReader(BytesIO(jpeg))
+    return _lectores.lector
+
+
+def dibujar_plantilla(lienzo, plantilla, ancho, alto):
+    """
+    Dibuja el fondo. La imagen se registra una sola vez por documento como
+    Form XObject y cada página solo la referencia: drawImage con un
+    ImageReader calcula el hash de todos los píxeles en cada llamada.
+    """
+    if not lienzo.hasForm(FORMA_PLANTILLA):
+        lienzo.beginForm(FORMA_PLANTILLA)
+        lienzo.drawImage(plantilla, 0, 0, width=ancho, height=alto, preserveAspectRatio=False)
+        lienzo.endForm()
+    lienzo.doForm(FORMA_PLANTILLA)
+
+
+def generar_reporte_con_plantilla(datos, columnas, subtitulo, destino=None, progreso=None):
+    """
+    Genera el PDF del reporte. `datos` puede ser cualquier iterable de filas
+    (por ejemplo un generador sobre una consulta con yield_per): las filas se
+    consumen página a página, sin armar la tabla completa en memoria.
+    Con `destino` (ruta o archivo) escribe ahí y devuelve la cantidad de filas;
+    sin él devuelve los bytes del PDF, como antes.
+    `progreso(filas)` se llama al cerrar cada página.
+    """
     try:
-        buffer = BytesIO()
+        buffer = destino if destino is not None else BytesIO()
         plantilla_path = os.path.join(
             current_app.root_path, 'static', 'imagenes', 'plantilla.jpg'
         )
 
-        ReporteSBS(
+        reporte = ReporteSBS(
             buffer=buffer,
             subtitulo=subtitulo,
             columnas=columnas,
             datos=datos,  # ya con numeración si aplica
-            plantilla_fondo=plantilla_path
+            plantilla_fondo=plantilla_reporte(plantilla_path),
+            progreso=progreso
         )
+        logging.info(f"Reporte PDF '{subtitulo}' generado correctamente ({reporte.filas} filas).")
 
+        if destino is not None:
+            return reporte.filas
         pdf = buffer.getvalue()
         buffer.close()
-        logging.info(f"Reporte PDF '{subtitulo}' generado correctamente.")
         return pdf
     except Exception as e:
         logging.error(f"Error generando reporte PDF '{subtitulo}': {str(e)}")
@@ -66,13 +133,7 @@ class FooterCanvas(canvas.Canvas):
     def draw_header_footer(self, page_count):
         # Dibuja la plantilla de fondo en cada página (CUBRIENDO TODA LA PÁGINA)
         if self.plantilla_fondo:
-            self.drawImage(
-                self.plantilla_fondo,
-                0, 0,  # Empezar desde abajo a la izquierda
-                width=self.width,
-                height=self.height,
-                preserveAspectRatio=False
-            )
+            dibujar_plantilla(self, self.plantilla_fondo, self.width, self.height)
 
         # Número de página encima del fondo
         self.setFont("Helvetica", 8)
@@ -80,13 +141,134 @@ class FooterCanvas(canvas.Canvas):
         self.drawRightString(self.width - inch, 0.75 * inch, page_text)
 
 
+class CanvasComprimido(canvas.Canvas):
+    """
+    Comprime el contenido de cada página al cerrarla. reportlab guarda el
+    texto de todas las páginas hasta save(), y en reportes de miles de
+    páginas eso era casi toda la memoria del proceso.
+    """
+
+    def showPage(self):
+        super().showPage()
+        pagina = self._doc.Pages.pages[-1]
+        if pagina.stream and not pagina.Contents:
+            # Con /Filter ya presente, PDFStream escribe el contenido tal cual
+            pagina.Contents = PDFStream(
+                PDFDictionary({'Filter': PDFArray([PDFName(PDFZCompress.pdfname)])}),
+                PDFZCompress.encode(pagina.stream)
+            )
+            pagina.stream = None
+
+
+class TablaContinua(Flowable):
+    """
+    Tabla que se arma página a página desde un iterable de filas.
+    Cada vez que platypus le pide partirse toma solo las filas que caben en el
+    espacio disponible y devuelve un Table de esa página (con encabezado)
+    seguido de sí misma, así nunca hay en memoria más de una página de filas.
+    Los anchos de columna se fijan con la primera página para que no cambien
+    entre páginas; los textos más largos que su columna se recortan.
+    """
+    ALTO_FILA = 18
+    ALTO_ENCABEZADO = 30
+    FUENTE, TAMANO_FUENTE = "Helvetica", 10
+    MUESTRA_ANCHOS = 200  # filas leídas por adelantado para calcular los anchos
+
+    def __init__(self, encabezados, filas, estilo, progreso=None):
+        super().__init__()
+        self.encabezados = encabezados
+        self.estilo = estilo
+        self.progreso = progreso
+        self.filas = 0
+        self._filas = iter(filas)
+        self._pendientes = []
+        self._anchos = None
+        self._terminada = False
+
+    def _siguientes(self, cantidad):
+        lote = self._pendientes[:cantidad]
+        del self._pendientes[:cantidad]
+        for fila in self._filas:
+            if len(lote) >= cantidad:
+                self._pendientes.append(fila)
+                break
+            lote.append(fila)
+        if not self._pendientes:
+            self._terminada = True
+        self.filas += len(lote)
+        return lote
+
+    def _calcular_anchos(self, disponible):
+        self._pendientes.extend(islice(self._filas, self.MUESTRA_ANCHOS))
+        relleno = 12  # LEFTPADDING + RIGHTPADDING por celda
+        anchos = [
+            max(stringWidth(col.getPlainText(), "Helvetica-Bold", self.TAMANO_FUENTE) + relleno, 30)
+            for col in self.encabezados
+        ]
+        for fila in self._pendientes:
+            for i, valor in enumerate(fila):
+                anchos[i] = max(anchos[i], stringWidth(str(valor), self.FUENTE, self.TAMANO_FUENTE) + relleno)
+        # Si no entra en la página se reparte el ancho en proporción
+        total = sum(anchos)
+        if total > disponible:
+            anchos = [ancho * disponible / total for ancho in anchos]
+        self._anchos = anchos
+
+    def _recortar(self, fila):
+        celdas = []
+        for valor, ancho in zip(fila, self._anchos):
+            texto = str(valor)
+            maximo = ancho - 12
+            # Atajo: ningún carácter de Helvetica 10 mide más de 9.5 pt
+            if len(texto) * 9.5 > maximo and stringWidth(texto, self.FUENTE, self.TAMANO_FUENTE) > maximo:
+                while texto and stringWidth(texto + '…', self.FUENTE, self.TAMANO_FUENTE) > maximo:
+                    texto = texto[:-1]
+                texto += '…'
+            celdas.append(texto)
+        return celdas
+
+    def _tabla(self, filas):
+        tabla = Table(
+            [self.encabezados] + [self._recortar(fila) for fila in filas],
+            colWidths=self._anchos,
+            rowHeights=[self.ALTO_ENCABEZADO] + [self.ALTO_FILA] * len(filas),
+            hAlign="CENTER"
+        )
+        tabla.setStyle(self.estilo)
+        return tabla
+
+    def wrap(self, availWidth, availHeight):
+        if self._anchos is None:
+            self._calcular_anchos(availWidth)
+        # Nunca cabe entera: obliga a platypus a llamar a split()
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        cantidad = int((availHeight - self.ALTO_ENCABEZADO) // self.ALTO_FILA)
+        if cantidad < 1:
+            return []  # No queda espacio en esta página: sigue en la próxima
+        # platypus marca como pospuesto lo que no entró; esta misma tabla se
+        # pospone una vez por página, así que la marca se limpia al avanzar
+        self.__dict__.pop('_postponed', None)
+        filas = self._siguientes(cantidad)
+        if self.progreso:
+            self.progreso(self.filas)
+        if self._terminada:
+            return [self._tabla(filas)]
+        return [self._tabla(filas), self]
+
+    def draw(self):
+        pass
+
+
 class ReporteSBS:
-    def __init__(self, buffer, subtitulo, columnas, datos, plantilla_fondo=None):
+    def __init__(self, buffer, subtitulo, columnas, datos, plantilla_fondo=None, progreso=None):
         self.buffer = buffer
         self.subtitulo = subtitulo
         self.columnas = columnas
         self.datos = datos
         self.plantilla_fondo = plantilla_fondo
+        self.progreso = progreso
 
         self.styles = getSampleStyleSheet()
         self.width, self.height = LETTER
@@ -100,7 +282,8 @@ class ReporteSBS:
             pagesize=LETTER,
             rightMargin=40, leftMargin=40,
             topMargin=200,  # Controla dónde empieza TODO el contenido (título incluido)
-            bottomMargin=100
+            bottomMargin=100,
+            invariant=True  # Sin fecha ni id aleatorio: mismos datos, mismo archivo (ver almacen_reportes)
         )
 
         # TÍTULO PRINCIPAL
@@ -143,40 +326,33 @@ class ReporteSBS:
         doc.build(
             self.story,
             onFirstPage=self.add_background_and_footer,
-            onLaterPages=self.add_background_and_footer
+            onLaterPages=self.add_background_and_footer,
+            canvasmaker=CanvasComprimido
         )
 
 
     def build_table(self):
-        data = []
         encabezados = [Paragraph(f"<b>{col}</b>", self.styles["Normal"]) for col in self.columnas]
-        data.append(encabezados)
-
-        for fila in self.datos:
-            data.append(fila)
-
-        tabla = Table(data, hAlign="CENTER")
-        tabla.setStyle(TableStyle([
+        self.tabla = TablaContinua(encabezados, self.datos, TableStyle([
             ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#ffffff")),
             ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
             ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
             ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
             ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
             ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
             ("BACKGROUND", (0, 1), (-1, -1), colors.whitesmoke),
-        ]))
-        self.story.append(tabla)
+        ]), progreso=self.progreso)
+        self.story.append(self.tabla)
+
+    @property
+    def filas(self):
+        return self.tabla.filas
 
     def add_background_and_footer(self, canvas, doc):
         # Dibuja la plantilla de fondo primero
         if self.plantilla_fondo:
-            canvas.drawImage(
-                self.plantilla_fondo,
-                0, 0,
-                width=self.width,
-                height=self.height,
-                preserveAspectRatio=False
-            )
+            dibujar_plantilla(canvas, self.plantilla_fondo, self.width, self.height)
         # Número de página
         canvas.setFont("Helvetica", 8)
         page_text = f"Página {doc.page}"
@@ -205,13 +381,10 @@ def activar_siguiente_reserva(libro):
         for idx, reserva in enumerate(nuevas_pendientes, start=1):
             reserva.posicion = idx
 
-        try:
-            msg = Message(
-                '¡Tu reserva ahora está ACTIVA!',
-                sender='noreply@biblioteca.com',
-                recipients=[siguiente_reserva.usuario.correo]
-            )
-            msg.body = f"""
+        encolar_correo(
+            '¡Tu reserva ahora está ACTIVA!',
+            siguiente_reserva.usuario.correo,
+            f"""
 Hola {siguiente_reserva.usuario.nombre},
 
 Tu reserva para el libro "{libro.titulo}" ahora está ACTIVA.
@@ -221,10 +394,8 @@ Tienes 7 días para recogerlo, hasta el {siguiente_reserva.fecha_expiracion.strf
 
 SDS library
 """
-            mail.send(msg)
-            logging.info(f"Correo enviado a {siguiente_reserva.usuario.correo} para reserva activada.")
-        except Exception as e:
-            logging.error(f"No se pudo enviar correo de reserva activada: {str(e)}")
+        )
+        logging.info(f"Correo de reserva activada encolado para {siguiente_reserva.usuario.correo}.")
 
 def generar_token(email):
     try:
@@ -256,42 +427,3 @@ def generar_llave_prestamo():
             logging.error(f"Error verificando llave de préstamo única: {str(e)}")
             raise
     raise Exception("No se pudo generar una llave de préstamo única después de 1000 intentos")
-
-
-def enviar_recordatorios(app):
-    with app.app_context():
-        mañana = date.today() + timedelta(days=1)
-        prestamos = Prestamo.query.filter(
-            Prestamo.estado == 'activo',
-            Prestamo.fecha_devolucion_esperada == mañana
-        ).all()
-
-        for prestamo in prestamos:
-            usuario = prestamo.usuario
-            libro = prestamo.libro
-
-            try:
-                msg = Message(
-                    '⏰ Recordatorio de Devolución',
-                    sender='noreply@biblioteca.com',
-                    recipients=[usuario.correo]
-                )
-                msg.body = f"""
-Hola {usuario.nombre},
-
-Te recordamos que debes devolver el libro "{libro.titulo}" mañana.
-
-📅 Fecha de devolución esperada: {prestamo.fecha_devolucion_esperada}
-
-¡Gracias por usar nuestra biblioteca!
-
-Biblioteca SDS library
-"""
-                mail.send(msg)
-                logging.info(f"Recordatorio enviado a {usuario.correo} para el libro {libro.titulo}.")
-            except Exception as e:
-                logging.warning(f"No se pudo enviar recordatorio a {usuario.correo}: {str(e)}")
-
-
-
-
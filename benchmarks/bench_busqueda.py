@@ -0,0 +1,58 @@
+# benchmarks/bench_busqueda.py
+"""
+Mide el índice invertido en memoria de app/busqueda.py sobre un catálogo
+sintético (500k títulos por defecto).
+
+    python -m benchmarks.bench_busqueda --libros 500000
+"""
+import argparse
+import gc
+import random
+from time import perf_counter
+from app.busqueda import IndiceInvertido
+from benchmarks.comun import cronometrar
+
+
+def catalogo_sintetico(n_libros, vocabulario):
+    for i in range(n_libros):
+        yield (
+            i,
+            ' '.join(random.choices(vocabulario, k=4)),
+            ' '.join(random.choices(vocabulario, k=2)),
+            random.choice(vocabulario),
+            str(9780000000000 + i),
+            ' '.join(random.choices(vocabulario, k=12)),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--libros', type=int, default=500_000)
+    parser.add_argument('--vocabulario', type=int, default=60_000)
+    args = parser.parse_args()
+
+    random.seed(7)
+    letras = 'abcdefghijklmnopqrstuvwxyzñáéíóú'
+    vocabulario = [''.join(random.choices(letras, k=random.randint(3, 9))) for _ in range(args.vocabulario)]
+
+    indice = IndiceInvertido()
+    inicio = perf_counter()
+    indice.construir(catalogo_sintetico(args.libros, vocabulario))
+    print(f"Índice construido con {len(indice)} libros en {perf_counter() - inicio:.1f} s")
+    gc.collect()
+
+    consultas = [
+        vocabulario[0],                                  # término exacto
+        vocabulario[1][:3],                              # prefijo
+        f"{vocabulario[2]} {vocabulario[3][:2]}",        # término + prefijo corto
+        vocabulario[4].upper(),                          # mayúsculas
+        str(9780000000000 + args.libros // 2)[:10],      # prefijo de ISBN
+    ]
+    for consulta in consultas:
+        ms = cronometrar(lambda: indice.buscar(consulta, 0, 12), repeticiones=20)
+        _, total = indice.buscar(consulta, 0, 12)
+        print(f"{consulta!r:<24} {total:6d} resultados  {ms:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_importacion.py
+"""
+Mide la importación masiva de app/importacion.py contra el servidor local de
+bench_openlibrary (latencia inyectada) y una base SQLite temporal:
+
+  - uno a uno: lo que costaba registrar el envío con nuevo_libro, un ISBN
+    tras otro (se mide una muestra y se extrapola);
+  - importación: importar_isbns con el pool de hilos e INSERT por lotes.
+
+    python -m benchmarks.bench_importacion --isbns 2000 --latencia-ms 200
+
+Termina con código 1 si la importación supera --objetivo-s.
+"""
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+from app.extensions import db
+from app.models import Libro
+from app.openlibrary import obtener_datos_libro
+from app.importacion import importar_isbns, _fila_libro
+from benchmarks.comun import crear_app_benchmark
+from benchmarks.bench_openlibrary import crear_stub
+
+
+def isbns_sinteticos(cantidad, desde=0):
+    return [str(9780000000000 + desde + i) for i in range(cantidad)]
+
+
+def registrar_uno_a_uno(isbns):
+    """ Réplica de nuevo_libro: consulta, comprueba duplicado y confirma cada libro. """
+    for isbn in isbns:
+        datos = obtener_datos_libro(isbn)
+        if Libro.query.filter_by(isbn=isbn).first():
+            continue
+        db.session.add(Libro(**_fila_libro(isbn, datos, 1)))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--isbns', type=int, default=2000)
+    parser.add_argument('--latencia-ms', type=float, default=200, help='Latencia de cada respuesta')
+    parser.add_argument('--muestra', type=int, default=20, help='ISBN registrados uno a uno')
+    parser.add_argument('--hilos', type=int, default=None, help='Por defecto IMPORTACION_HILOS')
+    parser.add_argument('--objetivo-s', type=float, default=60)
+    args = parser.parse_args()
+
+    servidor, base = crear_stub(args.latencia_ms / 1000, 0)
+    carpeta = tempfile.mkdtemp(prefix='sds_bench_')
+    app = crear_app_benchmark(
+        OPENLIBRARY_URL=base,
+        OPENLIBRARY_PORTADAS_URL=base,
+        OPENLIBRARY_TIMEOUT=10,
+        OPENLIBRARY_REINTENTOS=0,
+        OPENLIBRARY_CONEXIONES=64,
+        OPENLIBRARY_CACHE_RUTA=os.path.join(carpeta, 'openlibrary.sqlite'),
+        OPENLIBRARY_CACHE_MEMORIA=10000,
+        OPENLIBRARY_CACHE_MAX=100000,
+        OPENLIBRARY_TTL=3600,
+        OPENLIBRARY_TTL_NEGATIVO=3600,
+        OPENLIBRARY_MAX_OBSOLETO=3600,
+        IMPORTACION_HILOS=32,
+        IMPORTACION_LOTE=500,
+    )
+
+    with app.app_context():
+        db.create_all()
+
+        inicio = perf_counter()
+        registrar_uno_a_uno(isbns_sinteticos(args.muestra, desde=args.isbns))
+        por_libro = (perf_counter() - inicio) / args.muestra
+
+        isbns = isbns_sinteticos(args.isbns)
+        inicio = perf_counter()
+        resultado = importar_isbns(isbns, hilos=args.hilos)
+        segundos = perf_counter() - inicio
+    servidor.shutdown()
+
+    print(f"{args.isbns} ISBN, latencia {args.latencia_ms:.0f} ms por respuesta")
+    print(f"uno a uno (extrapolado): {por_libro * args.isbns:8.1f} s  ({por_libro * 1000:.0f} ms por libro)")
+    print(f"importación:             {segundos:8.1f} s  "
+          f"({resultado['importados']} importados, {len(resultado['fallidos'])} con error)")
+    if segundos > args.objetivo_s:
+        print(f"Supera el objetivo de {args.objetivo_s:.0f} s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
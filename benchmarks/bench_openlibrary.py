@@ -0,0 +1,96 @@
+# benchmarks/bench_openlibrary.py
+"""
+Compara el cliente de OpenLibrary contra un servidor local que imita la API
+con latencia inyectada:
+
+  - antes: requests.get/head sueltos (conexión nueva por llamada) y la
+    portada y la edición una detrás de otra;
+  - ahora: app.openlibrary.consultar_openlibrary (sesión con keep-alive,
+    portada y edición en paralelo).
+
+    python -m benchmarks.bench_openlibrary --latencia-ms 200 --conexion-ms 150
+
+--conexion-ms simula el coste de abrir una conexión (TCP + TLS), que solo
+se paga una vez por conexión.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from app.openlibrary import consultar_openlibrary
+from benchmarks.comun import cronometrar
+
+
+def crear_stub(latencia, conexion):
+    class StubOpenLibrary(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Permite keep-alive
+
+        def setup(self):
+            super().setup()
+            time.sleep(conexion)
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, codigo, cuerpo=b'', tipo='application/json'):
+            time.sleep(latencia)
+            self.send_response(codigo)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(cuerpo)
+
+        def do_HEAD(self):
+            self._responder(200, tipo='image/jpeg')
+
+        def do_GET(self):
+            if self.path.startswith('/api/books'):
+                isbn = self.path.split('ISBN:')[1].split('&')[0]
+                datos = {f'ISBN:{isbn}': {
+                    'title': 'Libro de prueba', 'authors': [{'name': 'Autora'}],
+                    'publishers': [{'name': 'Editorial'}], 'publish_date': '2001',
+                    'key': f'/books/OL{isbn}M',
+                }}
+            else:
+                datos = {'subjects': ['Fiction'], 'description': 'Descripción'}
+            self._responder(200, json.dumps(datos).encode())
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenLibrary)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_port}'
+
+
+def consulta_secuencial(isbn, base, timeout=5):
+    """ Réplica del cliente anterior: tres llamadas seguidas, sin sesión. """
+    data = requests.get(f"{base}/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data", timeout=timeout).json()
+    libro = data[f"ISBN:{isbn}"]
+    requests.head(f"{base}/b/isbn/{isbn}-L.jpg?default=false", timeout=timeout)
+    olid = libro['key'].split('/')[-1]
+    return requests.get(f"{base}/books/{olid}.json", timeout=timeout).json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latencia-ms', type=float, default=200, help='Latencia de cada respuesta')
+    parser.add_argument('--conexion-ms', type=float, default=150, help='Coste de abrir una conexión')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    servidor, base = crear_stub(args.latencia_ms / 1000, args.conexion_ms / 1000)
+    isbn = '9780000000001'
+
+    consultar_openlibrary(isbn, base, base)  # Abre las conexiones del pool
+    antes = cronometrar(lambda: consulta_secuencial(isbn, base), args.repeticiones)
+    ahora = cronometrar(lambda: consultar_openlibrary(isbn, base, base), args.repeticiones)
+    servidor.shutdown()
+
+    print(f"Latencia {args.latencia_ms:.0f} ms por respuesta, {args.conexion_ms:.0f} ms por conexión nueva")
+    print(f"antes (secuencial, sin sesión): {antes:8.1f} ms")
+    print(f"ahora (sesión + paralelo):      {ahora:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_plantilla.py
+"""
+Mide el costo de la plantilla de fondo de los reportes PDF
+(static/imagenes/plantilla.jpg):
+
+  - antes: drawImage con la ruta del archivo en cada página; cada reporte
+    vuelve a leer el JPEG original y lo incrusta tal cual;
+  - ahora: plantilla reescalada y recomprimida una vez por proceso
+    (plantilla_reporte) y dibujada como un único Form XObject por documento
+    (dibujar_plantilla).
+
+Costo por página: un lienzo de --paginas páginas con solo el fondo y el
+número de página. Costo por reporte: ReporteSBS de una página con filas
+sintéticas, y tamaño del PDF.
+
+    python -m benchmarks.bench_plantilla --paginas 500 --dpi 150 --calidad 85
+"""
+import os
+import argparse
+from io import BytesIO
+from time import perf_counter
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import LETTER
+from app import utils
+from app.utils import ReporteSBS, plantilla_reporte, dibujar_plantilla
+from benchmarks.comun import crear_app_benchmark, cronometrar
+
+# Raíz del proyecto: ahí está static/imagenes/plantilla.jpg
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNAS = ["#", "Libro", "Correo", "Fecha Préstamo", "Fecha Devolución"]
+
+
+class ReporteAnterior(ReporteSBS):
+    """ Réplica del fondo anterior: drawImage con la ruta en cada página. """
+
+    def add_background_and_footer(self, canvas, doc):
+        canvas.drawImage(self.plantilla_fondo, 0, 0, width=self.width, height=self.height,
+                         preserveAspectRatio=False)
+        canvas.setFont("Helvetica", 8)
+        canvas.drawRightString(self.width - 72, 54, f"Página {doc.page}")
+
+
+def lienzo(metodo, ruta, paginas):
+    """ PDF de `paginas` páginas con solo el fondo; devuelve el tamaño en bytes. """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=LETTER)
+    plantilla = plantilla_reporte(ruta) if metodo == 'ahora' else ruta
+    for pagina in range(1, paginas + 1):
+        if metodo == 'antes':
+            pdf.drawImage(ruta, 0, 0, width=LETTER[0], height=LETTER[1], preserveAspectRatio=False)
+        else:
+            dibujar_plantilla(pdf, plantilla, *LETTER)
+        pdf.drawRightString(LETTER[0] - 72, 54, f"Página {pagina}")
+        pdf.showPage()
+    pdf.save()
+    return len(buffer.getvalue())
+
+
+def reporte(metodo, ruta, filas):
+    datos = [[i, f'Título de prueba número {i}', f'lector{i}@biblioteca.com', '2025-01-01', 'No devuelto']
+             for i in range(1, filas + 1)]
+    buffer = BytesIO()
+    if metodo == 'antes':
+        ReporteAnterior(buffer, "Reporte", COLUMNAS, datos, plantilla_fondo=ruta)
+    else:
+        ReporteSBS(buffer, "Reporte", COLUMNAS, datos, plantilla_fondo=plantilla_reporte(ruta))
+    return len(buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', type=int, default=500)
+    parser.add_argument('--dpi', type=int, default=150, help='0 = resolución original')
+    parser.add_argument('--calidad', type=int, default=85)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    app = crear_app_benchmark(REPORTES_PLANTILLA_DPI=args.dpi, REPORTES_PLANTILLA_CALIDAD=args.calidad)
+    ruta = os.path.join(RAIZ, 'static', 'imagenes', 'plantilla.jpg')
+
+    with app.app_context():
+        inicio = perf_counter()
+        plantilla_reporte(ruta).getRGBData()
+        jpeg = utils._plantilla_jpeg(ruta, os.path.getmtime(ruta), args.dpi, args.calidad)
+        print(f"Preparar la plantilla (una vez por proceso): {(perf_counter() - inicio) * 1000:.0f} ms, "
+              f"{len(jpeg) // 1024} KB (original {os.path.getsize(ruta) // 1024} KB)")
+
+        print(f"{'método':>7} {'ms/página':>10} {'ms/reporte':>11} {'KB 1 pág':>9} {f'KB {args.paginas} pág':>12}")
+        for metodo in ('antes', 'ahora'):
+            por_pagina = cronometrar(lambda: lienzo(metodo, ruta, args.paginas), args.repeticiones) / args.paginas
+            por_reporte = cronometrar(lambda: reporte(metodo, ruta, 20), args.repeticiones)
+            print(f"{metodo:>7} {por_pagina:>10.3f} {por_reporte:>11.1f} "
+                  f"{reporte(metodo, ruta, 20) / 1024:>9.0f} {lienzo(metodo, ruta, args.paginas) / 1024:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_reportes.py
+"""
+Mide la generación del reporte de préstamos (app/reportes.py) sobre una base
+SQLite sintética con 10k, 100k y 500k préstamos:
+
+  - antes: Prestamo.query.all() con joinedload, lista de filas, una sola
+    Table de reportlab en un BytesIO y buffer.getvalue();
+  - ahora: generar_reporte('prestados', ruta), filas con yield_per y tabla
+    armada página a página directo al archivo;
+  - huella: huella_datos('prestados'), lo que cuesta comprobar si el último
+    PDF sigue vigente (una descarga repetida sin cambios solo paga esto: una
+    lectura de la caché, sin recorrer los préstamos).
+
+Cada medición corre en un proceso aparte para informar su pico de memoria
+(RSS máximo). El método anterior solo se mide hasta --max-antes filas,
+porque partir una tabla gigante crece de forma cuadrática.
+
+    python -m benchmarks.bench_reportes --prestamos 10000 100000 500000
+"""
+import os
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from io import BytesIO
+from time import perf_counter
+from datetime import date, timedelta
+from sqlalchemy import insert
+from reportlab.lib.pagesizes import LETTER
+from reportlab.platypus import SimpleDocTemplate, Table
+from app.config import Config
+from app.extensions import db
+from app.models import Usuario, Libro, Prestamo
+from app.consultas import PRESTAMO_CON_LIBRO_Y_USUARIO
+from app.reportes import generar_reporte, huella_datos
+from benchmarks.comun import crear_app_benchmark
+
+# Raíz del proyecto: ahí están static/imagenes/plantilla.jpg y static/archivos
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def poblar(app, prestamos, usuarios=1000, libros=5000):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Usuario), [{
+            'nombre': f'Lector {i}', 'apellido': 'Prueba', 'correo': f'lector{i}@biblioteca.com',
+            'documento': str(10_000_000 + i), 'direccion': 'Calle', 'telefono': '0',
+            'fecha_nacimiento': date(1990, 1, 1), 'rol': 'lector', 'password_hash': 'x',
+        } for i in range(usuarios)])
+        db.session.execute(insert(Libro), [{
+            'titulo': f'Título de prueba número {i} con algo de texto', 'autor': 'Autora',
+            'isbn': str(9780000000000 + i), 'cantidad_total': 1, 'cantidad_disponible': 1,
+        } for i in range(libros)])
+        hoy = date.today()
+        for inicio in range(0, prestamos, 50_000):
+            db.session.execute(insert(Prestamo), [{
+                'usuario_id': i % usuarios + 1, 'libro_id': i % libros + 1,
+                'fecha_prestamo': hoy - timedelta(days=i % 365),
+                'fecha_devolucion_esperada': hoy - timedelta(days=i % 365 - 7),
+                'fecha_devolucion': hoy if i % 3 else None, 'estado': 'devuelto' if i % 3 else 'activo',
+            } for i in range(inicio, min(inicio + 50_000, prestamos))])
+        db.session.commit()
+
+
+def reporte_anterior(plantilla):
+    """ Réplica de la vista anterior: todo en memoria, una sola Table y un BytesIO. """
+    prestamos = Prestamo.query.options(*PRESTAMO_CON_LIBRO_Y_USUARIO).all()
+    datos = [["#", "Libro", "Correo", "Fecha Préstamo", "Fecha Devolución"]]
+    for idx, p in enumerate(prestamos, start=1):
+        fecha_dev = p.fecha_devolucion.strftime('%Y-%m-%d') if p.fecha_devolucion else "No devuelto"
+        datos.append([idx, p.libro.titulo, p.usuario.correo, p.fecha_prestamo.strftime('%Y-%m-%d'), fecha_dev])
+
+    def fondo(canvas, doc):
+        canvas.drawImage(plantilla, 0, 0, width=LETTER[0], height=LETTER[1], preserveAspectRatio=False)
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=LETTER, rightMargin=40, leftMargin=40, topMargin=200, bottomMargin=100)
+    doc.build([Table(datos, hAlign="CENTER")], onFirstPage=fondo, onLaterPages=fondo)
+    return len(buffer.getvalue())
+
+
+def medir(url, metodo, salida):
+    app = crear_app_benchmark(
+        url,
+        REPORTES_PLANTILLA_DPI=Config.REPORTES_PLANTILLA_DPI,
+        REPORTES_PLANTILLA_CALIDAD=Config.REPORTES_PLANTILLA_CALIDAD,
+    )
+    app.root_path = RAIZ
+    with app.app_context():
+        plantilla = os.path.join(RAIZ, 'static', 'imagenes', 'plantilla.jpg')
+        inicio = perf_counter()
+        if metodo == 'antes':
+            tamano = reporte_anterior(plantilla)
+        elif metodo == 'huella':
+            huella_datos('prestados')
+            tamano = 0
+        else:
+            ruta = os.path.join(tempfile.mkdtemp(prefix='sds_bench_'), 'reporte.pdf')
+            generar_reporte('prestados', ruta)
+            tamano = os.path.getsize(ruta)
+        segundos = perf_counter() - inicio
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    salida.put((segundos, pico_mb, tamano))
+
+
+def en_proceso(url, metodo):
+    salida = multiprocessing.Queue()
+    proceso = multiprocessing.Process(target=medir, args=(url, metodo, salida))
+    proceso.start()
+    resultado = salida.get()
+    proceso.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prestamos', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--max-antes', type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'préstamos':>10} {'método':>7} {'segundos':>9} {'pico MB':>8} {'PDF MB':>7}")
+    for cantidad in args.prestamos:
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='sds_bench_'), 'bench.db')
+        poblar(crear_app_benchmark(url), cantidad)
+        metodos = ['antes', 'ahora', 'huella'] if cantidad <= args.max_antes else ['ahora', 'huella']
+        for metodo in metodos:
+            segundos, pico_mb, tamano = en_proceso(url, metodo)
+            print(f"{cantidad:>10} {metodo:>7} {segundos:>9.1f} {pico_mb:>8.0f} {tamano / 2**20:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
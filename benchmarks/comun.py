@@ -0,0 +1,39 @@
+# benchmarks/comun.py
+"""
+Utilidades compartidas por los benchmarks.
+
+Los benchmarks se ejecutan desde la raíz del proyecto, por ejemplo:
+
+    python -m benchmarks.bench_indices --prestamos 1000000
+
+Sin --url usan un archivo SQLite temporal; con --url pueden apuntar a una
+base MySQL de pruebas (nunca a producción).
+"""
+import os
+import tempfile
+from time import perf_counter
+from flask import Flask
+from app.extensions import db
+
+
+def crear_app_benchmark(url=None, **config):
+    """ Crea una aplicación mínima con la base de datos indicada. """
+    if url is None:
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='sds_bench_'), 'bench.db')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config)
+    db.init_app(app)
+    return app
+
+
+def cronometrar(funcion, repeticiones=5):
+    """ Ejecuta la función varias veces y devuelve la mejor marca en milisegundos. """
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = perf_counter()
+        funcion()
+        transcurrido = (perf_counter() - inicio) * 1000
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor
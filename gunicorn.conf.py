@@ -0,0 +1,17 @@
+# gunicorn.conf.py
+import os
+
+# ======================================================
+# Configuración de gunicorn (se carga sola desde la carpeta del proyecto)
+# ======================================================
+# /api/dashboard_stream deja la respuesta abierta: con workers síncronos cada
+# dashboard abierto ocuparía un worker entero hasta que el timeout lo matara.
+# Con gthread cada stream ocupa solo un hilo, el latido del worker no depende
+# de las peticiones en curso y los streams se cierran cada TABLERO_DURACION_MAX
+# segundos (el navegador reconecta). Dejar hilos de sobra para los dashboards
+# que se esperan abiertos a la vez por worker.
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_HILOS', 16))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))  # segundos
@@ -3,14 +3,17 @@ from app.extensions import db, login_manager, mail
 from app.models import Usuario
 from app.routes import main
 from app.config import Config
-from app.utils import enviar_recordatorios
-from datetime import datetime
-import os
+from app.cli import registrar_comandos
+from app import mantenimiento, consultas, metricas, cache, correo
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
 def create_app():
+    """
+    Crea la aplicación sin tocar la base de datos: el esquema y el
+    administrador inicial se preparan una sola vez con `flask init-db`.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -23,47 +26,12 @@ def create_app():
         return db.session.get(Usuario, int(user_id))
 
     app.register_blueprint(main)
-
-    with app.app_context():
-        try:
-            db.create_all()
-            logging.info("Tablas creadas correctamente.")
-        except Exception as e:
-            logging.error(f"Error creando tablas: {e}")
-
-        # Solo crea admin si no existe
-        if not Usuario.query.filter_by(rol='administrador').first():
-            admin_password = os.environ.get('ADMIN_PASSWORD')
-
-            if not admin_password:
-                logging.warning("ADMIN_PASSWORD no definida en variables de entorno. Usando contraseña por defecto temporal.")
-
-            admin = Usuario(
-                nombre='admin',
-                apellido='admin',
-                correo='admin@biblioteca.com',
-                documento='1000000000',
-                direccion='Oficina principal',
-                telefono='0000000000',
-                fecha_nacimiento=datetime(1990, 1, 1),
-                rol='administrador',
-                activo=True
-            )
-            admin.set_password(admin_password)
-            admin.generar_llave_prestamo()
-
-            try:
-                db.session.add(admin)
-                db.session.commit()
-                logging.info("Usuario administrador creado correctamente.")
-            except Exception as e:
-                db.session.rollback()
-                logging.error(f"Error creando usuario admin: {e}")
-
-        try:
-            enviar_recordatorios(app)
-        except Exception as e:
-            logging.warning(f"Error enviando recordatorios: {e}")
+    mantenimiento.init_app(app)
+    consultas.init_app(app)
+    metricas.init_app(app)
+    cache.init_app(app)
+    correo.init_app(app)
+    registrar_comandos(app)
 
     return app
 
@@ -1,79 +1,107 @@
-// Async function to fetch and update total counts on the dashboard
-async function actualizarTotales() {
-  try {
-    // Make a request to the server to get the latest totals
-    const res = await fetch('/api/dashboard_data');
-    const data = await res.json();
+// Fallback polling interval when Server-Sent Events are not available
+const INTERVALO_SONDEO = 30000;
 
-    // Update the HTML elements with the fetched totals, or 0 if missing
-    document.getElementById('total-administradores').innerText = data.total_administradores ?? 0;
-    document.getElementById('total-lectores').innerText = data.total_lectores ?? 0;
-    document.getElementById('total-libros').innerText = data.total_libros ?? 0;
-    document.getElementById('total-prestamos').innerText = data.total_prestamos ?? 0;
-    document.getElementById('total-reservas').innerText = data.total_reservas ?? 0;
-    document.getElementById('total-reportes').innerText = data.total_reportes ?? 0;
+// Chart instances, kept so they can be updated in place
+const graficos = {};
 
-  } catch (error) {
-    // Log any error that occurs during the fetch or update
-    console.error('Error al actualizar totales:', error);
+// Update the counter elements that came in the payload
+function actualizarTotales(data) {
+  const contadores = {
+    total_administradores: 'total-administradores',
+    total_lectores: 'total-lectores',
+    total_libros: 'total-libros',
+    total_prestamos: 'total-prestamos',
+    total_reservas: 'total-reservas',
+    total_reportes: 'total-reportes'
+  };
+  for (const [clave, id] of Object.entries(contadores)) {
+    const el = document.getElementById(id);
+    if (el && clave in data) el.innerText = data[clave] ?? 0;
   }
 }
 
-// Run when the page has loaded
-document.addEventListener("DOMContentLoaded", () => {
-  // Call the function immediately
-  actualizarTotales();
+// Create the bar chart the first time, then only replace its data
+function dibujarGrafico(id, data, etiqueta, color) {
+  const canvas = document.getElementById(id);
+  if (!canvas) return;
+
+  if (graficos[id]) {
+    graficos[id].data.labels = data.map(d => d.titulo);
+    graficos[id].data.datasets[0].data = data.map(d => d.total);
+    graficos[id].update();
+    return;
+  }
 
-  // Refresh totals every 30 seconds automatically
-  setInterval(actualizarTotales, 30000);
+  graficos[id] = new Chart(canvas.getContext('2d'), {
+    type: 'bar',
+    data: {
+      labels: data.map(d => d.titulo), // Book titles
+      datasets: [{
+        label: etiqueta,
+        data: data.map(d => d.total),
+        backgroundColor: color
+      }]
+    },
+    options: {
+      responsive: true,
+      plugins: { legend: { display: false } } // Hide the legend
+    }
+  });
+}
 
+// Apply a full state or a delta coming from the server
+function aplicarCambios(cambios) {
+  if (cambios.totales) actualizarTotales(cambios.totales);
   // 📊 Chart: Most loaned books
-  fetch('/api/libros_populares')
-    .then(res => res.json())
-    .then(data => {
-      // Get the canvas context for the chart
-      const ctx = document.getElementById('graficoLibrosPopulares').getContext('2d');
+  if (cambios.libros_populares) {
+    dibujarGrafico('graficoLibrosPopulares', cambios.libros_populares, 'Veces prestado', '#1cc88a');
+  }
+  // 📊 Chart: Books with most delays
+  if (cambios.libros_atrasados) {
+    dibujarGrafico('graficoLibrosAtrasados', cambios.libros_atrasados, 'Veces atrasado', '#e74a3b');
+  }
+}
 
-      // Create a new bar chart with the popular books data
-      new Chart(ctx, {
-        type: 'bar',
-        data: {
-          labels: data.map(d => d.titulo), // Book titles
-          datasets: [{
-            label: 'Veces prestado',
-            data: data.map(d => d.total), // Times loaned
-            backgroundColor: '#1cc88a' // Green bar color
-          }]
-        },
-        options: {
-          responsive: true,
-          plugins: { legend: { display: false } } // Hide the legend
-        }
-      });
-    });
+// Polling fallback: fetch everything from the JSON endpoints
+async function sondear() {
+  try {
+    const [totales, populares, atrasados] = await Promise.all([
+      fetch('/api/dashboard_data').then(res => res.json()),
+      fetch('/api/libros_populares').then(res => res.json()),
+      fetch('/api/libros_atrasados').then(res => res.json())
+    ]);
+    aplicarCambios({ totales, libros_populares: populares, libros_atrasados: atrasados });
+  } catch (error) {
+    console.error('Error al actualizar el dashboard:', error);
+  }
+}
 
-  // 📊 Chart: Books with most delays
-  fetch('/api/libros_atrasados')
-    .then(res => res.json())
-    .then(data => {
-      // Get the canvas context for the chart
-      const ctx = document.getElementById('graficoLibrosAtrasados').getContext('2d');
+function iniciarSondeo() {
+  sondear();
+  setInterval(sondear, INTERVALO_SONDEO);
+}
+
+// Run when the page has loaded
+document.addEventListener("DOMContentLoaded", () => {
+  if (!window.EventSource) {
+    iniciarSondeo();
+    return;
+  }
+
+  // Live updates: the server only sends what changed
+  const fuente = new EventSource('/api/dashboard_stream');
+  let recibido = false;
+
+  fuente.addEventListener('tablero', (e) => {
+    recibido = true;
+    aplicarCambios(JSON.parse(e.data));
+  });
 
-      // Create a new bar chart with the overdue books data
-      new Chart(ctx, {
-        type: 'bar',
-        data: {
-          labels: data.map(d => d.titulo), // Book titles
-          datasets: [{
-            label: 'Veces atrasado',
-            data: data.map(d => d.total), // Times overdue
-            backgroundColor: '#e74a3b' // Red bar color
-          }]
-        },
-        options: {
-          responsive: true,
-          plugins: { legend: { display: false } } // Hide the legend
-        }
-      });
-    });
+  fuente.onerror = () => {
+    // The browser retries on its own; fall back only if the stream never worked
+    if (!recibido || fuente.readyState === EventSource.CLOSED) {
+      fuente.close();
+      iniciarSondeo();
+    }
+  };
 });
@@ -0,0 +1,67 @@
+// Generate report PDFs in the background: submit a job, poll its status and download when ready.
+// The link keeps its href so the synchronous download still works without JavaScript.
+document.addEventListener("DOMContentLoaded", function () {
+  const estadoTexto = document.getElementById("estado-reporte");
+
+  // Show a status message below the buttons
+  const mostrarEstado = (mensaje, tipo) => {
+    if (!estadoTexto) return;
+    estadoTexto.className = `small mt-2 text-end text-${tipo}`;
+    estadoTexto.textContent = mensaje;
+  };
+
+  // Poll the job until it finishes, then start the download
+  const consultarEstado = (url, boton) => {
+    fetch(url)
+      .then(res => res.json())
+      .then(estado => {
+        if (!estado.success) {
+          mostrarEstado(estado.mensaje, "danger");
+          boton.classList.remove("disabled");
+          return;
+        }
+        if (estado.estado === "pendiente" || estado.estado === "en_curso") {
+          const avance = estado.total ? ` (${estado.filas} de ${estado.total} filas)` : "";
+          mostrarEstado(`Generando PDF…${avance}`, "muted");
+          setTimeout(() => consultarEstado(url, boton), 1000);
+          return;
+        }
+        boton.classList.remove("disabled");
+        if (estado.estado === "error") {
+          mostrarEstado(estado.error, "danger");
+          return;
+        }
+        mostrarEstado(`✅ Reporte listo (${estado.filas} filas).`, "success");
+        window.location.href = estado.descarga_url;
+      })
+      .catch(() => setTimeout(() => consultarEstado(url, boton), 3000));
+  };
+
+  document.querySelectorAll("a[data-reporte]").forEach(boton => {
+    boton.addEventListener("click", (e) => {
+      e.preventDefault();
+      if (boton.classList.contains("disabled")) return;
+      boton.classList.add("disabled");
+      mostrarEstado("Generando PDF…", "muted");
+
+      fetch("/admin/reportes/jobs", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ tipo: boton.dataset.reporte })
+      })
+        .then(res => res.json())
+        .then(data => {
+          if (!data.success) {
+            mostrarEstado(data.mensaje, "danger");
+            boton.classList.remove("disabled");
+            return;
+          }
+          consultarEstado(data.estado_url, boton);
+        })
+        .catch(() => {
+          mostrarEstado("No se pudo iniciar el reporte.", "danger");
+          boton.classList.remove("disabled");
+        });
+    });
+  });
+});
@@ -0,0 +1,37 @@
+// Search-as-you-type suggestions for every search box (input[name="q"])
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll('form[role="search"] input[name="q"]').forEach(function (input, i) {
+    // Attach a datalist to the input so the browser renders the suggestions
+    const lista = document.createElement("datalist");
+    lista.id = `sugerencias-busqueda-${i}`;
+    input.setAttribute("list", lista.id);
+    input.setAttribute("autocomplete", "off");
+    input.after(lista);
+
+    let temporizador = null;
+    let ultimaConsulta = "";
+
+    input.addEventListener("input", function () {
+      clearTimeout(temporizador);
+      const consulta = input.value.trim();
+      if (consulta.length < 2 || consulta === ultimaConsulta) return;
+
+      // Small debounce so fast typing sends a single request
+      temporizador = setTimeout(function () {
+        ultimaConsulta = consulta;
+        fetch(`/api/sugerencias?q=${encodeURIComponent(consulta)}&n=8`)
+          .then(res => res.json())
+          .then(sugerencias => {
+            lista.innerHTML = "";
+            sugerencias.forEach(s => {
+              const opcion = document.createElement("option");
+              opcion.value = s.titulo;
+              opcion.label = s.autor || "";
+              lista.appendChild(opcion);
+            });
+          })
+          .catch(() => { lista.innerHTML = ""; });
+      }, 150);
+    });
+  });
+});
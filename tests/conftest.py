@@ -0,0 +1,59 @@
+# tests/conftest.py
+import os
+import tempfile
+import pytest
+
+# ======================================================
+# Entorno de pruebas
+# ======================================================
+# Se fija antes de importar la aplicación (Config lee el entorno al importarse):
+# base SQLite propia, sin hilos de fondo y sin archivos compartidos con una
+# instalación real.
+
+_CARPETA = tempfile.mkdtemp(prefix='sds_pruebas_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_CARPETA, 'arranque.db')
+os.environ.pop('DATABASE_REPLICA_URL', None)
+os.environ['MANTENIMIENTO_PROGRAMADOR'] = '0'
+os.environ['CORREO_TRABAJADOR'] = '0'
+os.environ['MANTENIMIENTO_LOCK'] = os.path.join(_CARPETA, 'mantenimiento.lock')
+os.environ['CACHE_RUTA'] = os.path.join(_CARPETA, 'cache.sqlite')
+os.environ['OPENLIBRARY_CACHE_RUTA'] = os.path.join(_CARPETA, 'openlibrary.sqlite')
+
+ADMIN_CORREO = 'admin@biblioteca.com'
+ADMIN_PASSWORD = 'admin-pruebas'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """ Aplicación con una base SQLite nueva y migrada para cada prueba. """
+    from app.config import Config
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'biblioteca.db'}")
+    monkeypatch.setattr(Config, 'CACHE_RUTA', str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(Config, 'OPENLIBRARY_CACHE_RUTA', str(tmp_path / 'openlibrary.sqlite'))
+    monkeypatch.setattr(Config, 'TESTING', True, raising=False)
+    monkeypatch.setattr(Config, 'WTF_CSRF_ENABLED', False, raising=False)
+    monkeypatch.setattr(Config, 'MAIL_SUPPRESS_SEND', True, raising=False)
+    monkeypatch.setenv('ADMIN_PASSWORD', ADMIN_PASSWORD)
+
+    from myapp import create_app
+    from app.extensions import db
+    from app.migraciones import aplicar_migraciones
+    from app.cli import crear_administrador
+
+    aplicacion = create_app()
+    with aplicacion.app_context():
+        aplicar_migraciones()
+        crear_administrador()
+        yield aplicacion
+        db.session.remove()
+        for motor in db.engines.values():
+            motor.dispose()
+
+
+@pytest.fixture
+def cliente_admin(app):
+    """ Cliente de pruebas con la sesión del administrador iniciada. """
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'correo': ADMIN_CORREO, 'password': ADMIN_PASSWORD})
+    assert respuesta.status_code == 302
+    return cliente
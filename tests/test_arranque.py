@@ -0,0 +1,38 @@
+# tests/test_arranque.py
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.extensions import db
+from app.models import Usuario
+from app.cli import crear_administrador
+
+
+def test_create_app_no_ejecuta_sql(monkeypatch, tmp_path):
+    """ Arrancar un worker no debe tocar la base (ni migrar ni crear el administrador). """
+    from app.config import Config
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'vacia.db'}")
+    sentencias = []
+
+    def registrar(conn, cursor, statement, *args):
+        sentencias.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', registrar)
+    try:
+        from myapp import create_app
+        create_app()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', registrar)
+    assert sentencias == []
+    assert not (tmp_path / 'vacia.db').exists()
+
+
+def test_administrador_sin_admin_password(app, monkeypatch, capsys):
+    """ Sin ADMIN_PASSWORD se crea el administrador con una contraseña temporal aleatoria. """
+    Usuario.query.filter_by(rol='administrador').delete()
+    db.session.commit()
+    monkeypatch.delenv('ADMIN_PASSWORD')
+
+    assert crear_administrador() is True
+    temporal = capsys.readouterr().out.split(': ')[1].split()[0]
+    admin = Usuario.query.filter_by(rol='administrador').one()
+    assert admin.check_password(temporal)
+    assert crear_administrador() is False
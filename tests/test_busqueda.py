@@ -0,0 +1,63 @@
+# tests/test_busqueda.py
+from sqlalchemy import insert
+from app import busqueda
+from app.cache import cache
+from app.extensions import db
+from app.models import Libro
+from app.busqueda import CLAVE_VERSION, buscar_libros
+
+
+def _fila(isbn, titulo):
+    return dict(titulo=titulo, autor='Autor', isbn=isbn, editorial='Ed', descripcion='-', categoria='novela',
+                cantidad_total=1, cantidad_disponible=1, estado='disponible')
+
+
+def _titulos(consulta):
+    return [libro.titulo for libro in buscar_libros(consulta).items]
+
+
+def test_fulltext_descarta_terminos_que_innodb_no_indexa(monkeypatch):
+    monkeypatch.setattr(busqueda, '_largo_minimo_fulltext', 3)
+    assert busqueda._terminos_fulltext(['la', 'casa', 'de', 'el', 'sol', 'the']) == ['casa', 'sol']
+
+
+def test_commit_de_libros_publica_version(app):
+    anterior = cache.obtener(CLAVE_VERSION)
+    db.session.add(Libro(**_fila('9780000000001', 'Rayuela')))
+    db.session.commit()
+    assert cache.obtener(CLAVE_VERSION) not in (None, anterior)
+
+
+def test_indice_se_reconstruye_si_otro_worker_cambio_libros(app):
+    db.session.add(Libro(**_fila('9780000000001', 'Rayuela')))
+    db.session.commit()
+    assert _titulos('rayuela') == ['Rayuela']
+
+    # Otro worker inserta un libro: los hooks de esta sesión no lo ven
+    db.session.execute(insert(Libro), [_fila('9780000000002', 'Ficciones')])
+    db.session.commit()
+    assert _titulos('ficciones') == []
+
+    # ...pero publica una versión nueva en la caché compartida
+    cache.guardar(CLAVE_VERSION, 'otro-worker', busqueda.TTL_VERSION)
+    assert _titulos('ficciones') == ['Ficciones']
+
+
+def test_cambio_de_stock_no_publica_version(app):
+    libro = Libro(**_fila('9780000000001', 'Rayuela'))
+    db.session.add(libro)
+    db.session.commit()
+    assert _titulos('rayuela') == ['Rayuela']
+    version = cache.obtener(CLAVE_VERSION)
+
+    # Un préstamo solo toca el stock y el estado
+    libro.cantidad_disponible, libro.estado = 0, 'prestados'
+    db.session.commit()
+    assert cache.obtener(CLAVE_VERSION) == version
+    assert busqueda.indice.construido
+
+    # La baja lógica sí cambia lo que se encuentra
+    libro.estado = 'eliminado'
+    db.session.commit()
+    assert cache.obtener(CLAVE_VERSION) != version
+    assert _titulos('rayuela') == []
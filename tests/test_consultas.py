@@ -0,0 +1,48 @@
+# tests/test_consultas.py
+from datetime import date, timedelta
+import pytest
+from flask import g
+from app.extensions import db
+from app.models import Usuario, Libro, Prestamo, Reserva
+from app.consultas import PresupuestoConsultasExcedido
+
+FILAS = 12
+# Sesión, usuario actual, conteo y página (hoy 2-3): no debe crecer con las filas
+PRESUPUESTO = 5
+
+
+def _sembrar():
+    hoy = date.today()
+    for i in range(FILAS):
+        lector = Usuario(nombre=f'Lector{i}', apellido='Prueba', correo=f'lector{i}@biblioteca.com',
+                         documento=f'DOC{i}', direccion='-', telefono='-', fecha_nacimiento=date(1990, 1, 1),
+                         password_hash='-')
+        libro = Libro(titulo=f'Libro {i}', autor='Autor', isbn=f'97800000000{i:02d}', editorial='Ed',
+                      descripcion='-', categoria='novela', cantidad_total=2, cantidad_disponible=1,
+                      estado='disponible')
+        db.session.add_all([lector, libro])
+        db.session.flush()
+        db.session.add_all([
+            Prestamo(libro_id=libro.id, usuario_id=lector.id, fecha_prestamo=hoy,
+                     fecha_devolucion_esperada=hoy + timedelta(days=7), estado='activo'),
+            Reserva(libro_id=libro.id, usuario_id=lector.id, estado='pendiente', posicion=1),
+        ])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('ruta', ['/admin/prestamos/mostrar', '/admin/reservas/mostrar', '/admin/reportes/prestados'])
+def test_listas_con_joinedload_respetan_el_presupuesto(app, cliente_admin, ruta):
+    _sembrar()
+    app.config['SQL_PRESUPUESTO_CONSULTAS'] = PRESUPUESTO
+    with cliente_admin:
+        respuesta = cliente_admin.get(ruta)
+        assert respuesta.status_code == 200
+        assert g.consultas_sql <= PRESUPUESTO
+    assert b'Libro 11' in respuesta.data
+
+
+def test_presupuesto_excedido_falla_en_pruebas(app, cliente_admin):
+    _sembrar()
+    app.config['SQL_PRESUPUESTO_CONSULTAS'] = 1
+    with pytest.raises(PresupuestoConsultasExcedido):
+        cliente_admin.get('/admin/prestamos/mostrar')
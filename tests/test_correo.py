@@ -0,0 +1,96 @@
+# tests/test_correo.py
+import socket
+import threading
+from email import message_from_bytes
+import pytest
+from aiosmtpd.controller import Controller
+from app.extensions import db, mail
+from app.models import CorreoPendiente
+from app.correo import encolar_correo, entregar_pendientes, entregar_todo
+
+
+class Buzon:
+    """ Manejador de aiosmtpd que guarda los mensajes recibidos (o los rechaza). """
+
+    def __init__(self):
+        self.mensajes = []
+        self.rechazar = False
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.rechazar:
+            return '451 Intente más tarde'
+        self.mensajes.append(message_from_bytes(envelope.content))
+        return '250 OK'
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def buzon(app):
+    """ Servidor SMTP local y Flask-Mail apuntando a él. """
+    manejador = Buzon()
+    controlador = Controller(manejador, hostname='127.0.0.1', port=_puerto_libre())
+    controlador.start()
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=controlador.port, MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+    yield manejador
+    controlador.stop()
+
+
+def _encolar(cantidad):
+    for i in range(cantidad):
+        encolar_correo(f'Aviso {i}', f'lector{i}@biblioteca.com', 'Cuerpo')
+    db.session.commit()
+
+
+def test_entrega_la_bandeja(app, buzon):
+    _encolar(3)
+    assert entregar_todo(app.config) == {'enviados': 3, 'fallidos': 0}
+
+    assert sorted(m['Subject'] for m in buzon.mensajes) == ['Aviso 0', 'Aviso 1', 'Aviso 2']
+    assert {c.estado for c in CorreoPendiente.query} == {'enviado'}
+
+
+def test_hilos_concurrentes_no_duplican(app, buzon):
+    """ Varios hilos vaciando la bandeja a la vez entregan cada correo una sola vez. """
+    app.config['CORREO_LOTE'] = 5
+    _encolar(40)
+    errores = []
+
+    def vaciar():
+        with app.app_context():
+            try:
+                entregar_todo(app.config)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                db.session.remove()
+
+    hilos = [threading.Thread(target=vaciar) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    asuntos = [m['Subject'] for m in buzon.mensajes]
+    assert len(asuntos) == 40
+    assert len(set(asuntos)) == 40
+
+
+def test_rechazo_programa_reintento(app, buzon):
+    buzon.rechazar = True
+    _encolar(1)
+    assert entregar_pendientes(app.config) == {'enviados': 0, 'fallidos': 1}
+
+    correo = CorreoPendiente.query.one()
+    assert correo.estado == 'pendiente'
+    assert correo.intentos == 1
+    assert '451' in correo.ultimo_error
+    # Hasta que venza la espera no se vuelve a intentar
+    assert entregar_pendientes(app.config) == {'enviados': 0, 'fallidos': 0}
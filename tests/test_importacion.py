@@ -0,0 +1,50 @@
+# tests/test_importacion.py
+from sqlalchemy import event
+from app.extensions import db
+from app.models import Libro
+from app.importacion import isbns_existentes, leer_isbns
+from app.migraciones import _normalizar_isbn_libros
+
+
+def _libro(isbn):
+    libro = Libro(titulo=isbn, autor='Autor', isbn=isbn, editorial='Ed', descripcion='-', categoria='novela',
+                  cantidad_total=1, cantidad_disponible=1, estado='disponible')
+    db.session.add(libro)
+    return libro
+
+
+def test_leer_isbns_normaliza_y_descarta():
+    isbns, invalidos, repetidos = leer_isbns(['isbn,titulo', '978-0-00-000000-1,x', '9780000000001', 'abc123', '0-00-000000-x'])
+    assert isbns == ['9780000000001', '000000000X']
+    assert invalidos == ['abc123']
+    assert repetidos == 1
+
+
+def test_migracion_normaliza_isbn_existentes(app):
+    con_guiones, repetido, original = _libro('978-0-00-000000-1'), _libro('978 0000000002'), _libro('9780000000002')
+    db.session.commit()
+
+    with db.engine.begin() as conexion:
+        _normalizar_isbn_libros(conexion)
+
+    db.session.expire_all()
+    assert con_guiones.isbn == '9780000000001'
+    assert repetido.isbn == '978 0000000002'  # Chocaría con otro libro: queda para revisar a mano
+    assert original.isbn == '9780000000002'
+
+
+def test_existentes_compara_la_columna_sin_funciones(app):
+    _libro('9780000000001')
+    db.session.commit()
+    sentencias = []
+
+    def registrar(conn, cursor, statement, *args):
+        sentencias.append(statement.lower())
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        assert isbns_existentes(['9780000000001', '9780000000009']) == {'9780000000001'}
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    assert len(sentencias) == 1
+    assert 'replace' not in sentencias[0] and 'libros.isbn in' in sentencias[0]
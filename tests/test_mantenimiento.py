@@ -0,0 +1,41 @@
+# tests/test_mantenimiento.py
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import Usuario, Libro, Reserva
+from app.mantenimiento import ejecutar_mantenimiento
+
+
+def _libro(isbn, disponible):
+    libro = Libro(titulo=isbn, autor='Autor', isbn=isbn, editorial='Ed', descripcion='-', categoria='novela',
+                  cantidad_total=3, cantidad_disponible=disponible, estado='disponible' if disponible else 'prestados')
+    db.session.add(libro)
+    return libro
+
+
+def test_vence_reservas_expiradas_y_devuelve_el_stock(app):
+    lector = Usuario.query.filter_by(rol='administrador').one()
+    agotado, otro = _libro('111', 0), _libro('222', 1)
+    db.session.flush()
+    ayer, manana = datetime.now() - timedelta(days=1), datetime.now() + timedelta(days=1)
+    db.session.add_all([
+        Reserva(libro_id=agotado.id, usuario_id=lector.id, estado='activa', fecha_expiracion=ayer),
+        Reserva(libro_id=agotado.id, usuario_id=lector.id, estado='activa', fecha_expiracion=ayer),
+        Reserva(libro_id=otro.id, usuario_id=lector.id, estado='activa', fecha_expiracion=manana),
+        Reserva(libro_id=otro.id, usuario_id=lector.id, estado='pendiente', posicion=1),
+    ])
+    db.session.commit()
+    # Vencida por otro camino en el mismo segundo (MySQL guarda DATETIME sin fracción): no suma stock
+    db.session.add(Reserva(libro_id=otro.id, usuario_id=lector.id, estado='vencida', fecha_expiracion=ayer,
+                           fecha_actualizacion=datetime.utcnow().replace(microsecond=0)))
+    db.session.commit()
+
+    resultado = ejecutar_mantenimiento()
+
+    assert resultado['reservas_vencidas'] == 2
+    assert resultado['libros_actualizados'] == 1
+    db.session.expire_all()
+    assert (agotado.cantidad_disponible, agotado.estado) == (2, 'disponible')
+    assert (otro.cantidad_disponible, otro.estado) == (1, 'disponible')
+    assert Reserva.query.filter_by(estado='pendiente').one().posicion == 1
+
+    assert ejecutar_mantenimiento()['reservas_vencidas'] == 0
@@ -0,0 +1,27 @@
+# tests/test_metricas.py
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.extensions import db
+
+
+def test_sentencias_fallidas_no_dejan_estado_en_la_conexion(app):
+    with db.engine.connect() as conexion:
+        conexion.execute(text('SELECT 1'))
+        antes = repr(conexion.info)
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conexion.execute(text('SELECT * FROM tabla_que_no_existe'))
+            conexion.rollback()
+        assert repr(conexion.info) == antes
+
+
+def test_tiempo_sql_por_peticion(app):
+    with app.test_request_context('/'):
+        g.sql_segundos, g.sql_filas = 0.0, 0
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM tabla_que_no_existe'))
+        db.session.rollback()
+        db.session.execute(text('SELECT 1')).all()
+        assert 0 < g.sql_segundos < 5
@@ -0,0 +1,142 @@
+# tests/test_openlibrary.py
+import json
+import threading
+from time import sleep, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from app.openlibrary import CacheOpenLibrary, NO_ENCONTRADO
+
+
+class ServidorOpenLibrary(BaseHTTPRequestHandler):
+    """ Imitación local de openlibrary.org y covers.openlibrary.org. """
+
+    peticiones = []
+    retraso = 0
+    titulo = 'Libro'
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, codigo, datos=None):
+        cuerpo = json.dumps(datos).encode() if datos is not None else b''
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(cuerpo)
+
+    def do_HEAD(self):
+        self.peticiones.append(self.path)
+        self._responder(404)
+
+    def do_GET(self):
+        self.peticiones.append(self.path)
+        sleep(self.retraso)
+        if self.path.startswith('/api/books'):
+            isbn = self.path.split('ISBN:')[1].split('&')[0]
+            if not isbn.startswith('978'):
+                return self._responder(200, {})
+            return self._responder(200, {f'ISBN:{isbn}': {
+                'title': f'{self.titulo} {isbn}', 'authors': [{'name': 'Autor'}],
+                'publishers': [{'name': 'Editorial'}], 'publish_date': '2001', 'key': f'/books/OL{isbn}M',
+            }})
+        if self.path.startswith('/books/'):
+            return self._responder(200, {'subjects': ['Fiction'], 'description': 'Descripción'})
+        self._responder(404)
+
+
+@pytest.fixture
+def servidor(app):
+    """ Levanta el servidor local y apunta la configuración de OpenLibrary a él. """
+    ServidorOpenLibrary.peticiones = []
+    ServidorOpenLibrary.retraso = 0
+    ServidorOpenLibrary.titulo = 'Libro'
+    http = ThreadingHTTPServer(('127.0.0.1', 0), ServidorOpenLibrary)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{http.server_port}'
+    app.config.update(OPENLIBRARY_URL=url, OPENLIBRARY_PORTADAS_URL=url, OPENLIBRARY_CONEXIONES=8)
+    yield ServidorOpenLibrary
+    http.shutdown()
+    http.server_close()
+
+
+@pytest.fixture
+def cache_ol(app, servidor):
+    cache = CacheOpenLibrary()
+    cache.configurar(app.config)
+    return cache
+
+
+def _esperar(condicion, segundos=5):
+    limite = time() + segundos
+    while not condicion():
+        assert time() < limite, 'tiempo de espera agotado'
+        sleep(0.02)
+
+
+def _consultas_api(servidor):
+    return [p for p in servidor.peticiones if p.startswith('/api/books')]
+
+
+def test_consulta_y_cachea(cache_ol, servidor):
+    datos = cache_ol.obtener('9780000000001')
+    assert datos['success'] and datos['titulo'] == 'Libro 9780000000001'
+    assert datos['categoria'] and datos['descripcion'] == 'Descripción'
+
+    assert cache_ol.obtener('9780000000001') == datos
+    assert len(_consultas_api(servidor)) == 1
+
+
+def test_no_encontrado_tambien_se_cachea(cache_ol, servidor):
+    assert cache_ol.obtener('1234567890')['error'] == NO_ENCONTRADO
+    assert cache_ol.obtener('1234567890')['error'] == NO_ENCONTRADO
+    assert len(_consultas_api(servidor)) == 1
+
+
+def test_cache_en_archivo_compartida_entre_procesos(app, cache_ol, servidor):
+    cache_ol.obtener('9780000000002')
+    otra = CacheOpenLibrary()   # Otro worker: memoria vacía, mismo archivo
+    otra.configurar(app.config)
+    assert otra.obtener('9780000000002')['titulo'] == 'Libro 9780000000002'
+    assert len(_consultas_api(servidor)) == 1
+
+
+def test_entrada_vencida_se_sirve_y_se_refresca_en_el_pool(app, servidor):
+    cache = CacheOpenLibrary()
+    cache.configurar(app.config)
+    cache.obtener('9780000000003')
+
+    app.config['OPENLIBRARY_TTL'] = 0
+    vencida = CacheOpenLibrary()
+    vencida.configurar(app.config)
+    servidor.titulo = 'Nuevo'
+    hilos = threading.active_count()
+
+    assert vencida.obtener('9780000000003')['titulo'] == 'Libro 9780000000003'
+    _esperar(lambda: vencida._leer_memoria('9780000000003')[0]['titulo'] == 'Nuevo 9780000000003')
+    assert not any(h.name.startswith('openlibrary-978') for h in threading.enumerate())
+    assert threading.active_count() <= hilos + 8
+
+
+def test_muchas_entradas_vencidas_no_crean_un_hilo_cada_una(app, servidor):
+    cache = CacheOpenLibrary()
+    cache.configurar(app.config)
+    isbns = [f'97800000{i:05d}' for i in range(40)]
+    for isbn in isbns:
+        cache.obtener(isbn)
+
+    app.config['OPENLIBRARY_TTL'] = 0
+    vencida = CacheOpenLibrary()
+    vencida.configurar(app.config)
+    servidor.retraso = 0.2
+    hilos = threading.active_count()
+
+    inicio = time()
+    for isbn in isbns:
+        assert vencida.obtener(isbn)['success']
+    assert time() - inicio < 1          # Se sirve lo viejo sin esperar a OpenLibrary
+    # Como mucho una cuarta parte del pool (8 // 4) refresca a la vez; el resto se omite
+    assert len(vencida._refrescando) <= 2
+    assert threading.active_count() <= hilos + 8
+    _esperar(lambda: not vencida._refrescando)
@@ -0,0 +1,50 @@
+# tests/test_paginacion.py
+import json
+import base64
+import pytest
+from app.extensions import db
+from app.models import Libro
+from app.paginacion import paginar_por_cursor, decodificar_cursor, codificar_cursor
+
+
+def _cursor(datos):
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+
+@pytest.fixture
+def libros(app):
+    for i in range(7):
+        db.session.add(Libro(titulo=f'Libro {i}', autor='Autor', isbn=f'97800000{i:05d}', editorial='Ed',
+                             descripcion='-', categoria='novela', cantidad_total=1, cantidad_disponible=1,
+                             estado='eliminado' if i < 2 else 'disponible'))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('valores', [[{'a': 1}], [[1, 2]], [{'dt': 5}], [{'d': '2025-01-01', 'x': 1}], [None]])
+def test_cursor_con_valores_no_escalares_es_la_primera_pagina(valores):
+    assert decodificar_cursor(_cursor(['sig', valores])) == ('sig', None, None)
+
+
+def test_cursor_conserva_fechas_y_total():
+    from datetime import date
+    cursor = codificar_cursor('ant', [date(2025, 1, 2), 7], 40)
+    assert decodificar_cursor(cursor) == ('ant', [date(2025, 1, 2), 7], 40)
+
+
+def test_cursor_manipulado_no_rompe_la_pagina(app, libros):
+    pagina = paginar_por_cursor(Libro.query, Libro.id, cursor=_cursor(['sig', [{'x': [1]}]]), por_pagina=3)
+    assert [libro.id for libro in pagina] == [1, 2, 3]
+
+
+def test_total_respeta_los_filtros_y_viaja_en_el_cursor(app, libros):
+    consulta = Libro.query.filter(Libro.estado != 'eliminado')
+    primera = paginar_por_cursor(consulta, Libro.id, por_pagina=3, con_total=True)
+    assert primera.total == 5
+
+    # Las páginas siguientes reutilizan el total de la primera sin volver a contar
+    db.session.add(Libro(titulo='Otro', autor='Autor', isbn='9781111111111', editorial='Ed', descripcion='-',
+                         categoria='novela', cantidad_total=1, cantidad_disponible=1, estado='disponible'))
+    db.session.commit()
+    segunda = paginar_por_cursor(consulta, Libro.id, cursor=primera.siguiente, por_pagina=3, con_total=True)
+    assert segunda.total == 5
+    assert [libro.titulo for libro in segunda] == ['Libro 5', 'Libro 6', 'Otro']
@@ -0,0 +1,48 @@
+# tests/test_replicas.py
+import shutil
+import pytest
+from app.extensions import db
+from app.models import Libro
+from app.estadisticas import invalidar_totales
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, app):
+    """ La aplicación con una réplica: una copia del archivo SQLite que no recibe escrituras. """
+    from app.config import Config
+    from myapp import create_app
+    principal = tmp_path / 'biblioteca.db'
+    replica = tmp_path / 'replica.db'
+    db.session.remove()
+    db.engine.dispose()
+    shutil.copy(principal, replica)
+    monkeypatch.setattr(Config, 'SQLALCHEMY_BINDS', {'replica': f'sqlite:///{replica}'})
+    aplicacion = create_app()
+    with aplicacion.app_context():
+        yield aplicacion
+        db.session.remove()
+        for motor in db.engines.values():
+            motor.dispose()
+
+
+def _agregar_libro(titulo):
+    db.session.add(Libro(titulo=titulo, autor='Autor', isbn=titulo, editorial='Ed', descripcion='-',
+                         categoria='novela', cantidad_total=1, cantidad_disponible=1, estado='disponible'))
+    db.session.commit()
+
+
+def test_catalogo_lee_de_la_replica(app, cliente_admin):
+    _agregar_libro('SOLO-PRINCIPAL')
+    with cliente_admin.session_transaction() as sesion:
+        sesion.pop('lectura_principal_hasta', None)
+    assert b'SOLO-PRINCIPAL' not in cliente_admin.get('/catalogo').data
+
+
+def test_totales_se_recalculan_en_la_principal(app, cliente_admin):
+    """ Tras invalidar, los totales del dashboard no se cachean desde una réplica atrasada. """
+    _agregar_libro('NUEVO')
+    invalidar_totales()
+    with cliente_admin.session_transaction() as sesion:
+        sesion.pop('lectura_principal_hasta', None)
+    datos = cliente_admin.get('/api/dashboard_data').get_json()
+    assert datos['total_libros'] == Libro.query.count() == 1
@@ -0,0 +1,141 @@
+# tests/test_reportes.py
+import os
+from time import time
+import pytest
+from sqlalchemy import update
+from app import almacen_reportes
+from app.reportes import REPORTES, obtener_reporte, registrar_historial, huella_datos
+from app.extensions import db
+from app.models import Usuario, Prestamo, HistorialReporte
+
+
+@pytest.fixture
+def carpeta(app, tmp_path, monkeypatch):
+    """ Los PDF se escriben en una carpeta temporal en lugar de static/archivos. """
+    destino = tmp_path / 'archivos'
+    destino.mkdir()
+    monkeypatch.setattr(almacen_reportes, 'carpeta_archivos', lambda: str(destino))
+    return destino
+
+
+def _filas(*titulos):
+    return [[i, titulo, 'lector@biblioteca.com', '2025-01-01', 'No devuelto'] for i, titulo in enumerate(titulos, 1)]
+
+
+def _con_datos(monkeypatch, *lotes):
+    """ Cada llamada a reporte.filas() devuelve el siguiente lote (el último se repite). """
+    pendientes = list(lotes)
+
+    def filas():
+        return iter(pendientes.pop(0) if len(pendientes) > 1 else pendientes[0])
+
+    monkeypatch.setitem(REPORTES, 'prestados', REPORTES['prestados']._replace(filas=filas))
+
+
+def test_reutilizar_no_recorre_las_filas(carpeta, monkeypatch):
+    _con_datos(monkeypatch, _filas('Uno', 'Dos'))
+    primero = obtener_reporte('prestados')
+    assert not primero.reutilizado and primero.filas == 2
+
+    def sin_leer():
+        raise AssertionError('un reporte sin cambios no debe volver a leer las filas')
+
+    monkeypatch.setitem(REPORTES, 'prestados', REPORTES['prestados']._replace(filas=sin_leer))
+    segundo = obtener_reporte('prestados')
+    assert segundo.reutilizado
+    assert (segundo.nombre, segundo.filas) == (primero.nombre, 2)
+
+
+def test_commit_de_datos_reportados_cambia_la_huella(carpeta, monkeypatch):
+    _con_datos(monkeypatch, _filas('Uno'))
+    huella = huella_datos('prestados')
+    lector = Usuario.query.first()
+    lector.telefono = '555'
+    db.session.commit()
+    assert huella_datos('prestados') != huella
+
+    # También las sentencias masivas, que no pasan por el flush
+    huella = huella_datos('prestados')
+    db.session.execute(update(Prestamo).values(recordatorio_enviado=None))
+    db.session.commit()
+    assert huella_datos('prestados') != huella
+
+    huella = huella_datos('prestados')
+    db.session.execute(update(HistorialReporte).values(estado='disponible'))
+    db.session.commit()
+    assert huella_datos('prestados') == huella
+
+
+def test_reutilizar_usa_el_hash_del_historial(carpeta, monkeypatch):
+    _con_datos(monkeypatch, _filas('Uno'))
+    primero = obtener_reporte('prestados')
+    registrar_historial('prestados', primero, Usuario.query.first().id)
+    db.session.commit()
+
+    def sin_leer(nombre):
+        raise AssertionError('el PDF no debe releerse al reutilizarlo')
+
+    monkeypatch.setattr(almacen_reportes, 'hash_archivo', sin_leer)
+    segundo = obtener_reporte('prestados')
+    assert segundo.reutilizado
+    assert segundo.nombre == primero.nombre
+    assert segundo.hash_contenido == primero.hash_contenido
+
+
+def test_reporte_sin_datos(carpeta, monkeypatch):
+    monkeypatch.setitem(REPORTES, 'populares', REPORTES['populares']._replace(filas=lambda: iter([])))
+    assert obtener_reporte('populares').nombre is None
+    assert list(carpeta.iterdir()) == []
+
+
+def _envejecer(carpeta, dias):
+    hace = time() - dias * 86400
+    for archivo in carpeta.iterdir():
+        os.utime(archivo, (hace, hace))
+
+
+def test_reporte_comprimido_se_descomprime_al_reutilizarlo(carpeta, monkeypatch):
+    _con_datos(monkeypatch, _filas('Uno'))
+    primero = obtener_reporte('prestados')
+    contenido = (carpeta / primero.nombre).read_bytes()
+    _envejecer(carpeta, 10)
+    assert almacen_reportes.limpiar_reportes(dias=0, max_mb=0, comprimir_dias=7)['comprimidos'] == 1
+
+    assert obtener_reporte('prestados').reutilizado
+    assert sorted(p.name for p in carpeta.iterdir()) == [primero.nombre]
+    assert (carpeta / primero.nombre).read_bytes() == contenido
+    # Recién usado: la siguiente limpieza no lo vuelve a comprimir
+    assert almacen_reportes.limpiar_reportes(dias=0, max_mb=0, comprimir_dias=7)['comprimidos'] == 0
+
+
+def test_abrir_descomprime_todos_los_nombres(carpeta):
+    (carpeta / 'a.pdf').write_bytes(b'%PDF-1.4 prueba')
+    os.link(carpeta / 'a.pdf', carpeta / 'b.pdf')
+    _envejecer(carpeta, 10)
+    almacen_reportes.limpiar_reportes(dias=0, max_mb=0, comprimir_dias=7)
+    assert sorted(p.name for p in carpeta.iterdir()) == ['a.pdf.gz', 'b.pdf.gz']
+
+    assert almacen_reportes.abrir('archivos/b.pdf') == str(carpeta / 'b.pdf')
+    assert sorted(p.name for p in carpeta.iterdir()) == ['a.pdf', 'b.pdf']
+    assert os.path.samefile(carpeta / 'a.pdf', carpeta / 'b.pdf')
+    assert (carpeta / 'a.pdf').read_bytes() == b'%PDF-1.4 prueba'
+
+
+def test_limpieza_respeta_lo_usado_tras_el_inventario(carpeta, monkeypatch):
+    for nombre in ('usado.pdf', 'borrado.pdf', 'viejo.pdf'):
+        (carpeta / nombre).write_bytes(b'%PDF-1.4 ' + nombre.encode())
+    _envejecer(carpeta, 100)
+    inventario = almacen_reportes._inventario
+
+    def inventario_concurrente(*args):
+        archivos = inventario(*args)
+        # Mientras tanto un reporte se reutiliza y otro lo quita otro proceso
+        almacen_reportes.tocar('usado.pdf')
+        os.remove(carpeta / 'borrado.pdf')
+        return archivos
+
+    monkeypatch.setattr(almacen_reportes, '_inventario', inventario_concurrente)
+    resultado = almacen_reportes.limpiar_reportes(dias=30, max_mb=0, comprimir_dias=0)
+
+    assert sorted(p.name for p in carpeta.iterdir()) == ['usado.pdf']
+    assert resultado['eliminados'] == 2
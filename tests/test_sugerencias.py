@@ -0,0 +1,36 @@
+# tests/test_sugerencias.py
+from app import busqueda, sugerencias
+from app.cache import cache
+from app.extensions import db
+from app.models import Libro
+from app.sugerencias import obtener_sugerencias
+
+
+def _titulos(consulta):
+    return [sugerencia['titulo'] for sugerencia in obtener_sugerencias(consulta)]
+
+
+def test_stock_no_vacia_el_indice_de_prefijos(app, monkeypatch):
+    libro = Libro(titulo='Rayuela', autor='Julio Cortázar', isbn='9780000000001', editorial='Ed', descripcion='-',
+                  categoria='novela', cantidad_total=2, cantidad_disponible=2, estado='disponible')
+    db.session.add(libro)
+    db.session.commit()
+    assert _titulos('ray') == ['Rayuela']
+
+    construcciones = []
+    construir = sugerencias.indice.construir
+    monkeypatch.setattr(sugerencias.indice, 'construir', lambda filas: construcciones.append(1) or construir(filas))
+
+    version = cache.obtener(busqueda.CLAVE_VERSION)
+    libro.cantidad_disponible = 1
+    db.session.commit()
+    # Otro worker que conocía la versión anterior conserva su índice
+    monkeypatch.setattr(busqueda, '_version_local', version)
+    assert _titulos('ray') == ['Rayuela']
+    assert sugerencias.indice.construido
+
+    # Un cambio de título se aplica en el sitio, sin reconstruir
+    libro.titulo = 'Rayuela (edición crítica)'
+    db.session.commit()
+    assert _titulos('ray') == ['Rayuela (edición crítica)']
+    assert construcciones == []
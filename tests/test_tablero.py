@@ -0,0 +1,30 @@
+# tests/test_tablero.py
+import queue
+from types import SimpleNamespace
+from app import tablero
+from app.tablero import PublicadorTablero, FIN
+
+APP = SimpleNamespace(config={'TABLERO_INTERVALO': 1})
+
+
+def test_cliente_lento_recibe_fin(monkeypatch):
+    """ Al desconectar a un cliente lento su stream termina en lugar de quedarse con latidos. """
+    publicador = PublicadorTablero()
+    cola = queue.Queue(maxsize=2)
+    publicador._suscriptores.add(cola)
+    for i in range(3):
+        publicador._publicar({'prestamos': i})
+
+    assert cola not in publicador._suscriptores
+    assert cola.get_nowait() is FIN and cola.empty()
+
+    cola.put(FIN)
+    monkeypatch.setattr(tablero.publicador, 'suscribir', lambda app: cola)
+    assert list(tablero.eventos(APP, latido=60)) == ['retry: 1000\n\n']
+
+
+def test_stream_se_cierra_tras_duracion_max(monkeypatch):
+    monkeypatch.setattr(tablero.publicador, 'suscribir', lambda app: queue.Queue())
+    mensajes = list(tablero.eventos(APP, latido=0.05, duracion_max=0.2))
+    assert mensajes[0] == 'retry: 1000\n\n'
+    assert set(mensajes[1:]) == {': latido\n\n'}
@@ -0,0 +1,136 @@
+# tests/test_trabajos.py
+import threading
+from datetime import date
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+import pytest
+from flask import g
+from app import trabajos, almacen_reportes
+from app.cache import BackendSQLite, cache
+from app.extensions import db
+from app.models import Usuario, HistorialReporte
+from app.trabajos import encolar_reporte, estado_trabajo, TERMINADO, PENDIENTE
+
+
+def _agregar_en_otro_proceso(ruta):
+    return BackendSQLite(ruta).agregar('reportes:activo:atrasados', 'otro-proceso', 60)
+
+
+def test_agregar_es_atomico_entre_procesos(tmp_path):
+    ruta = str(tmp_path / 'cache.sqlite')
+    BackendSQLite(ruta).obtener('preparar')
+    with get_context('spawn').Pool(4) as procesos:
+        resultados = procesos.map(_agregar_en_otro_proceso, [ruta] * 8)
+    assert resultados.count(True) == 1
+
+
+def test_agregar_y_reemplazar(tmp_path):
+    backend = BackendSQLite(str(tmp_path / 'cache.sqlite'))
+    assert backend.agregar('clave', 'a', 60) is True
+    assert backend.agregar('clave', 'b', 60) is False
+    assert backend.reemplazar('clave', 'b', 'c', 60) is False
+    assert backend.reemplazar('clave', 'a', 'c', 60) is True
+    assert backend.obtener('clave') == 'c'
+    assert backend.agregar('vencida', 'a', -1) is True
+    assert backend.agregar('vencida', 'b', 60) is True
+
+
+class EjecutorFalso:
+    """ Registra los trabajos enviados sin ejecutarlos. """
+
+    def __init__(self, roto=False):
+        self.enviados = []
+        self.roto = roto
+        self.cerrado = False
+
+    def submit(self, funcion, *args):
+        if self.roto:
+            raise BrokenProcessPool('un proceso murió')
+        self.enviados.append(args)
+        return Future()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.cerrado = True
+
+
+@pytest.fixture
+def ejecutor(app, monkeypatch):
+    falso = EjecutorFalso()
+    monkeypatch.setattr(trabajos, '_ejecutor', falso)
+    return falso
+
+
+def test_solicitudes_simultaneas_comparten_trabajo(app, ejecutor):
+    ids = []
+
+    def solicitar():
+        ids.append(encolar_reporte(app, 'atrasados', 1))
+
+    hilos = [threading.Thread(target=solicitar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(set(ids)) == 1
+    assert len(ejecutor.enviados) == 1
+    assert estado_trabajo(ids[0])['estado'] == PENDIENTE
+
+
+def test_trabajo_terminado_libera_el_tipo(app, ejecutor):
+    primero = encolar_reporte(app, 'atrasados', 1)
+    cache.guardar(f'reportes:trabajo:{primero}', {'estado': TERMINADO}, 60)
+
+    segundo = encolar_reporte(app, 'atrasados', 1)
+    assert segundo != primero
+    assert encolar_reporte(app, 'atrasados', 1) == segundo
+    assert len(ejecutor.enviados) == 2
+
+
+def test_pool_roto_se_cierra_y_se_reemplaza(app, monkeypatch):
+    roto, nuevo = EjecutorFalso(roto=True), EjecutorFalso()
+    monkeypatch.setattr(trabajos, '_ejecutor', roto)
+    monkeypatch.setattr(trabajos, '_obtener_ejecutor', lambda app: trabajos._ejecutor or nuevo)
+
+    encolar_reporte(app, 'prestados', 1)
+    assert roto.cerrado
+    assert len(nuevo.enviados) == 1
+
+
+def _como(cliente):
+    """
+    El fixture `app` deja un contexto de aplicación abierto y Flask-Login
+    guarda el usuario en g: se olvida antes de cada petición de otro cliente.
+    """
+    g.pop('_login_user', None)
+    return cliente
+
+
+def test_cada_solicitante_queda_en_el_historial(app, cliente_admin, ejecutor, tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen_reportes, 'carpeta_archivos', lambda: str(tmp_path))
+    (tmp_path / 'reporte_atrasados_x.pdf').write_bytes(b'%PDF-1.4 prueba')
+    otro = Usuario(nombre='Otra', apellido='Admin', correo='otra@biblioteca.com', documento='999',
+                   direccion='-', telefono='-', fecha_nacimiento=date(1990, 1, 1), rol='administrador')
+    otro.set_password('otra-clave')
+    db.session.add(otro)
+    db.session.commit()
+    cliente_otro = app.test_client()
+    respuesta = _como(cliente_otro).post('/login', data={'correo': 'otra@biblioteca.com', 'password': 'otra-clave'})
+    assert respuesta.status_code == 302
+
+    trabajo = _como(cliente_admin).post('/admin/reportes/jobs', json={'tipo': 'atrasados'}).get_json()['trabajo']
+    assert _como(cliente_otro).post('/admin/reportes/jobs', json={'tipo': 'atrasados'}).get_json()['trabajo'] == trabajo
+    estado = estado_trabajo(trabajo)
+    cache.guardar(f'reportes:trabajo:{trabajo}', {**estado, 'estado': TERMINADO, 'filas': 0,
+                                                 'archivo': 'reporte_atrasados_x.pdf', 'hash_contenido': 'abc'}, 60)
+
+    for cliente in (cliente_admin, cliente_otro):
+        respuesta = _como(cliente).get(f'/admin/reportes/jobs/{trabajo}/descargar')
+        assert respuesta.status_code == 200
+        respuesta.close()
+
+    historial = HistorialReporte.query.order_by(HistorialReporte.id).all()
+    admin = Usuario.query.filter_by(correo='admin@biblioteca.com').one()
+    assert [h.admin_id for h in historial] == [admin.id, otro.id]
+    assert {(h.ruta_archivo, h.hash_contenido) for h in historial} == {('archivos/reporte_atrasados_x.pdf', 'abc')}